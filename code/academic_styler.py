@@ -0,0 +1,270 @@
+import os
+import ast
+from source_rewriter import line_offsets, split_lines, node_offsets, apply_edits
+
+# --- 配置区 ---
+# 期刊常见栏宽对应的图像尺寸（英寸）：单栏 ~85mm -> 3.35 英寸，双栏 ~180mm -> 7.08 英寸
+ACADEMIC_FIGSIZES = {
+    'single': (3.35, 2.5),
+    'double': (7.08, 4.0),
+}
+# 创建画布的 pyplot 函数，学术模式下统一设置其 figsize
+FIGURE_FUNCTIONS = {'figure', 'subplots', 'subplot_mosaic'}
+# 样式代码块的标记，已存在时不再重复注入
+STYLE_BLOCK_MARKER = "# --- 学术风格注入 ---"
+# 紧凑矢量输出（academic_options['compact_vector']）：点数超过该阈值的曲线、散点等图元栅格化
+COMPACT_RASTER_THRESHOLD = int(os.getenv("SCIAGENT_RASTER_THRESHOLD", "5000"))
+# 路径简化阈值（Matplotlib 默认 1/9），越大合并的近似共线线段越多，0.5 时肉眼仍看不出差别
+COMPACT_SIMPLIFY_THRESHOLD = 0.5
+RASTERIZE_HELPER = "_rasterize_dense_artists"
+
+
+def create_academic_style_code_block(options):
+    """
+    根据用户选项生成 Matplotlib rcParams 的 Python 代码块。
+    """
+    layout = options.get('layout', 'single')
+    width, height = ACADEMIC_FIGSIZES.get(layout, ACADEMIC_FIGSIZES['single'])
+    figsize_str = f"({width}, {height})"
+    column = '单栏' if layout == 'single' else '双栏'
+
+    style_settings = f"""
+{STYLE_BLOCK_MARKER}
+# 设置字体和字号以符合出版标准
+plt.rcParams.update({{
+    'font.family': 'sans-serif',
+    'font.sans-serif': ['Arial', 'Helvetica'], # 优先使用 Arial 或 Helvetica
+    'font.size': 10,                   # 全局基础字号
+    'axes.titlesize': 12,              # 图表标题字号
+    'axes.labelsize': 10,              # 坐标轴标签字号
+    'xtick.labelsize': 8,              # X轴刻度字号
+    'ytick.labelsize': 8,              # Y轴刻度字号
+    'legend.fontsize': 8,              # 图例字号
+    'figure.dpi': 300,                 # 图像分辨率
+    'figure.figsize': {figsize_str},  # {column}宽度
+}})
+{_compact_vector_settings() if options.get('compact_vector') else ''}# --------------------
+"""
+    return style_settings
+
+
+def _compact_vector_settings():
+    """紧凑矢量输出的 rcParams 与密集图元栅格化函数，拼接在学术风格代码块中。"""
+    return f"""# 紧凑矢量输出：路径简化；SVG 文字保留为文本而非字形路径；PDF/EPS 嵌入 TrueType 字体子集
+plt.rcParams.update({{
+    'path.simplify': True,
+    'path.simplify_threshold': {COMPACT_SIMPLIFY_THRESHOLD},
+    'svg.fonttype': 'none',
+    'pdf.fonttype': 42,
+    'ps.fonttype': 42,
+}})
+
+
+def {RASTERIZE_HELPER}(fig, threshold={COMPACT_RASTER_THRESHOLD}):
+    \"\"\"点数超过 threshold 的曲线、散点和网格改为栅格化输出，坐标轴、刻度和文字仍为矢量。\"\"\"
+    for ax in fig.get_axes():
+        for artist in list(ax.lines) + list(ax.collections):
+            if hasattr(artist, 'get_xydata'):
+                count = len(artist.get_xydata())
+            else:
+                count = len(artist.get_offsets()) + sum(len(path.vertices) for path in artist.get_paths())
+            if count > threshold:
+                artist.set_rasterized(True)
+
+"""
+
+
+def _dotted_name(node):
+    """把 a.b.c 形式的表达式还原为字符串，其它表达式返回 None。"""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return '.'.join(reversed(parts))
+    return None
+
+
+def find_pyplot_import(tree):
+    """
+    在模块顶层查找 pyplot 的导入语句，返回 (import 节点, 代码中使用的名字)，
+    例如 import matplotlib.pyplot as plt -> 'plt'；找不到时返回 (None, None)。
+    """
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == 'matplotlib.pyplot':
+                    return node, alias.asname or 'matplotlib.pyplot'
+        elif isinstance(node, ast.ImportFrom) and node.module == 'matplotlib':
+            for alias in node.names:
+                if alias.name == 'pyplot':
+                    return node, alias.asname or 'pyplot'
+    return None, None
+
+
+def _pyplot_calls(tree, pyplot_name, functions):
+    """按源码顺序返回形如 plt.<function>(...) 的调用节点。"""
+    calls = [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+        and node.func.attr in functions and _dotted_name(node.func.value) == pyplot_name
+    ]
+    calls.sort(key=lambda node: (node.lineno, node.col_offset))
+    return calls
+
+
+def _line_indent(line):
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _figsize_edit(call, figsize_str, lines, offsets):
+    """为创建画布的调用设置 figsize：已有 figsize 时替换其取值，否则追加关键字参数。"""
+    if any(keyword.arg is None for keyword in call.keywords):
+        return None  # 带 **kwargs 时无法确定是否已经传入 figsize，保持原样
+    for keyword in call.keywords:
+        if keyword.arg == 'figsize':
+            start, end = node_offsets(keyword.value, lines, offsets)
+            return start, end, figsize_str
+    arguments = list(call.args) + [keyword.value for keyword in call.keywords]
+    if arguments:
+        last_end = max(node_offsets(argument, lines, offsets)[1] for argument in arguments)
+        return last_end, last_end, f", figsize={figsize_str}"
+    call_end = node_offsets(call, lines, offsets)[1] - 1  # 右括号所在位置
+    return call_end, call_end, f"figsize={figsize_str}"
+
+
+def apply_academic_style(code, options, original_filepath, tree=None):
+    """
+    本地确定性地应用学术出版风格，不调用 API：
+    1. 在 pyplot 导入语句之后注入 rcParams 字体、字号设置（已注入过则跳过）；
+    2. 将 plt.figure / plt.subplots / plt.subplot_mosaic 的 figsize 设置为单栏或双栏尺寸；
+    3. 若选择了矢量图格式，在第一个 plt.show() 之前（没有 show 时在文件末尾）插入 savefig；
+       启用 compact_vector 时同时注入路径简化、字体子集化设置，并在保存前栅格化点数过多的图元。
+    所有修改按 AST 位置一次性拼接，原有的注释和排版保持不变。返回修改后的代码。
+    """
+    if tree is None:
+        tree = ast.parse(code)
+    import_node, pyplot_name = find_pyplot_import(tree)
+    if import_node is None:
+        print("警告：未找到 matplotlib.pyplot 的导入语句，无法应用学术风格。")
+        return code
+
+    offsets = line_offsets(code)
+    lines = split_lines(code, offsets)
+    edits = []
+
+    # 1. 字体与字号
+    if STYLE_BLOCK_MARKER not in code:
+        block = create_academic_style_code_block(options)
+        if pyplot_name != 'plt':
+            block = block.replace('plt.rcParams', f'{pyplot_name}.rcParams')
+        insert_at = offsets[import_node.end_lineno + 1]
+        prefix = '' if code[:insert_at].endswith(('\n', '\r')) or insert_at == 0 else '\n'
+        edits.append((insert_at, insert_at, prefix + block))
+        print("已注入字体、字号设置。")
+
+    # 2. 图表尺寸
+    layout = options.get('layout', 'single')
+    width, height = ACADEMIC_FIGSIZES.get(layout, ACADEMIC_FIGSIZES['single'])
+    figsize_str = f"({width}, {height})"
+    resized = 0
+    for call in _pyplot_calls(tree, pyplot_name, FIGURE_FUNCTIONS):
+        edit = _figsize_edit(call, figsize_str, lines, offsets)
+        if edit is not None:
+            edits.append(edit)
+            resized += 1
+    if resized:
+        print(f"已将 {resized} 处画布的 figsize 设置为 {figsize_str}。")
+
+    # 3. 保存为矢量图
+    vector_format = options.get('vector_format')
+    if vector_format:
+        base, _ = os.path.splitext(original_filepath)
+        # 生成保存文件的路径，例如 001_figure.pdf
+        output_filename = f"{base}_figure.{vector_format}"
+        already_saved = any(
+            call.args and isinstance(call.args[0], ast.Constant) and call.args[0].value == output_filename
+            for call in _pyplot_calls(tree, pyplot_name, {'savefig'})
+        )
+        if not already_saved:
+            savefig = f"{pyplot_name}.savefig({output_filename!r}, bbox_inches='tight')"
+            if options.get('compact_vector'):
+                savefig = f"{RASTERIZE_HELPER}({pyplot_name}.gcf())\n{savefig}"
+            shows = _pyplot_calls(tree, pyplot_name, {'show'})
+            if shows:
+                show_line = lines[shows[0].lineno - 1]
+                indent = _line_indent(show_line)
+                newline = show_line[len(show_line.rstrip('\r\n')):] or '\n'
+                insert_at = offsets[shows[0].lineno]
+                savefig = savefig.replace('\n', newline + indent)
+                edits.append((insert_at, insert_at, f"{indent}# 保存为矢量图格式{newline}{indent}{savefig}{newline}"))
+            else:
+                prefix = '' if not code or code.endswith(('\n', '\r')) else '\n'
+                edits.append((len(code), len(code), f"{prefix}\n# 保存为矢量图格式\n{savefig}\n"))
+            print(f"已注入保存矢量图的代码，将保存至: {output_filename}")
+
+    return apply_edits(code, edits)
+
+
+def _literal_int(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    return None
+
+
+# 创建子图网格的方法名：pyplot 的 subplots/subplot，以及 Figure 对象上的 subplots/add_subplot
+_SUBPLOT_FUNCTIONS = {'subplots', 'subplot', 'add_subplot'}
+# 使用这些方式排布子图时无法从参数判断行列数，交给 AI 判断；add_axes 多用于插图和颜色条，不在其列
+_UNCERTAIN_LAYOUT_FUNCTIONS = {'subplot_mosaic', 'add_gridspec', 'GridSpec', 'subplot2grid', 'subfigures'}
+
+
+def _subplot_grid(call):
+    """
+    从创建子图的调用中取出 (行数, 列数)：没有指定网格（如 add_subplot() 或 add_subplot(111)）时返回 (1, 1)，
+    行列数不是字面量或参数是 GridSpec 切片等无法本地判断的写法时返回 None。
+    """
+    keywords = {keyword.arg: keyword.value for keyword in call.keywords}
+    args = list(call.args)
+    if any(isinstance(arg, ast.Starred) for arg in args) or None in keywords:
+        return None
+    if call.func.attr in ('subplot', 'add_subplot') and len(args) <= 1:
+        if not args:
+            return 1, 1
+        code_number = _literal_int(args[0])
+        if code_number is None or not 100 < code_number < 1000:
+            return None
+        return code_number // 100, code_number // 10 % 10
+    row_node = args[0] if args else keywords.get('nrows')
+    col_node = args[1] if len(args) > 1 else keywords.get('ncols')
+    rows = 1 if row_node is None else _literal_int(row_node)
+    cols = 1 if col_node is None else _literal_int(col_node)
+    if rows is None or cols is None:
+        return None
+    return rows, cols
+
+
+def needs_subplot_relayout(code, tree=None):
+    """
+    判断是否存在值得交给 AI 重新排布的子图：单行或单列排列且至少 3 个子图（如 4x1、1x4），
+    包括 plt.subplots(4, 1)、plt.subplot(4, 1, k)、plt.subplot(411)，
+    以及任意 Figure 对象上的 fig.subplots(4, 1)、fig.add_subplot(4, 1, k) 等写法。
+    行列数不是字面量、或使用 GridSpec、subplot_mosaic 等无法本地判断的排布方式时，按需要处理，交给 AI 判断。
+    """
+    if tree is None:
+        tree = ast.parse(code)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, 'id', None)
+        if name in _UNCERTAIN_LAYOUT_FUNCTIONS:
+            return True
+        if not isinstance(node.func, ast.Attribute) or name not in _SUBPLOT_FUNCTIONS:
+            continue
+        grid = _subplot_grid(node)
+        if grid is None:
+            return True
+        rows, cols = grid
+        if min(rows, cols) == 1 and max(rows, cols) >= 3:
+            return True
+    return False
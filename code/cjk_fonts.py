@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import struct
+import argparse
+import threading
+
+# --- 配置区 ---
+# 字体索引缓存位置；字体目录及各字体文件的 mtime、大小都不变时直接复用，不再解析字体文件
+FONT_INDEX_PATH = os.getenv(
+    "SCIAGENT_FONT_INDEX",
+    os.path.join(os.getenv("DEEPSEEK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sciagent")),
+                 "cjk_fonts.json"),
+)
+# 与 Matplotlib 的系统字体搜索路径保持一致，只有这些目录中的字体才能在生成的脚本里按名字使用
+FONT_DIRS = [
+    "/usr/share/fonts", "/usr/local/share/fonts", "/usr/X11R6/lib/X11/fonts/TTF", "/usr/X11/lib/X11/fonts",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "fonts"),
+    os.path.join(os.path.expanduser("~"), ".fonts"),
+    "/Library/Fonts", "/System/Library/Fonts", "/Network/Library/Fonts",
+    os.path.join(os.path.expanduser("~"), "Library", "Fonts"),
+    os.path.join(os.getenv("WINDIR", "C:\\Windows"), "Fonts"),
+    os.path.join(os.getenv("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts") if os.getenv("LOCALAPPDATA") else "",
+]
+# 常见中文字体按显示效果排序，排在前面的优先；不在列表中的中文字体排在其后
+PREFERRED_CJK_FONTS = [
+    'Noto Sans CJK SC', 'Source Han Sans SC', 'Source Han Sans CN', 'Noto Sans SC',
+    'Microsoft YaHei', 'PingFang SC', 'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei',
+    'SimHei', 'Heiti SC', 'STHeiti', 'Hiragino Sans GB', 'Noto Sans CJK TC', 'Noto Sans CJK JP',
+    'Droid Sans Fallback', 'AR PL UMing CN', 'AR PL UKai CN',
+]
+# 注入到生成脚本中的字体数量上限
+MAX_INJECTED_FONTS = 3
+
+_FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+_INDEX_VERSION = 2
+# OS/2 表 ulCodePageRange1 中的代码页位：18 = GB2312（简体中文），20 = Big5（繁体中文），17 = JIS，19 = 韩文
+_CODEPAGE_CHINESE = (1 << 18) | (1 << 20)
+_CODEPAGE_CJK = _CODEPAGE_CHINESE | (1 << 17) | (1 << 19)
+# ulUnicodeRange2 第 59 位（即第二个 32 位字段的第 27 位）：CJK 统一表意文字
+_UNICODE_RANGE_CJK = 1 << 27
+
+_cached_fonts = None
+_cache_lock = threading.Lock()
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("字体文件被截断")
+    return data
+
+
+def _table_offsets(f):
+    """读取表目录，返回 {tag: (offset, length)}；.ttc 只读取第一个字体（与 Matplotlib 的处理一致）。"""
+    header = _read_at(f, 0, 12)
+    base = 0
+    if header[:4] == b'ttcf':
+        base = struct.unpack('>I', _read_at(f, 12, 4))[0]
+        header = _read_at(f, base, 12)
+    num_tables = struct.unpack('>H', header[4:6])[0]
+    directory = _read_at(f, base + 12, 16 * num_tables)
+    tables = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack('>4sIII', directory[16 * i:16 * (i + 1)])
+        tables[tag] = (offset, length)
+    return tables
+
+
+def _family_name(name_table):
+    """从 name 表中取英文字体族名：优先 Typographic Family (16)，其次 Family (1)，与 FreeType 的取法相同。"""
+    _, count, string_offset = struct.unpack('>HHH', name_table[:6])
+    candidates = {}
+    for i in range(count):
+        platform, encoding, language, name_id, length, offset = struct.unpack(
+            '>HHHHHH', name_table[6 + 12 * i:18 + 12 * i])
+        if name_id not in (1, 16):
+            continue
+        raw = name_table[string_offset + offset:string_offset + offset + length]
+        if (platform == 3 and language == 0x409) or platform == 0:
+            rank, text = 0, raw.decode('utf-16-be', errors='ignore')
+        elif platform == 1 and language == 0 and encoding == 0:
+            rank, text = 1, raw.decode('mac_roman', errors='ignore')
+        else:
+            continue
+        key = (name_id != 16, rank)
+        if text.strip() and key not in candidates:
+            candidates[key] = text.strip()
+    return candidates[min(candidates)] if candidates else None
+
+
+def read_font_info(path):
+    """
+    只读取字体文件的 name 和 OS/2 表（不加载字形数据），返回 (字体族名, 是否支持中文, 是否含 CJK 字符)，
+    无法解析时返回 None。
+    """
+    try:
+        with open(path, 'rb') as f:
+            tables = _table_offsets(f)
+            if b'name' not in tables:
+                return None
+            family = _family_name(_read_at(f, *tables[b'name']))
+            codepages = unicode_range2 = 0
+            if b'OS/2' in tables:
+                offset, length = tables[b'OS/2']
+                os2 = _read_at(f, offset, min(length, 86))
+                if len(os2) >= 50:
+                    unicode_range2 = struct.unpack('>I', os2[46:50])[0]
+                if len(os2) >= 82:
+                    codepages = struct.unpack('>I', os2[78:82])[0]
+    except (OSError, ValueError, struct.error):
+        return None
+    if not family:
+        return None
+    chinese = bool(codepages & _CODEPAGE_CHINESE)
+    cjk = chinese or bool(codepages & _CODEPAGE_CJK) or bool(unicode_range2 & _UNICODE_RANGE_CJK)
+    return family, chinese, cjk
+
+
+def _existing_font_dirs():
+    return [d for d in dict.fromkeys(FONT_DIRS) if d and os.path.isdir(d)]
+
+
+def font_fingerprint():
+    """
+    字体目录的指纹：{'dirs': {目录: mtime}, 'files': {字体文件: [mtime, 大小]}}，mtime 均为纳秒。
+    安装或删除字体会改变所在目录的 mtime，原地覆盖升级字体则只改变文件本身的 mtime 和大小，
+    两者都不变就说明字体没有变化；只需 stat，不用打开任何字体文件。
+    """
+    dirs, files = {}, {}
+    for font_dir in _existing_font_dirs():
+        for root, _, names in os.walk(font_dir):
+            try:
+                dirs[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            for name in names:
+                if not name.lower().endswith(_FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = [stat.st_mtime_ns, stat.st_size]
+    return {'dirs': dirs, 'files': files}
+
+
+def scan_cjk_fonts():
+    """扫描字体目录，返回含 CJK 字符的字体列表 [{'family', 'path', 'chinese'}]。"""
+    fonts = []
+    for font_dir in _existing_font_dirs():
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                if not name.lower().endswith(_FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                info = read_font_info(path)
+                if info and info[2]:
+                    fonts.append({'family': info[0], 'path': path, 'chinese': info[1]})
+    return fonts
+
+
+def _load_index():
+    try:
+        with open(FONT_INDEX_PATH, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        return index if isinstance(index, dict) and index.get('version') == _INDEX_VERSION else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_index(index):
+    try:
+        if os.path.dirname(FONT_INDEX_PATH):
+            os.makedirs(os.path.dirname(FONT_INDEX_PATH), exist_ok=True)
+        tmp_path = f"{FONT_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, FONT_INDEX_PATH)
+    except OSError as e:
+        print(f"写入字体索引失败: {e}")
+
+
+def load_cjk_fonts(rebuild=False):
+    """
+    返回本机可用的 CJK 字体列表。字体目录指纹（目录 mtime、字体文件 mtime 与大小）与索引中记录的一致时
+    直接读取索引，否则重新扫描并写回索引；同一进程内只检查一次。
+    """
+    global _cached_fonts
+    with _cache_lock:
+        if _cached_fonts is not None and not rebuild:
+            return _cached_fonts
+        fingerprint = font_fingerprint()
+        index = None if rebuild else _load_index()
+        if index is None or any(index.get(key) != value for key, value in fingerprint.items()):
+            print("字体目录有变化，正在重建中文字体索引...")
+            index = {'version': _INDEX_VERSION, **fingerprint, 'fonts': scan_cjk_fonts()}
+            _save_index(index)
+        _cached_fonts = index['fonts']
+        return _cached_fonts
+
+
+def rank_fonts(fonts):
+    """按 PREFERRED_CJK_FONTS 排序去重：常用中文字体在前，其余支持中文的次之，只含日韩字符的最后。"""
+    preferred = {name.lower(): i for i, name in enumerate(PREFERRED_CJK_FONTS)}
+    families = {}
+    for font in fonts:
+        family = font['family']
+        rank = (preferred.get(family.lower(), len(preferred)), not font['chinese'], family.lower())
+        families[family] = min(rank, families.get(family, rank))
+    return sorted(families, key=families.get)
+
+
+def best_cjk_fonts(limit=MAX_INJECTED_FONTS):
+    """
+    返回最适合注入 font.sans-serif 的中文字体族名列表。一个都没有时返回空列表：
+    注入本机不存在的字体名（如 SimHei）只会让 Matplotlib 对每段文字报 findfont 警告，中文照样显示为方框。
+    """
+    return rank_fonts(load_cjk_fonts())[:limit]
+
+
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python cjk_fonts.py            # 列出检测到的中文字体及注入顺序
+    #     python cjk_fonts.py --rebuild  # 忽略索引重新扫描
+    parser = argparse.ArgumentParser(description="检测本机可用于 Matplotlib 的中文字体")
+    parser.add_argument('--rebuild', action='store_true', help="忽略已有索引，重新扫描字体目录")
+    args = parser.parse_args()
+
+    fonts = load_cjk_fonts(rebuild=args.rebuild)
+    families = rank_fonts(fonts)
+    if not families:
+        print("未检测到中文字体，生成的脚本中中文将无法显示（可安装 fonts-noto-cjk 或 fonts-wqy-microhei）。")
+        sys.exit(0)
+    print(f"检测到 {len(families)} 个 CJK 字体族（索引: {FONT_INDEX_PATH}）:")
+    for family in families:
+        paths = [font['path'] for font in fonts if font['family'] == family]
+        print(f"  {family}  ({len(paths)} 个文件，例如 {paths[0]})")
+    print(f"注入顺序: {best_cjk_fonts()}")
@@ -1,60 +1,101 @@
 import os
-import requests
 import json
+import asyncio
+import llm_client
+import job_manifest
+from rate_limiter import per_job_retry_budget, job_retry_budget
+from llm_client import call_deepseek_api as _call_llm, run_blocking, run_concurrently
+from code_chunker import estimate_tokens, needs_chunking
+from symbol_index import get_symbol_index
+from unit_cache import analyze_units, cached_note, unit_heading
+from math_extractor import build_math_context
+from variable_renamer import parse_naming_rules, collect_rename_candidates, rename_variables
 
-# --- 配置区  ---
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
+# --- 配置区 ---
+# 处理逻辑或提示词变化时提高版本号，处理清单中旧版本生成的结果会被重新生成
+AGENT_VERSION = "1.5"
 
 # --- DeepSeek API 调用封装  ---
-def call_deepseek_api(prompt):
-    """调用 DeepSeek API 的通用函数"""
-    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
-        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
-    # ... (此函数内部逻辑与上一个 Agent 完全相同，为简洁省略)
-    payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": prompt}]}
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {DEEPSEEK_API_KEY}"}
-    try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=300)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
-    except requests.exceptions.RequestException as e:
-        print(f"调用 DeepSeek API 时发生网络错误: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"解析 DeepSeek API 响应时出错: {e}, 响应内容: {response.text}")
-        return None
+# API Key、URL、连接池等配置统一由 llm_client 管理
+def call_deepseek_api(prompt, system_prompt=None, is_json_mode=False, task=None):
+    """调用 DeepSeek API 的通用函数（复用共享连接池）。task 为遥测中记录的业务函数名，缺省时从调用栈推断。"""
+    return _call_llm(prompt, agent='analyst', is_json_mode=is_json_mode, system_prompt=system_prompt, task=task)
+
+# --- 固定提示词 ---
+# 角色与规则等不随选项变化的内容放在 system 消息中，作为稳定的请求前缀，
+# 以便命中 DeepSeek 的上下文硬盘缓存；选项、规范和代码等可变内容放在 user 消息末尾。
+ANALYSIS_SYSTEM_PROMPT = """
+你是一名资深的科研软件工程师，擅长阅读和理解科学计算代码，并为其撰写清晰的技术文档。
+
+你的任务是分析用户提供的 Python 脚本（或脚本片段、片段分析笔记），并根据用户给出的分析要求生成 Markdown 格式的分析内容。
+
+**输出规则**:
+- 你的回答必须是纯粹的 Markdown 格式内容。
+- 不要包含任何前言、结语或与文档内容无关的文字。
+"""
+
+REDEFINE_SYSTEM_PROMPT = """
+你是一名代码重构专家，严格遵守团队的编码规范。用户会提供变量命名规范，以及从一段 Python 脚本中提取出的、按作用域分组的变量清单
+（每个变量附有它首次出现的那一行代码）。你的任务是给出变量重命名映射，重命名本身由程序在本地完成。
+
+**核心指令**:
+1.  **严格遵循规范**: 仔细阅读“变量命名规范”，理解每个变量在代码中的含义，并与规范中的描述进行语义匹配。例如，如果规范说“标准差使用`sigma`”，而代码中使用了`std_dev`，就把它重命名为`sigma`。
+2.  **只处理清单中的变量**: 只能重命名清单中列出的变量；函数名、类名、导入的库（如 `np`, `pd`, `plt`）、属性和字符串都不在清单中，也不能出现在映射里。
+3.  **只列出需要修改的变量**: 已经符合规范的变量不要写进映射。
+4.  **避免冲突**: 同一作用域内不同变量不能改成同一个名字。
+
+**输出格式**:
+只输出一个 JSON 对象，键为作用域名（与清单中的写法完全一致），值为该作用域内 “旧名 → 新名” 的变量重命名映射，例如:
+{"<module>": {"num_pts": "num_points"}, "generate_data": {"std_dev": "sigma"}}
+不需要任何修改时输出 {}。
+"""
 
 # --- 核心功能函数 ---
 
 def generate_analysis_markdown(code_content, requested_sections):
     """
     功能 1 & 2: 生成代码分析的 Markdown 文档。
+    功能 2 优先使用本地提取的公式素材（见 math_extractor）：只把公式片段、LaTeX 草稿和变量表交给模型润色，
+    不再发送整个文件；与功能 1 并发进行。本地没有提取到任何公式时仍按整文件分析。
+    超出单次预算的大文件，功能 1（以及没有提取到公式时的功能 2）改为逐单元分析。
     """
-    instructions = []
+    structure_instruction = math_instruction = None
     if 'structure' in requested_sections:
-        instructions.append(
-            "1. **代码建构思路**: 详细分析此脚本的整体结构和设计思路。描述其主要步骤，例如数据输入、核心计算、最终输出等，解释各个函数或代码块的作用和它们之间的联系。"
-        )
+        structure_instruction = "1. **代码建构思路**: 详细分析此脚本的整体结构和设计思路。描述其主要步骤，例如数据输入、核心计算、最终输出等，解释各个函数或代码块的作用和它们之间的联系。"
     if 'math' in requested_sections:
-        instructions.append(
-            "2. **数学公式与变量总结**: 识别并提取代码中实现或注释中提及的所有数学公式。使用标准的 LaTeX 格式进行排版（例如，使用 `$` 或 `$$` 分隔符）。同时，列出这些公式中关键数学变量的含义。"
-        )
-    
+        math_instruction = "2. **数学公式与变量总结**: 识别并提取代码中实现或注释中提及的所有数学公式。使用标准的 LaTeX 格式进行排版（例如，使用 `$` 或 `$$` 分隔符）。同时，列出这些公式中关键数学变量的含义。"
+    instructions = [instruction for instruction in (structure_instruction, math_instruction) if instruction]
     if not instructions:
         return ""
 
-    prompt = f"""
-你是一名资深的科研软件工程师，擅长阅读和理解科学计算代码，并为其撰写清晰的技术文档。
+    # 大文件逐单元分析，其余整文件一次请求
+    generate = generate_analysis_markdown_chunked if needs_chunking(code_content) else _generate_whole_file_markdown
 
-你的任务是分析下面提供的 Python 脚本，并根据以下要求生成一份详细的 Markdown 格式的分析报告。
+    math_context = None
+    if math_instruction:
+        try:
+            math_context = build_math_context(code_content)
+        except SyntaxError:
+            math_context = None
+    if math_context is None:
+        analysis_content = generate(code_content, instructions)
+    else:
+        jobs = [lambda: generate_math_markdown(math_instruction, math_context)]
+        if structure_instruction:
+            jobs.insert(0, lambda: generate(code_content, [structure_instruction]))
+        parts = run_concurrently(lambda job: job(), jobs)
+        analysis_content = "\n\n".join(parts) if all(parts) else None
+    return analysis_content if analysis_content else "# 分析失败\nAI 未能成功生成分析文档。"
 
-**分析要求**:
-{"\n".join(instructions)}
 
-**输出规则**:
-- 你的回答必须是纯粹的 Markdown 格式内容。
-- 不要包含任何前言、结语或与文档内容无关的文字。
+def _generate_whole_file_markdown(code_content, instructions):
+    """把整个文件连同分析要求一起发送，返回生成的 Markdown，失败时返回 None。"""
+    requirements = "\n".join(instructions)
+    prompt = f"""
+请分析下面提供的 Python 脚本，并根据以下要求生成一份详细的 Markdown 格式的分析报告。
+
+**分析要求**:
+{requirements}
 
 **需要分析的 Python 脚本**:
 111python
@@ -62,103 +103,292 @@ def generate_analysis_markdown(code_content, requested_sections):
 111
 """
     print("正在请求 AI 生成代码分析文档...")
-    analysis_content = call_deepseek_api(prompt)
-    return analysis_content if analysis_content else "# 分析失败\nAI 未能成功生成分析文档。"
+    # 可能与公式部分一起在线程池中执行，遥测统一记在 generate_analysis_markdown 名下
+    return call_deepseek_api(prompt, system_prompt=ANALYSIS_SYSTEM_PROMPT, task='generate_analysis_markdown')
 
 
-def redefine_variables_in_code(code_content, standards_content):
-    """
-    功能 3: 根据规范文档，重构代码中的变量名。
-    """
+def generate_math_markdown(math_instruction, math_context):
+    """用本地提取的公式素材生成功能 2 的内容：模型只需核对、润色 LaTeX 草稿，提示词不包含完整源码。"""
     prompt = f"""
-你是一名代码重构专家，严格遵守团队的编码规范。你的任务是接收一段 Python 脚本和一个变量命名规范文档，然后将脚本中的变量名修改为符合规范的名称。
+下面不是完整的脚本，而是程序从脚本中本地提取出的数学公式片段、自动生成的 LaTeX 草稿和变量表。
+请据此完成以下分析要求：核对并润色 LaTeX 草稿（把程序猜测的符号换成更贴切的数学记号、合并表达同一公式的多个步骤并统一编号），
+说明每个公式的含义；不要编造素材中没有出现的公式。
 
-**核心指令**:
-1.  **严格遵循规范**: 仔细阅读下面的“变量命名规范”，并将其应用到“原始 Python 脚本”中。
-2.  **仅重命名变量**: 你的唯一任务是重命名变量。绝对不能修改任何代码的执行逻辑、算法、函数调用、控制流或输出结果。
-3.  **智能匹配**: 你需要理解变量在代码中的上下文含义，并与规范文档中的描述进行语义匹配。例如，如果规范说“标准差使用`sigma`”，而代码中使用了`std_dev`，你需要将其重命名为`sigma`。
-4.  **保留原样**: 所有注释、字符串内容、函数名以及导入的库（如 `np`, `pd`, `plt`）必须保持原样。
-5.  **全局一致**: 确保一个变量在整个脚本中的所有出现都被一致地重命名。
+**分析要求**:
+{math_instruction}
 
-**输出规则**:
-- 你的回复必须且只能是经过重构后的完整 Python 代码。
-- 不要包含任何解释或格式化标记，例如 111python ... 111。
+{math_context}
+"""
+
+    def request():
+        print(f"正在请求 AI 润色本地提取的公式（约 {estimate_tokens(math_context)} tokens，未发送完整源码）...")
+        return call_deepseek_api(prompt, system_prompt=ANALYSIS_SYSTEM_PROMPT, task='generate_math_markdown')
+
+    # 按公式素材（含行号）的哈希缓存，公式及其位置都没有变化时不再请求模型
+    return cached_note('analyst', [llm_client.DEEPSEEK_MODEL, AGENT_VERSION, ANALYSIS_SYSTEM_PROMPT, math_instruction],
+                       math_context, request)
 
-**变量命名规范**:
-111plaintext
-{standards_content}
-111
 
-**原始 Python 脚本**:
+def generate_analysis_markdown_chunked(code_content, instructions):
+    """
+    大文件的逐单元文档生成：按顶层函数、类和模块级代码拆分，各单元的分析按规范化 AST 哈希缓存，
+    只有新增或改动的单元才请求模型，最后在本地按源码顺序拼接成文档。修改一个函数只需重新分析这一个函数。
+    """
+    requirements = "\n".join(instructions)
+    print(f"代码约 {estimate_tokens(code_content)} tokens，按函数/类逐个分析...")
+
+    def analyze_unit(unit, dependencies):
+        prompt = f"""
+下面是一个较大 Python 脚本中的一个单元（{unit.name}）。各单元分别分析后按源码顺序直接拼接成完整文档，
+请针对这个单元，按以下要求写一节简明的分析，小标题只使用 #### 级别，不要引用行号：
+{requirements}
+{f"单元中使用了在其他位置定义的: {dependencies}" if dependencies else ""}
+
+**单元代码**:
 111python
-{code_content}
+{unit.source}
 111
 """
-    print("正在请求 AI 重构变量名...")
-    refactored_code = call_deepseek_api(prompt)
-    return refactored_code
+        return call_deepseek_api(prompt, system_prompt=ANALYSIS_SYSTEM_PROMPT)
 
-def analyze_codebase(filepath, naming_standards_path, options):
+    unit_notes = analyze_units(code_content, 'analyst',
+                               [llm_client.DEEPSEEK_MODEL, AGENT_VERSION, ANALYSIS_SYSTEM_PROMPT, requirements],
+                               analyze_unit)
+    if unit_notes is None:
+        return None
+    sections = [f"### {unit_heading(item.unit)}\n\n{item.note.strip()}" for item in unit_notes]
+    return (f"## 代码分析文档\n\n代码较长，以下按源码顺序逐个分析其中的 {len(unit_notes)} 个函数、类和模块级代码。\n\n---\n\n"
+            + "\n\n---\n\n".join(sections) + "\n")
+
+
+def _format_naming_standards(standards_content):
+    """把规范文档整理成紧凑的规则列表；无法解析出任何规则时原样使用文档内容。"""
+    rules, general_rules = parse_naming_rules(standards_content)
+    if not rules:
+        return standards_content.strip()
+    lines = [f"- {rule}" for rule in general_rules]
+    lines += [f"- [{rule.section}] {rule.meaning} -> {rule.name}" if rule.section else f"- {rule.meaning} -> {rule.name}"
+              for rule in rules]
+    return "\n".join(lines)
+
+
+def redefine_variables_in_code(code_content, standards_content):
     """
-    主处理函数，根据用户选项调度各项功能。
+    功能 3: 根据规范文档，重构代码中的变量名。
+    模型只根据规范和变量清单返回 “旧名 → 新名” 的 JSON 映射，重命名在本地按作用域完成（见 variable_renamer），
+    字符串、注释、属性、导入和执行逻辑都不会被改动。
     """
-    print(f"--- 开始处理文件: {filepath} ---")
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            code_content = f.read()
+        index = get_symbol_index(code_content)
+        candidates = collect_rename_candidates(code_content, index)
+    except SyntaxError as e:
+        print(f"X 代码无法解析，无法重构变量名: {e}")
+        return None
+    if not candidates:
+        print("代码中没有可以重命名的变量。")
+        return code_content
+
+    variables = {
+        scope: {candidate.name: ("参数 | " if candidate.kind == 'parameter' else "") + candidate.line
+                for candidate in scope_candidates}
+        for scope, scope_candidates in candidates.items()
+    }
+    prompt = f"""
+**变量命名规范**:
+{_format_naming_standards(standards_content)}
+
+**脚本中的变量清单**（作用域 -> 变量名 -> 首次出现的代码行）:
+{json.dumps(variables, ensure_ascii=False, indent=1)}
+"""
+    print(f"正在请求 AI 给出 {sum(len(c) for c in candidates.values())} 个变量的重命名映射...")
+    reply = call_deepseek_api(prompt, system_prompt=REDEFINE_SYSTEM_PROMPT, is_json_mode=True)
+    if not reply:
+        return None
+    try:
+        mapping = json.loads(reply)
+    except json.JSONDecodeError:
+        print(f"AI 返回的重命名映射不是有效的 JSON，已忽略。返回内容: {reply[:200]}...")
+        return None
+    if not isinstance(mapping, dict):
+        print("AI 返回的重命名映射格式不正确，已忽略。")
+        return None
+
+    refactored_code, applied, rejected = rename_variables(code_content, mapping, index)
+    for scope, old, new in applied:
+        print(f"  [{scope}] {old} -> {new}")
+    for scope, old, new, reason in rejected:
+        print(f"  跳过 [{scope}] {old} -> {new}: {reason}")
+    print(f"已在本地完成 {len(applied)} 个变量的重命名。")
+    return refactored_code
+
+def _read_text(path, label):
+    """读取文本文件，失败时打印错误并返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
     except Exception as e:
-        print(f"读取 Python 脚本 '{filepath}' 失败: {e}")
-        return
+        print(f"读取{label} '{path}' 失败: {e}")
+        return None
 
-    # --- 处理功能 1 和 2: 生成 Markdown 文档 ---
+
+def _markdown_sections(options):
+    """将用户选项转换为文档生成需要的章节列表。"""
     markdown_sections = []
     if '1' in options:
         markdown_sections.append('structure')
     if '2' in options:
         markdown_sections.append('math')
+    return markdown_sections
+
+
+def _load_naming_standards(naming_standards_path):
+    """读取变量命名规范文件，失败时打印原因并返回 None。"""
+    if not naming_standards_path or not os.path.exists(naming_standards_path):
+        print(f"X 功能 3 失败: 变量命名规范文件未提供或路径错误 '{naming_standards_path}'。")
+        return None
+    return _read_text(naming_standards_path, "规范文件")
+
+
+def _markdown_path(filepath):
+    base, _ = os.path.splitext(filepath)
+    return f"{base}_analysis.md"
+
+
+def _redefined_path(filepath):
+    base, ext = os.path.splitext(filepath)
+    return f"{base}_redefined{ext}"
+
+
+def _save_markdown(filepath, markdown_content):
+    """保存功能 1/2 生成的分析文档，成功时返回文件路径。"""
+    if not markdown_content:
+        return None
+    md_filepath = _markdown_path(filepath)
+    try:
+        with open(md_filepath, 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+        print(f"√ 功能 1/2 完成: 分析文档已保存至 -> {md_filepath}")
+        return md_filepath
+    except Exception as e:
+        print(f"保存 Markdown 文件失败: {e}")
+        return None
+
+
+def _save_redefined(filepath, refactored_code):
+    """校验并保存功能 3 生成的重构代码，成功时返回文件路径。"""
+    if refactored_code and ('import' in refactored_code or 'def' in refactored_code):
+        redefined_filepath = _redefined_path(filepath)
+        try:
+            with open(redefined_filepath, 'w', encoding='utf-8') as f:
+                f.write(refactored_code)
+            print(f"√ 功能 3 完成: 变量重构后的代码已保存至 -> {redefined_filepath}")
+            return redefined_filepath
+        except Exception as e:
+            print(f"保存重构代码文件失败: {e}")
+    else:
+        print("X 功能 3 失败: AI 未能成功生成重构代码。")
+    return None
+
+
+# 分析文档与变量重构是两个独立的任务，在处理清单中分别记录，任一项的选项变化不影响另一项
+def _markdown_job_key(code_content, markdown_sections):
+    return (job_manifest.content_hash(code_content),
+            job_manifest.options_hash({'sections': sorted(markdown_sections), 'model': llm_client.DEEPSEEK_MODEL}))
+
+
+def _redefine_job_key(code_content, standards_content):
+    return (job_manifest.content_hash(code_content),
+            job_manifest.options_hash({'standards': job_manifest.content_hash(standards_content),
+                                       'model': llm_client.DEEPSEEK_MODEL}))
+
 
+def _is_fresh(job, filepath, job_key):
+    if job_manifest.is_up_to_date(job, filepath, *job_key, AGENT_VERSION):
+        print(f"源码与选项均未变化，跳过 {job} 任务。")
+        return True
+    return False
+
+
+def _record(job, filepath, job_key, output_path):
+    if output_path:
+        job_manifest.record_job(job, filepath, *job_key, AGENT_VERSION, [output_path])
+
+
+@per_job_retry_budget
+def analyze_codebase(filepath, naming_standards_path, options):
+    """
+    主处理函数，根据用户选项调度各项功能。
+    """
+    print(f"--- 开始处理文件: {filepath} ---")
+
+    code_content = _read_text(filepath, " Python 脚本")
+    if code_content is None:
+        return
+
+    # --- 处理功能 1 和 2: 生成 Markdown 文档 ---
+    markdown_sections = _markdown_sections(options)
     if markdown_sections:
-        markdown_content = generate_analysis_markdown(code_content, markdown_sections)
-        if markdown_content:
-            base, _ = os.path.splitext(filepath)
-            md_filepath = f"{base}_analysis.md"
-            try:
-                with open(md_filepath, 'w', encoding='utf-8') as f:
-                    f.write(markdown_content)
-                print(f"√ 功能 1/2 完成: 分析文档已保存至 -> {md_filepath}")
-            except Exception as e:
-                print(f"保存 Markdown 文件失败: {e}")
-    
+        job_key = _markdown_job_key(code_content, markdown_sections)
+        if not _is_fresh('analyst.markdown', filepath, job_key):
+            output_path = _save_markdown(filepath, generate_analysis_markdown(code_content, markdown_sections))
+            _record('analyst.markdown', filepath, job_key, output_path)
+
     # --- 处理功能 3: 重构变量名 ---
     if '3' in options:
-        if not naming_standards_path or not os.path.exists(naming_standards_path):
-            print(f"X 功能 3 失败: 变量命名规范文件未提供或路径错误 '{naming_standards_path}'。")
-            return
-            
-        try:
-            with open(naming_standards_path, 'r', encoding='utf-8') as f:
-                standards_content = f.read()
-        except Exception as e:
-            print(f"读取规范文件 '{naming_standards_path}' 失败: {e}")
+        standards_content = _load_naming_standards(naming_standards_path)
+        if standards_content is None:
             return
-            
-        refactored_code = redefine_variables_in_code(code_content, standards_content)
-        if refactored_code and ('import' in refactored_code or 'def' in refactored_code):
-            base, ext = os.path.splitext(filepath)
-            redefined_filepath = f"{base}_redefined{ext}"
-            try:
-                with open(redefined_filepath, 'w', encoding='utf-8') as f:
-                    f.write(refactored_code)
-                print(f"√ 功能 3 完成: 变量重构后的代码已保存至 -> {redefined_filepath}")
-            except Exception as e:
-                print(f"保存重构代码文件失败: {e}")
-        else:
-            print("X 功能 3 失败: AI 未能成功生成重构代码。")
+        job_key = _redefine_job_key(code_content, standards_content)
+        if not _is_fresh('analyst.redefine', filepath, job_key):
+            output_path = _save_redefined(filepath, redefine_variables_in_code(code_content, standards_content))
+            _record('analyst.redefine', filepath, job_key, output_path)
+
+    print("--- 所有任务处理完毕 ---")
+
+
+async def analyze_codebase_async(filepath, naming_standards_path, options):
+    """
+    analyze_codebase 的异步版本。
+    文档生成与变量重构互不依赖，两个请求并发发出，总耗时接近较慢的那一个。
+    """
+    print(f"--- 开始处理文件: {filepath} ---")
+
+    code_content = _read_text(filepath, " Python 脚本")
+    if code_content is None:
+        return
+
+    tasks = {}
+    job_keys = {}
+    markdown_sections = _markdown_sections(options)
+    if markdown_sections:
+        job_keys['markdown'] = _markdown_job_key(code_content, markdown_sections)
+        if not _is_fresh('analyst.markdown', filepath, job_keys['markdown']):
+            tasks['markdown'] = run_blocking(generate_analysis_markdown, code_content, markdown_sections)
+    if '3' in options:
+        standards_content = _load_naming_standards(naming_standards_path)
+        if standards_content is not None:
+            job_keys['redefine'] = _redefine_job_key(code_content, standards_content)
+            if not _is_fresh('analyst.redefine', filepath, job_keys['redefine']):
+                tasks['redefine'] = run_blocking(redefine_variables_in_code, code_content, standards_content)
+
+    # 两个请求共享同一个任务级重试预算
+    with job_retry_budget():
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    if 'markdown' in results:
+        _record('analyst.markdown', filepath, job_keys['markdown'], _save_markdown(filepath, results['markdown']))
+    if 'redefine' in results:
+        _record('analyst.redefine', filepath, job_keys['redefine'], _save_redefined(filepath, results['redefine']))
 
     print("--- 所有任务处理完毕 ---")
 
 
+async def analyze_many_async(filepaths, naming_standards_path, options):
+    """并发分析多个文件，在途请求总数由 llm_client 的全局信号量限制。"""
+    await asyncio.gather(*(
+        analyze_codebase_async(path, naming_standards_path, options) for path in filepaths
+    ))
+
+
 # --- 主程序入口 ---
 if __name__ == '__main__':
     py_file = input("请输入要分析的 Python 文件路径 (例如: 003.py): ")
@@ -0,0 +1,152 @@
+import os
+import ast
+from collections import namedtuple
+
+# --- 配置区 ---
+# 单个分块允许的最大 token 数（只计代码本身，不含提示词），可通过环境变量调整
+CHUNK_TOKEN_BUDGET = int(os.getenv("SCIAGENT_CHUNK_TOKENS", "6000"))
+
+# 一个分析单元：顶层函数、类或一段连续的模块级代码
+# kind: 'function' / 'class' / 'module'；start_line、end_line 为 1 起始的闭区间
+CodeUnit = namedtuple('CodeUnit', ['kind', 'name', 'start_line', 'end_line', 'source'])
+
+
+def estimate_tokens(text):
+    """
+    本地估算 token 数，无需调用分词器。
+    按 DeepSeek 官方给出的经验比例：1 个英文字符约 0.3 token，1 个中文字符约 0.6 token。
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars * 0.3 + other_chars * 0.6) + 1
+
+
+def _node_start_line(node, lines):
+    """节点的起始行：包含装饰器以及紧贴在上方的注释行。"""
+    start = node.lineno
+    for decorator in getattr(node, 'decorator_list', []):
+        start = min(start, decorator.lineno)
+    while start > 1 and lines[start - 2].strip().startswith('#'):
+        start -= 1
+    return start
+
+
+def _slice(lines, start_line, end_line):
+    return '\n'.join(lines[start_line - 1:end_line])
+
+
+def split_into_units(code_content, tree=None):
+    """
+    按 AST 将模块拆分为顶层单元：每个函数、类各自成为一个单元，
+    相邻的模块级语句（导入、常量、主流程等）合并为一个 'module' 单元。
+    单元按源码顺序返回，且首尾相接地覆盖整个文件。
+    """
+    if tree is None:
+        tree = ast.parse(code_content)
+    lines = code_content.split('\n')
+    units = []
+    pending_start = 1
+    pending_names = []
+
+    def flush(end_line):
+        if end_line >= pending_start:
+            source = _slice(lines, pending_start, end_line)
+            if source.strip():
+                name = ', '.join(pending_names) if pending_names else '<module>'
+                units.append(CodeUnit('module', name, pending_start, end_line, source))
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = max(_node_start_line(node, lines), pending_start)
+            flush(start - 1)
+            kind = 'class' if isinstance(node, ast.ClassDef) else 'function'
+            units.append(CodeUnit(kind, node.name, start, node.end_lineno, _slice(lines, start, node.end_lineno)))
+            pending_start = node.end_lineno + 1
+            pending_names = []
+        elif isinstance(node, ast.If) and _is_main_guard(node):
+            pending_names.append('__main__')
+        else:
+            for target in getattr(node, 'targets', []):
+                if isinstance(target, ast.Name):
+                    pending_names.append(target.id)
+    flush(len(lines))
+    return units
+
+
+def _is_main_guard(node):
+    test = node.test
+    return (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name)
+            and test.left.id == '__name__')
+
+
+def _split_oversized(unit, budget):
+    """
+    单元本身超出预算时继续拆分：类按方法拆开（每块附带类头），
+    其它情况按行切分，尽量在空行处断开。
+    """
+    lines = unit.source.split('\n')
+    if unit.kind == 'class':
+        try:
+            class_node = ast.parse(unit.source).body[0]
+        except (SyntaxError, IndexError):
+            class_node = None
+        if isinstance(class_node, ast.ClassDef) and class_node.body:
+            first = class_node.body[0]
+            header_end = _node_start_line(first, lines) - 1
+            header = _slice(lines, 1, header_end)
+            pieces, seg_start = [], header_end + 1
+            for index, member in enumerate(class_node.body):
+                seg_end = (_node_start_line(class_node.body[index + 1], lines) - 1
+                           if index + 1 < len(class_node.body) else len(lines))
+                if isinstance(member, (ast.FunctionDef, ast.AsyncFunctionDef)) or index + 1 == len(class_node.body):
+                    name = member.name if hasattr(member, 'name') else '<body>'
+                    pieces.append(CodeUnit(
+                        'function', f"{unit.name}.{name}",
+                        unit.start_line + seg_start - 1, unit.start_line + seg_end - 1,
+                        header + '\n' + _slice(lines, seg_start, seg_end),
+                    ))
+                    seg_start = seg_end + 1
+            if pieces and all(estimate_tokens(p.source) <= budget for p in pieces):
+                return pieces
+
+    pieces, current_start, current = [], 0, []
+    for line in lines:
+        current.append(line)
+        if estimate_tokens('\n'.join(current)) > budget and (not line.strip() or len(current) > 1):
+            cut = len(current) if not line.strip() else len(current) - 1
+            body = current[:cut]
+            pieces.append(CodeUnit(unit.kind, f"{unit.name}[{len(pieces) + 1}]",
+                                   unit.start_line + current_start,
+                                   unit.start_line + current_start + len(body) - 1, '\n'.join(body)))
+            current_start += len(body)
+            current = current[cut:]
+    if current:
+        pieces.append(CodeUnit(unit.kind, f"{unit.name}[{len(pieces) + 1}]",
+                               unit.start_line + current_start,
+                               unit.start_line + current_start + len(current) - 1, '\n'.join(current)))
+    return pieces
+
+
+def split_units(code_content, budget=CHUNK_TOKEN_BUDGET, tree=None):
+    """顶层单元列表，其中超出 budget 的单元已继续拆开（类按方法、其余按行）。"""
+    units = []
+    for unit in split_into_units(code_content, tree):
+        if estimate_tokens(unit.source) > budget:
+            units.extend(_split_oversized(unit, budget))
+        else:
+            units.append(unit)
+    return units
+
+
+def needs_chunking(code_content, budget=CHUNK_TOKEN_BUDGET):
+    """代码是否超出单次请求的预算，需要走分块分析。"""
+    return estimate_tokens(code_content) > budget
+
+
+def describe_dependencies(unit, index):
+    """
+    用符号索引列出单元（CodeUnit）读取、但定义在其之外的模块级名字，例如 “DT（第 12 行）, solve（第 40 行）”，
+    让逐单元分析时知道这些名字来自哪里；没有外部依赖时返回空字符串。index 为整个文件的 SymbolIndex。
+    """
+    references = index.external_references(unit.start_line, unit.end_line)
+    return ', '.join(f"{name}（第 {line} 行）" for name, line in references)
@@ -1,58 +1,36 @@
 import os
-import requests
 import json
 import ast
+import asyncio
+import llm_client
+import job_manifest
+from rate_limiter import per_job_retry_budget
+from llm_client import call_deepseek_api as _call_llm, stream_deepseek_api as _stream_llm, run_blocking, run_concurrently
+from code_chunker import estimate_tokens, needs_chunking
+from unit_cache import analyze_units, cached_note, unit_heading
+from math_extractor import build_math_context
 
 # --- 配置区 ---
-# 请在这里填入你的 DeepSeek API Key
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# 处理逻辑或提示词变化时提高版本号，处理清单中旧版本生成的结果会被重新生成
+AGENT_VERSION = "1.4"
 
 # --- DeepSeek API 调用封装 ---
-def call_deepseek_api(prompt):
-    """调用 DeepSeek API 的通用函数"""
-    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
-        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
-
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.1, # 使用较低的温度，让输出更稳定和精确
-        "max_tokens": 16384,
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-
-    try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=180)
-        response.raise_for_status()
-        
-        result_content = response.json()['choices'][0]['message']['content']
-        return result_content
-    except requests.exceptions.RequestException as e:
-        print(f"调用 DeepSeek API 时发生网络错误: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"解析 DeepSeek API 响应时出错: {e}, 响应内容: {response.text}")
-        return None
-
-# --- 核心功能函数 ---
-
-def analyze_and_explain_code(code_content):
+# API Key、URL、连接池等配置统一由 llm_client 管理
+def call_deepseek_api(prompt, system_prompt=None, stream_to=None, task=None):
     """
-    使用 DeepSeek API 分析代码，生成功能总结、思路和LaTeX公式。
+    调用 DeepSeek API 的通用函数（复用共享连接池）。
+    传入 stream_to（可写的文件对象）时使用流式模式，边生成边写入。
+    task 为遥测中记录的业务函数名，在线程池或 lambda 中调用时需要显式传入。
     """
-    prompt = f"""
-    你是一位顶级的软件工程师和数学家，擅长阅读复杂的代码并以清晰、结构化的方式解释其核心思想。
-    现在，请分析以下 Python 代码。你的任务是生成一份详细的 Markdown 格式的分析报告。
+    # 使用较低的温度，让输出更稳定和精确（见 llm_client.AGENT_DEFAULTS['explainer']）
+    if stream_to is not None:
+        return _stream_llm(prompt, agent='explainer', sink=stream_to, system_prompt=system_prompt, task=task)
+    return _call_llm(prompt, agent='explainer', system_prompt=system_prompt, task=task)
 
-    报告必须包含以下三个部分，并严格按照指定格式输出：
+# --- 核心功能函数 ---
 
-    ---
-    
+# 报告前两部分（功能总结、实现思路）的格式说明
+OVERVIEW_FORMAT = """
     ### 1. 功能总结 (Function Summary)
     
     * 在这部分，请用几句话简洁明了地概括这段代码的总体功能。说明它接收什么输入，执行什么计算，最终产出什么结果。
@@ -63,17 +41,74 @@ def analyze_and_explain_code(code_content):
     * 描述数据是如何被初始化、处理和转换的。
     * 解释关键函数或代码块的作用。
     * 如果代码中包含算法（如梯度下降、数据拟合等），请清晰地阐述其工作原理。
-    
+"""
+
+# 报告第三部分（数学公式与变量）的格式说明
+MATH_SECTION_FORMAT = """
     ### 3. 核心数学公式与变量 (Core Mathematical Formulas and Variables)
     
     * **这是最重要的部分。**
     * 请仔细识别代码中实现的数学运算和公式。
     * 将这些公式以 **LaTeX 格式** 表达出来，并对方程式进行编号。
     * 列出代码中的主要变量，并解释它们对应的数学符号和含义。请使用 Markdown 表格进行展示。
-    * **关键要求**: 变量名（如 `learning_rate`）应被正确地转换为对应的 LaTeX 符号（如 $\\alpha$）。代码中的运算（如 `np.dot(X, w) + b`）应被转换为标准的数学表达式（如 $X \cdot w + b$）。
-    
+    * **关键要求**: 变量名（如 `learning_rate`）应被正确地转换为对应的 LaTeX 符号（如 $\\alpha$）。代码中的运算（如 `np.dot(X, w) + b`）应被转换为标准的数学表达式（如 $X \\cdot w + b$）。
+"""
+
+# 报告的三段式格式说明
+REPORT_FORMAT = f"""
+    报告必须包含以下三个部分，并严格按照指定格式输出：
+
     ---
-    
+{OVERVIEW_FORMAT}{MATH_SECTION_FORMAT}
+    ---
+"""
+
+# 固定的角色与格式说明放在 system 消息中，作为稳定的请求前缀以命中 DeepSeek 的上下文硬盘缓存；
+# 代码等可变内容放在 user 消息末尾。
+EXPLAIN_SYSTEM_PROMPT = f"""
+    你是一位顶级的软件工程师和数学家，擅长阅读复杂的代码并以清晰、结构化的方式解释其核心思想。
+    现在，请分析用户提供的 Python 代码。你的任务是生成一份详细的 Markdown 格式的分析报告。
+{REPORT_FORMAT}"""
+
+# 公式部分改由本地提取的素材单独生成时，整文件请求只需要写前两部分
+OVERVIEW_SYSTEM_PROMPT = f"""
+    你是一位顶级的软件工程师和数学家，擅长阅读复杂的代码并以清晰、结构化的方式解释其核心思想。
+    现在，请分析用户提供的 Python 代码，生成 Markdown 格式分析报告的前两个部分（第三部分“核心数学公式与变量”由另一步骤生成，不要输出），
+    并严格按照指定格式输出：
+
+    ---
+{OVERVIEW_FORMAT}"""
+
+MATH_SYSTEM_PROMPT = f"""
+    你是一位顶级的数学家和科研软件工程师。用户提供的不是完整代码，而是程序从一个 Python 脚本中本地提取出的
+    数学公式片段、自动生成的 LaTeX 草稿和变量表。请核对并润色这些草稿：把程序猜测的符号换成更贴切的数学记号，
+    合并表达同一公式的多个计算步骤，不要编造素材中没有出现的公式。只输出下面这一部分，严格按照指定格式：
+{MATH_SECTION_FORMAT}
+    ---
+"""
+
+UNIT_NOTES_SYSTEM_PROMPT = """
+    你是一位顶级的软件工程师和数学家。用户会提供一个较大 Python 脚本中的一个顶层函数、类或一段模块级代码，
+    各单元分别分析后按源码顺序直接拼接成完整报告，代码未改动的单元会复用之前的分析。
+
+    请为这个单元写一节简明的 Markdown 分析，包含：
+    1. 功能：输入、执行的计算和输出。
+    2. 实现思路：关键步骤与算法逻辑。
+    3. 数学公式与变量：单元中实现的数学公式（LaTeX 格式），以及相关变量对应的数学符号和含义（Markdown 表格）；没有公式时省略这一项。
+    小标题只使用 #### 级别，不要写前言或总结，也不要引用行号。
+"""
+
+def analyze_and_explain_code(code_content, stream_to=None):
+    """
+    使用 DeepSeek API 分析代码，生成功能总结、思路和LaTeX公式。
+    stream_to 不为空时以流式方式将报告逐段写入该文件对象。
+    超出单次请求 token 预算的大文件自动转为逐单元分析。
+    本地能提取到公式时（见 math_extractor），公式部分只用提取出的片段单独请求，与整文件的前两部分并发生成。
+    """
+    if needs_chunking(code_content):
+        return analyze_and_explain_large_code(code_content, stream_to=stream_to)
+
+    prompt = f"""
     请开始分析下面的代码：
     
     ```python
@@ -81,12 +116,90 @@ def analyze_and_explain_code(code_content):
     ```
     """
 
-    explanation = call_deepseek_api(prompt)
-    return explanation
+    try:
+        math_context = build_math_context(code_content)
+    except SyntaxError:
+        math_context = None
+    if math_context is None:
+        return call_deepseek_api(prompt, system_prompt=EXPLAIN_SYSTEM_PROMPT, stream_to=stream_to)
+
+    print(f"公式部分只发送本地提取的素材（约 {estimate_tokens(math_context)} tokens），与报告其余部分并发生成...")
+    # 两个请求都在线程池中执行，调用栈上看不到本函数，遥测的任务名需显式传入
+    jobs = [
+        lambda: call_deepseek_api(prompt, system_prompt=OVERVIEW_SYSTEM_PROMPT, stream_to=stream_to,
+                                  task='analyze_and_explain_code'),
+        lambda: explain_math_section(math_context),
+    ]
+    overview, math_section = run_concurrently(lambda job: job(), jobs)
+    if not overview or not math_section:
+        return None
+    # 流式模式下前两部分已经写入文件，公式部分生成完毕后接在后面
+    if stream_to is not None:
+        stream_to.write("\n\n" + math_section)
+    return overview + "\n\n" + math_section
+
+def explain_math_section(math_context):
+    """
+    用本地提取的公式素材生成报告的第 3 部分，提示词不包含完整源码。
+    结果按素材的哈希缓存（见 unit_cache.cached_note），公式没有变化时不再请求模型。
+    """
+    prompt = f"""
+    下面是从脚本中本地提取的公式素材：
+
+    {math_context}
+    """
+    return cached_note(
+        'explainer', [llm_client.DEEPSEEK_MODEL, AGENT_VERSION, MATH_SYSTEM_PROMPT], math_context,
+        lambda: call_deepseek_api(prompt, system_prompt=MATH_SYSTEM_PROMPT, task='explain_math_section'))
+
+def explain_code_unit(unit, dependencies=''):
+    """分析大文件中的一个函数、类或模块级代码单元。dependencies 为单元用到的外部定义。"""
+    prompt = f"""
+    需要分析的单元: {unit.name}
+    {f"单元中使用了在其他位置定义的: {dependencies}" if dependencies else ""}
+
+    ```python
+    {unit.source}
+    ```
+    """
+    return call_deepseek_api(prompt, system_prompt=UNIT_NOTES_SYSTEM_PROMPT)
+
+def analyze_and_explain_large_code(code_content, stream_to=None):
+    """
+    大文件逐单元分析：按 AST 拆成顶层函数、类和模块级代码，各单元的分析按规范化 AST 哈希缓存，
+    只有新增或改动的单元才请求模型（并发），最后在本地按源码顺序拼接成报告，不再额外请求合并。
+    修改一个函数只需重新分析这一个函数。本地能提取到公式时，公式部分与逐单元分析并发生成，附在报告末尾。
+    """
+    print(f"代码约 {estimate_tokens(code_content)} tokens，超出单次预算，按函数/类逐个分析...")
+    try:
+        math_context = build_math_context(code_content)
+    except SyntaxError:
+        math_context = None
+    jobs = [lambda: analyze_units(code_content, 'explainer',
+                                  [llm_client.DEEPSEEK_MODEL, AGENT_VERSION, UNIT_NOTES_SYSTEM_PROMPT],
+                                  explain_code_unit)]
+    if math_context is not None:
+        jobs.append(lambda: explain_math_section(math_context))
+    results = run_concurrently(lambda job: job(), jobs)
+    unit_notes = results[0]
+    if unit_notes is None or (math_context is not None and not results[1]):
+        return None
+
+    sections = [f"### {unit_heading(item.unit)}\n\n{item.note.strip()}" for item in unit_notes]
+    report = (f"## 代码分析报告\n\n代码较长，以下按源码顺序逐个解释其中的 {len(unit_notes)} 个函数、类和模块级代码。\n\n---\n\n"
+              + "\n\n---\n\n".join(sections) + "\n")
+    if math_context is not None:
+        report += "\n---\n\n" + results[1].strip() + "\n"
+    if stream_to is not None:
+        stream_to.write(report)
+    return report
 
-def process_code_file(filepath):
+@per_job_retry_budget
+def process_code_file(filepath, stream=None):
     """
     读取代码文件，调用分析函数，并将结果保存到 Markdown 文件中。
+    stream=True 时报告边生成边写入文件（默认取 llm_client.STREAM_BY_DEFAULT）。
+    源码与模型均未变化且报告文件完好时直接跳过。
     """
     print(f"--- 开始分析文件: {filepath} ---")
     
@@ -101,6 +214,34 @@ def process_code_file(filepath):
     if not code_content.strip():
         print("文件为空，无需分析。")
         return
+
+    if stream is None:
+        stream = llm_client.STREAM_BY_DEFAULT
+
+    base, _ = os.path.splitext(filepath)
+    report_filepath = f"{base}_analysis_report.md"
+
+    input_hash = job_manifest.content_hash(code_content)
+    opts_hash = job_manifest.options_hash({'model': llm_client.DEEPSEEK_MODEL})
+    if job_manifest.is_up_to_date('explainer', filepath, input_hash, opts_hash, AGENT_VERSION):
+        print(f"--- 源码未变化，跳过: {report_filepath} 已是最新 ---")
+        return
+
+    if stream:
+        # 流式模式：报告直接逐段写入目标文件
+        print(f"代码读取成功，正在以流式方式请求 AI 进行分析，报告实时写入: {report_filepath}")
+        try:
+            with open(report_filepath, 'w', encoding='utf-8') as f:
+                analysis_report = analyze_and_explain_code(code_content, stream_to=f)
+        except Exception as e:
+            print(f"保存报告文件失败: {e}")
+            return
+        if not analysis_report:
+            print("代码分析失败，报告文件可能不完整。")
+            return
+        print(f"--- 分析报告已保存至: {report_filepath} ---")
+        job_manifest.record_job('explainer', filepath, input_hash, opts_hash, AGENT_VERSION, [report_filepath])
+        return
         
     print("代码读取成功，正在请求 AI 进行分析...")
     
@@ -114,15 +255,23 @@ def process_code_file(filepath):
     print("分析完成，正在保存报告...")
 
     # 保存到新的 .md 文件
-    base, _ = os.path.splitext(filepath)
-    report_filepath = f"{base}_analysis_report.md"
-    
     try:
         with open(report_filepath, 'w', encoding='utf-8') as f:
             f.write(analysis_report)
         print(f"--- 分析报告已保存至: {report_filepath} ---")
     except Exception as e:
         print(f"保存报告文件失败: {e}")
+        return
+    job_manifest.record_job('explainer', filepath, input_hash, opts_hash, AGENT_VERSION, [report_filepath])
+
+async def process_code_file_async(filepath, stream=None):
+    """process_code_file 的异步版本，便于与其他任务一起并发调度。"""
+    await run_blocking(process_code_file, filepath, stream)
+
+
+async def process_many_async(filepaths, stream=None):
+    """并发分析多个文件，在途请求总数由 llm_client 的全局信号量限制。"""
+    await asyncio.gather(*(process_code_file_async(path, stream) for path in filepaths))
 
 # --- 主程序入口 ---
 if __name__ == '__main__':
@@ -0,0 +1,191 @@
+import re
+import ast
+from collections import namedtuple
+
+# --- 配置区 ---
+# 编辑块应用失败或结果无法解析时，最多再向模型追问的轮数
+PATCH_MAX_ROUNDS = 3
+
+# 模型返回的一处修改：search 为原代码中的连续若干行，replace 为修改后的内容
+EditBlock = namedtuple('EditBlock', ['search', 'replace'])
+
+NO_CHANGES = "NO_CHANGES"
+
+# 编辑协议的输出格式说明，拼接在各 Agent 的 system 提示词末尾（属于固定前缀，可命中上下文缓存）
+EDIT_FORMAT_INSTRUCTIONS = f"""
+**输出格式（编辑块）**:
+- 不要输出完整代码，只输出需要修改的地方。每处修改写成一个编辑块：
+<<<<<<< SEARCH
+（原代码中需要修改的若干连续行，必须逐字复制，包括缩进）
+=======
+（修改后的这些行）
+>>>>>>> REPLACE
+- SEARCH 部分要包含足够的上下文，保证在原代码中唯一匹配，通常 1~5 行即可；需要插入新代码时，把相邻的原有行作为 SEARCH 锚点。
+- 多处修改输出多个编辑块，按它们在代码中出现的顺序排列。
+- 不需要任何修改时，只回复 {NO_CHANGES}。
+- 编辑块之外不要输出任何解释、前言或格式化标记。
+"""
+
+_BLOCK_PATTERN = re.compile(
+    r'^<{5,9} ?SEARCH[ \t]*\r?\n(.*?)^={5,9}[ \t]*\r?\n(.*?)^>{5,9} ?REPLACE[ \t]*$',
+    re.S | re.M,
+)
+
+
+def parse_edit_blocks(text):
+    """从模型回复中解析出所有编辑块，去掉 SEARCH / REPLACE 内容末尾的换行。"""
+    return [
+        EditBlock(search.rstrip('\r\n'), replace.rstrip('\r\n'))
+        for search, replace in _BLOCK_PATTERN.findall(text or '')
+    ]
+
+
+def is_edit_reply(text):
+    """回复是否符合编辑协议（NO_CHANGES 或至少一个编辑块），可作为 LLM 响应缓存的 validate 钩子。"""
+    return bool(text) and (text.strip() == NO_CHANGES or bool(parse_edit_blocks(text)))
+
+
+def _line_starts(lines):
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+def _reindent(text, from_indent, to_indent):
+    """把 text 中以 from_indent 开头的行改为以 to_indent 开头。"""
+    if from_indent == to_indent:
+        return text
+    return '\n'.join(
+        to_indent + line[len(from_indent):] if line.startswith(from_indent) else line
+        for line in text.split('\n')
+    )
+
+
+def _leading_indent(text):
+    for line in text.split('\n'):
+        if line.strip():
+            return line[:len(line) - len(line.lstrip())]
+    return ''
+
+
+def locate_block(code, block):
+    """
+    在 code 中定位编辑块，返回 (start, end, replacement) 或 (None, 失败原因)。
+    先做精确匹配；找不到时按行比较（忽略行首缩进与行尾空白），并把 replacement 的缩进对齐到原代码。
+    SEARCH 在代码中出现多次时视为不唯一，不做猜测。
+    """
+    if not block.search.strip():
+        return None, "SEARCH 内容为空"
+    count = code.count(block.search)
+    if count == 1:
+        start = code.index(block.search)
+        return (start, start + len(block.search), block.replace), None
+    if count > 1:
+        return None, f"SEARCH 内容在代码中出现了 {count} 次，无法确定位置"
+
+    lines = code.splitlines(keepends=True)
+    starts = _line_starts(lines)
+    stripped = [line.strip() for line in lines]
+    search_lines = [line.strip() for line in block.search.split('\n')]
+    while search_lines and not search_lines[0]:
+        search_lines.pop(0)
+    while search_lines and not search_lines[-1]:
+        search_lines.pop()
+    size = len(search_lines)
+    matches = [i for i in range(len(lines) - size + 1) if stripped[i:i + size] == search_lines]
+    if len(matches) != 1:
+        return None, ("SEARCH 内容在代码中找不到" if not matches
+                      else f"SEARCH 内容在代码中出现了 {len(matches)} 次，无法确定位置")
+    first = matches[0]
+    start = starts[first]
+    end = starts[first + size] - (len(lines[first + size - 1]) - len(lines[first + size - 1].rstrip('\r\n')))
+    original_indent = _leading_indent(code[start:end])
+    replacement = _reindent(block.replace, _leading_indent(block.search), original_indent)
+    return (start, end, replacement), None
+
+
+def apply_edit_blocks(code, blocks):
+    """
+    依次应用编辑块，返回 (新代码, 失败列表)，失败列表中每项为 (EditBlock, 原因)。
+    每个编辑块都在前一个应用后的代码上定位，因此模型给出的块顺序不影响结果。
+    """
+    failed = []
+    for block in blocks:
+        location, reason = locate_block(code, block)
+        if location is None:
+            failed.append((block, reason))
+            continue
+        start, end, replacement = location
+        code = code[:start] + replacement + code[end:]
+    return code, failed
+
+
+def check_syntax(code):
+    """代码能被解析时返回 None，否则返回带行号的错误说明。"""
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        return f"第 {e.lineno} 行: {e.msg}"
+    return None
+
+
+def _format_failed_blocks(failed):
+    parts = []
+    for index, (block, reason) in enumerate(failed, 1):
+        parts.append(
+            f"编辑块 {index}（{reason}）:\n<<<<<<< SEARCH\n{block.search}\n=======\n{block.replace}\n>>>>>>> REPLACE"
+        )
+    return '\n\n'.join(parts)
+
+
+def request_code_edits(call, prompt, code, max_rounds=PATCH_MAX_ROUNDS, requirements=None):
+    """
+    编辑协议的完整流程：call(prompt) 请求模型给出编辑块，在本地应用到 code 并检查能否解析；
+    有编辑块无法应用或结果存在语法错误时，把原始要求 requirements、失败的编辑块 / 错误信息连同当前代码发回模型，
+    请它补充修正用的编辑块，最多追问 max_rounds 轮。requirements 缺省时使用去掉原始代码后的 prompt。
+    成功时返回修改后的代码（模型表示无需修改时返回原代码）；追问后仍有编辑块无法应用或存在语法错误时返回 None，
+    只应用了一部分的编辑可能悄悄改变代码逻辑，宁可放弃整次修改。
+    """
+    if requirements is None:
+        requirements = prompt.replace(code, "（原始代码见下方的当前代码）").strip()
+    current = code
+    failed, syntax_error = [], None
+    reply = call(prompt)
+    for round_index in range(max_rounds + 1):
+        if reply is None:
+            return None
+        if reply.strip() == NO_CHANGES:
+            # 追问轮中回复无需修改，说明模型放弃了尚未应用的编辑块
+            return current if not failed and syntax_error is None else None
+        blocks = parse_edit_blocks(reply)
+        if not blocks:
+            print(f"AI 回复中没有可识别的编辑块，已忽略。返回内容: {reply[:200]}...")
+            return None
+
+        current, failed = apply_edit_blocks(current, blocks)
+        syntax_error = check_syntax(current)
+        print(f"已应用 {len(blocks) - len(failed)}/{len(blocks)} 个编辑块。")
+        if not failed and syntax_error is None:
+            return current
+        if round_index == max_rounds:
+            break
+
+        problems = []
+        if failed:
+            problems.append(f"以下编辑块无法应用到当前代码，请对照当前代码重新给出：\n\n{_format_failed_blocks(failed)}")
+        if syntax_error:
+            problems.append(f"应用编辑后代码存在语法错误（{syntax_error}），请给出修正它的编辑块。")
+        issues = ([f"{len(failed)} 个编辑块无法应用"] if failed else []) + (["代码存在语法错误"] if syntax_error else [])
+        print(f"{'，'.join(issues)}，正在请求 AI 修正...")
+        reply = call(
+            f"**原始要求**:\n{requirements}\n\n"
+            + "\n\n".join(problems)
+            + f"\n\n已成功应用的编辑无需重复。**当前代码**:\n\n```python\n{current}\n```\n"
+        )
+
+    if failed:
+        print(f"{len(failed)} 个编辑块始终无法应用，为避免只应用部分修改，放弃本次修改。")
+    else:
+        print("编辑后的代码仍存在语法错误，放弃本次修改。")
+    return None
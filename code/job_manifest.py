@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# --- 配置区 ---
+# 每个目录下记录处理结果的清单文件名；SCIAGENT_FORCE=1 时忽略清单，全部重新处理
+MANIFEST_NAME = os.getenv("SCIAGENT_MANIFEST_NAME", ".sciagent_manifest.json")
+FORCE_REPROCESS = os.getenv("SCIAGENT_FORCE", "") not in ("", "0")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def content_hash(text):
+    """文本内容的 SHA-256。"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path):
+    """文件内容的 SHA-256，文件不存在或无法读取时返回 None。"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _jsonable(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def options_hash(options):
+    """处理选项的 SHA-256（规范化 JSON，集合按排序后的列表处理），选项相同则哈希相同。"""
+    material = json.dumps(options, sort_keys=True, ensure_ascii=False, default=_jsonable, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _manifest_path(source_path):
+    return os.path.join(os.path.dirname(os.path.abspath(source_path)), MANIFEST_NAME)
+
+
+def _lock_for(manifest_path):
+    with _locks_guard:
+        return _locks.setdefault(manifest_path, threading.Lock())
+
+
+def _load(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save(manifest_path, data):
+    """先写临时文件再原子替换，避免并发处理或中断时留下损坏的清单。"""
+    tmp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def _entry_key(agent, source_path):
+    return f"{agent}:{os.path.basename(source_path)}"
+
+
+def get_entry(agent, source_path):
+    """返回 agent 上次处理 source_path 时记录的清单条目，没有记录时返回 None。"""
+    manifest_path = _manifest_path(source_path)
+    with _lock_for(manifest_path):
+        return _load(manifest_path).get(_entry_key(agent, source_path))
+
+
+def is_up_to_date(agent, source_path, input_hash, opts_hash, agent_version):
+    """
+    判断任务能否跳过：输入内容、选项和 Agent 版本都与上次一致，
+    且上次生成的所有输出文件仍然存在、内容未被改动。
+    """
+    if FORCE_REPROCESS:
+        return False
+    entry = get_entry(agent, source_path)
+    if not entry or not entry.get('outputs'):
+        return False
+    if (entry.get('input_hash'), entry.get('options_hash'), entry.get('agent_version')) != (
+            input_hash, opts_hash, agent_version):
+        return False
+    base_dir = os.path.dirname(os.path.abspath(source_path))
+    return all(file_hash(os.path.join(base_dir, output)) == digest for output, digest in entry['outputs'].items())
+
+
+def record_job(agent, source_path, input_hash, opts_hash, agent_version, outputs, **extra):
+    """
+    记录一次成功的处理：(输入哈希, 选项哈希, Agent 版本) -> 输出文件及其哈希。
+    extra 中的字段（如本次使用的翻译映射）一并保存，供下次增量处理使用。
+    """
+    manifest_path = _manifest_path(source_path)
+    base_dir = os.path.dirname(manifest_path)
+    entry = {
+        'input_hash': input_hash,
+        'options_hash': opts_hash,
+        'agent_version': agent_version,
+        'outputs': {os.path.relpath(os.path.abspath(output), base_dir): file_hash(output) for output in outputs},
+        'updated': time.time(),
+    }
+    entry.update(extra)
+    with _lock_for(manifest_path):
+        data = _load(manifest_path)
+        data[_entry_key(agent, source_path)] = entry
+        try:
+            _save(manifest_path, data)
+        except OSError as e:
+            print(f"写入处理清单失败: {e}")
@@ -0,0 +1,407 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import response_cache
+import rate_limiter
+import telemetry
+
+# --- 配置区 ---
+# 所有 Agent 共用同一套 DeepSeek 配置，可通过环境变量覆盖
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+
+# 连接池大小：同一主机上最多保持多少条 keep-alive 连接
+POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE", "8"))
+
+# 各 Agent 的默认请求参数，原先分散在各个脚本里，现统一在此维护
+AGENT_DEFAULTS = {
+    'analyst': {'timeout': 300},
+    'explainer': {'timeout': 180, 'temperature': 0.1, 'max_tokens': 16384},
+    'translator': {'timeout': 180},
+}
+DEFAULT_TIMEOUT = 180
+
+# 流式模式：DEEPSEEK_STREAM=1 时各 Agent 默认启用流式输出
+STREAM_BY_DEFAULT = os.getenv("DEEPSEEK_STREAM", "") not in ("", "0")
+# 流式模式下不再限制整个请求的总时长，只限制建立连接和相邻两个数据块之间的空闲时间
+STREAM_CONNECT_TIMEOUT = 10
+STREAM_IDLE_TIMEOUT = float(os.getenv("DEEPSEEK_STREAM_IDLE_TIMEOUT", "120"))
+
+# 全局并发上限：进程内同时在途的 HTTP 请求数，同步线程与 asyncio 调用共用同一个信号量
+MAX_CONCURRENT_REQUESTS = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", str(POOL_SIZE)))
+
+_session = None
+_session_lock = threading.Lock()
+_inflight = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+# --- 连接池管理 ---
+def get_session():
+    """
+    返回进程内共享的 requests.Session。
+    Session 底层的 urllib3 连接池会复用 TCP+TLS 连接，批量处理时握手开销只付一次。
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def configure_pool(pool_size):
+    """调整连接池大小。会关闭现有 Session，下一次请求时按新大小重建。"""
+    global POOL_SIZE, _session
+    with _session_lock:
+        POOL_SIZE = pool_size
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def set_max_concurrency(limit):
+    """调整全局在途请求上限。应在发起请求前调用，连接池不足时一并扩容。"""
+    global MAX_CONCURRENT_REQUESTS, _inflight
+    MAX_CONCURRENT_REQUESTS = limit
+    _inflight = threading.BoundedSemaphore(limit)
+    if POOL_SIZE < limit:
+        configure_pool(limit)
+
+
+def close_session():
+    """关闭共享 Session，释放所有保持的连接。"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+# --- DeepSeek API 调用封装 ---
+def build_payload(prompt, agent=None, is_json_mode=False, **overrides):
+    """
+    根据 Agent 默认参数和调用方覆盖参数构建请求体，返回 (payload, timeout)。
+    overrides 中的 system_prompt 会作为第一条 system 消息：固定不变的角色与规则放在这里，
+    可变内容（选项、规范、代码）放在 user 消息里，使请求前缀稳定，命中 DeepSeek 的上下文硬盘缓存。
+    """
+    options = dict(AGENT_DEFAULTS.get(agent, {}))
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    timeout = options.pop('timeout', DEFAULT_TIMEOUT)
+    system_prompt = options.pop('system_prompt', None)
+
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    payload = {
+        "model": options.pop('model', DEEPSEEK_MODEL),
+        "messages": messages,
+    }
+    payload.update(options)
+    if is_json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload, timeout
+
+
+def _open_cache(payload, use_cache):
+    """返回 (cache, cache_key)；跳过缓存时返回 (None, None)。"""
+    if not use_cache or response_cache.CACHE_BYPASS:
+        return None, None
+    cache_key = response_cache.make_cache_key(
+        payload["model"], DEEPSEEK_API_URL, payload["messages"],
+        payload.get("temperature"), payload.get("response_format"),
+    )
+    return response_cache.get_default_cache(), cache_key
+
+
+def _should_cache(content, is_json_mode, finish_reason, validate):
+    """
+    只缓存调用方会接受的回复：被截断（finish_reason 为 length）、JSON 模式下无法解析、
+    或未通过调用方 validate(content) 检查的回复都不写入缓存，以免坏回复在有效期内被反复重放。
+    """
+    if not content or finish_reason == "length":
+        return False
+    if is_json_mode:
+        try:
+            json.loads(content)
+        except ValueError:
+            return False
+    return validate is None or bool(validate(content))
+
+
+@contextlib.contextmanager
+def _send_request(payload, headers, timeout, stream=False):
+    """
+    发送请求并在 with 块内返回状态正常的 response，期间占用一个全局并发名额。
+    - 发送前经过共享限流器 (RPM / TPM)；
+    - 429 / 5xx / 连接错误 / 超时按指数退避 + 抖动重试，优先遵守服务端的 Retry-After；
+    - 重试次数同时受 MAX_RETRIES 和当前任务的重试预算约束，用尽后抛出最后一次的异常。
+    """
+    limiter = rate_limiter.get_default_limiter()
+    budget = rate_limiter.current_budget()
+    estimated = rate_limiter.estimate_request_tokens(payload["messages"])
+    attempt = 0
+    while True:
+        limiter.acquire(estimated)
+        retry_after = None
+        _inflight.acquire()
+        try:
+            response = get_session().post(DEEPSEEK_API_URL, headers=headers, json=payload,
+                                          timeout=timeout, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _inflight.release()
+            error = e
+        else:
+            if response.status_code not in rate_limiter.RETRYABLE_STATUS:
+                try:
+                    response.raise_for_status()
+                    yield response
+                    usage = response.json().get("usage") if not stream else None
+                    if usage:
+                        limiter.record_usage(estimated, usage.get("total_tokens", 0))
+                finally:
+                    response.close()
+                    _inflight.release()
+                return
+            retry_after = rate_limiter.parse_retry_after(response.headers.get("Retry-After"))
+            error = requests.exceptions.HTTPError(
+                f"{response.status_code} Error: {response.reason} for url: {response.url}", response=response
+            )
+            response.close()
+            _inflight.release()
+            if response.status_code == 429 and retry_after:
+                # 账户级限流：让所有线程一起等待
+                limiter.pause(retry_after)
+
+        if attempt >= rate_limiter.MAX_RETRIES or not budget.consume():
+            raise error
+        attempt += 1
+        delay = retry_after if retry_after is not None else rate_limiter.backoff_delay(attempt)
+        print(f"DeepSeek API 请求失败 ({error})，{delay:.1f}s 后进行第 {attempt} 次重试...")
+        time.sleep(delay)
+
+
+def call_deepseek_api(prompt, agent=None, is_json_mode=False, use_cache=True, task=None,
+                      validate=None, refresh=False, **overrides):
+    """
+    调用 DeepSeek API 的通用函数。
+    agent 用于选取 AGENT_DEFAULTS 中的默认参数，overrides 可覆盖 temperature、max_tokens、timeout 等。
+    use_cache=False（或环境变量 DEEPSEEK_CACHE_BYPASS=1）时跳过磁盘响应缓存。
+    validate(content) 返回假值的回复照常返回但不写入缓存；refresh=True 时不读缓存、重新请求并覆盖旧条目，
+    供调用方拒绝上一次回复后重试。
+    task 是遥测中记录的业务函数名，缺省时从调用栈推断（如 translate_texts）。
+    失败时打印错误并返回 None，与各 Agent 原有行为保持一致。
+    """
+    payload, timeout = build_payload(prompt, agent, is_json_mode, **overrides)
+    task = task or telemetry.infer_task()
+    start = time.perf_counter()
+
+    cache, cache_key = _open_cache(payload, use_cache)
+    if cache is not None and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, cached=True)
+            return cached
+
+    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
+        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
+
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}"}
+
+    response = None
+    try:
+        with _send_request(payload, headers, timeout) as response:
+            data = response.json()
+            content = data['choices'][0]['message']['content']
+            finish_reason = data['choices'][0].get('finish_reason')
+            usage = data.get('usage')
+    except requests.exceptions.RequestException as e:
+        print(f"调用 DeepSeek API 时发生网络错误: {e}")
+        telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, status='error')
+        return None
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"解析 DeepSeek API 响应时出错: {e}, 响应内容: {response.text if response is not None else ''}")
+        telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, status='error')
+        return None
+
+    telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, usage)
+    report_prompt_cache(usage)
+    if cache is not None and _should_cache(content, is_json_mode, finish_reason, validate):
+        cache.put(cache_key, content)
+    return content
+
+
+def report_prompt_cache(usage):
+    """打印服务端上下文缓存（前缀缓存）命中的 prompt tokens 数。"""
+    if not usage:
+        return
+    hit = usage.get("prompt_cache_hit_tokens") or 0
+    prompt_tokens = usage.get("prompt_tokens") or (hit + (usage.get("prompt_cache_miss_tokens") or 0))
+    if hit and prompt_tokens:
+        print(f"服务端上下文缓存命中 {hit}/{prompt_tokens} prompt tokens ({hit / prompt_tokens:.0%})")
+
+
+def _iter_sse_lines(response):
+    """
+    逐行读取 SSE 响应体。
+    按字节切分 b"\\n" 后再以 UTF-8 解码：SSE 响应通常不声明 charset，
+    且 str.splitlines 会把 U+2028 等字符也当作换行，因此不使用 iter_lines(decode_unicode=True)。
+    """
+    buffer = b""
+    for data in response.iter_content(chunk_size=None):
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8")
+    if buffer:
+        yield buffer.rstrip(b"\r").decode("utf-8")
+
+
+def stream_deepseek_api(prompt, agent=None, is_json_mode=False, use_cache=True,
+                        sink=None, metrics=None, task=None, validate=None, refresh=False, **overrides):
+    """
+    以流式 (SSE, stream=true) 方式调用 DeepSeek API。
+    - 每收到一个增量就写入 sink（任何带 write 方法的对象，例如已打开的输出文件）并立即 flush；
+    - 超时只约束连接建立和数据块之间的空闲时间，长输出不会再触发整体超时；
+    - 统计首 token 耗时 (ttft) 与生成速度 (tokens/s)，写入调用方传入的 metrics 字典。
+    validate、refresh 与 call_deepseek_api 相同。返回完整文本，失败时返回 None。
+    """
+    payload, _ = build_payload(prompt, agent, is_json_mode, **overrides)
+    task = task or telemetry.infer_task()
+    if metrics is None:
+        metrics = {}
+
+    cache, cache_key = _open_cache(payload, use_cache)
+    if cache is not None and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if sink is not None:
+                sink.write(cached)
+                sink.flush()
+            metrics.update({'cached': True, 'ttft': 0.0, 'elapsed': 0.0, 'completion_tokens': 0, 'tokens_per_sec': None})
+            telemetry.record_call(agent, task, payload["model"], 0.0, cached=True, ttft=0.0)
+            return cached
+
+    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
+        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
+
+    payload["stream"] = True
+    payload["stream_options"] = {"include_usage": True}
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Accept": "text/event-stream"}
+
+    parts = []
+    usage = None
+    finish_reason = None
+    chunk_count = 0
+    start = time.perf_counter()
+    first_token_at = None
+    try:
+        with _send_request(payload, headers, (STREAM_CONNECT_TIMEOUT, STREAM_IDLE_TIMEOUT),
+                           stream=True) as response:
+            for line in _iter_sse_lines(response):
+                # SSE 中以冒号开头的是心跳注释，空行是事件分隔符
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                choices = chunk.get("choices") or []
+                if choices and choices[0].get("finish_reason"):
+                    finish_reason = choices[0]["finish_reason"]
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunk_count += 1
+                parts.append(delta)
+                if sink is not None:
+                    sink.write(delta)
+                    sink.flush()
+    except requests.exceptions.RequestException as e:
+        print(f"调用 DeepSeek API (流式) 时发生网络错误: {e}")
+        telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, status='error')
+        return None
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"解析 DeepSeek API 流式响应时出错: {e}")
+        telemetry.record_call(agent, task, payload["model"], time.perf_counter() - start, status='error')
+        return None
+
+    end = time.perf_counter()
+    content = "".join(parts)
+    if usage:
+        rate_limiter.get_default_limiter().record_usage(
+            rate_limiter.estimate_request_tokens(payload["messages"]), usage.get("total_tokens", 0)
+        )
+    completion_tokens = (usage or {}).get("completion_tokens", chunk_count)
+    generation_time = end - first_token_at if first_token_at is not None else 0.0
+    metrics.update({
+        'cached': False,
+        'ttft': (first_token_at - start) if first_token_at is not None else None,
+        'elapsed': end - start,
+        'completion_tokens': completion_tokens,
+        'tokens_per_sec': completion_tokens / generation_time if generation_time > 0 else None,
+        'usage': usage,
+    })
+    telemetry.record_call(agent, task, payload["model"], metrics['elapsed'], usage, ttft=metrics['ttft'])
+    report_prompt_cache(usage)
+    if metrics['ttft'] is not None:
+        speed = f"{metrics['tokens_per_sec']:.1f}" if metrics['tokens_per_sec'] else "-"
+        print(f"流式输出完成: 首 token 耗时 {metrics['ttft']:.2f}s，共 {completion_tokens} tokens，生成速度 {speed} tokens/s")
+
+    if cache is not None and _should_cache(content, is_json_mode, finish_reason, validate):
+        cache.put(cache_key, content)
+    return content or None
+
+
+async def acall_deepseek_api(prompt, agent=None, is_json_mode=False, use_cache=True, task=None,
+                             validate=None, refresh=False, **overrides):
+    """
+    call_deepseek_api 的异步版本。
+    请求在线程中执行并复用同一个连接池，在途数量受全局信号量 MAX_CONCURRENT_REQUESTS 约束，
+    因此可以放心地用 asyncio.gather 同时发起大量调用。
+    """
+    # 进入工作线程后调用栈会丢失，需在这里先确定遥测用的业务函数名
+    task = task or telemetry.infer_task()
+    return await asyncio.to_thread(
+        call_deepseek_api, prompt, agent, is_json_mode, use_cache, task, validate, refresh, **overrides
+    )
+
+
+async def run_blocking(func, *args, **kwargs):
+    """在线程中运行会调用 LLM 的同步函数，供各 Agent 的异步入口并发调度。"""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def run_concurrently(func, items, max_workers=None):
+    """
+    在线程池中并发执行 func(item)，按输入顺序返回结果，适合同步代码里的 map 阶段。
+    每个工作线程都复制调用方的 contextvars（例如任务级重试预算）；
+    实际在途请求数仍由全局信号量控制。
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers or MAX_CONCURRENT_REQUESTS) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def cache_stats():
+    """返回默认响应缓存的命中统计（hits / misses / writes / evictions / entries / bytes）。"""
+    return response_cache.get_default_cache().stats()
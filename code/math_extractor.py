@@ -0,0 +1,437 @@
+import io
+import os
+import re
+import ast
+import sys
+import argparse
+import tokenize
+from collections import namedtuple
+from source_rewriter import node_offsets
+from symbol_index import get_symbol_index
+
+# --- 配置区 ---
+# 单次提示词中最多附带的公式条数，超出部分按源码顺序截断
+MAX_FORMULAS = int(os.getenv("SCIAGENT_MATH_MAX_FORMULAS", "40"))
+# 每条公式附带的上方注释行数
+CONTEXT_COMMENT_LINES = 3
+# 视为数值计算库的模块，这些模块中的函数调用会被识别为数学运算
+NUMERIC_MODULES = ('numpy', 'math', 'cmath', 'scipy', 'torch', 'jax.numpy')
+# 常见科研变量名对应的数学符号草稿，只做精确匹配；其余名字按 “希腊字母 / 单字母 + 下标” 规则转换
+SYMBOL_HINTS = {
+    'std': r'\sigma', 'std_dev': r'\sigma', 'stddev': r'\sigma', 'sd': r'\sigma',
+    'var': r'\sigma^{2}', 'variance': r'\sigma^{2}',
+    'mean': r'\mu', 'mean_val': r'\mu', 'avg': r'\bar{x}',
+    'amplitude': 'A', 'amp': 'A', 'learning_rate': r'\alpha', 'lr': r'\alpha',
+    'lam': r'\lambda', 'lmbda': r'\lambda', 'eps': r'\epsilon', 'wavelength': r'\lambda',
+    'freq': 'f', 'frequency': 'f', 'dt': r'\Delta t', 'dx': r'\Delta x', 'grad': r'\nabla',
+}
+
+_GREEK = {
+    'alpha', 'beta', 'gamma', 'delta', 'epsilon', 'varepsilon', 'zeta', 'eta', 'theta', 'vartheta', 'iota',
+    'kappa', 'lambda', 'mu', 'nu', 'xi', 'pi', 'rho', 'sigma', 'tau', 'upsilon', 'phi', 'varphi', 'chi', 'psi',
+    'omega', 'Gamma', 'Delta', 'Theta', 'Lambda', 'Xi', 'Pi', 'Sigma', 'Phi', 'Psi', 'Omega',
+}
+# 函数名 -> LaTeX 模板，{0}、{1} 为参数
+_FUNCTION_TEMPLATES = {
+    'exp': r'\exp\left({0}\right)', 'exp2': r'2^{{{0}}}', 'expm1': r'\left(e^{{{0}}} - 1\right)',
+    'log': r'\ln\left({0}\right)', 'log10': r'\log_{{10}}\left({0}\right)', 'log2': r'\log_{{2}}\left({0}\right)',
+    'log1p': r'\ln\left(1 + {0}\right)', 'sqrt': r'\sqrt{{{0}}}', 'cbrt': r'\sqrt[3]{{{0}}}',
+    'abs': r'\left|{0}\right|', 'absolute': r'\left|{0}\right|', 'fabs': r'\left|{0}\right|',
+    'sin': r'\sin\left({0}\right)', 'cos': r'\cos\left({0}\right)', 'tan': r'\tan\left({0}\right)',
+    'arcsin': r'\arcsin\left({0}\right)', 'arccos': r'\arccos\left({0}\right)', 'arctan': r'\arctan\left({0}\right)',
+    'asin': r'\arcsin\left({0}\right)', 'acos': r'\arccos\left({0}\right)', 'atan': r'\arctan\left({0}\right)',
+    'sinh': r'\sinh\left({0}\right)', 'cosh': r'\cosh\left({0}\right)', 'tanh': r'\tanh\left({0}\right)',
+    'arctan2': r'\arctan\left(\frac{{{0}}}{{{1}}}\right)', 'atan2': r'\arctan\left(\frac{{{0}}}{{{1}}}\right)',
+    'hypot': r'\sqrt{{{0}^{{2}} + {1}^{{2}}}}', 'power': r'\left({0}\right)^{{{1}}}', 'pow': r'\left({0}\right)^{{{1}}}',
+    'square': r'\left({0}\right)^{{2}}', 'dot': r'{0} \cdot {1}', 'vdot': r'{0} \cdot {1}', 'inner': r'{0} \cdot {1}',
+    'matmul': r'{0} {1}', 'cross': r'{0} \times {1}', 'outer': r'{0} \otimes {1}',
+    'sum': r'\sum {0}', 'prod': r'\prod {0}', 'mean': r'\overline{{{0}}}', 'average': r'\overline{{{0}}}',
+    'max': r'\max\left({0}\right)', 'amax': r'\max\left({0}\right)', 'min': r'\min\left({0}\right)',
+    'amin': r'\min\left({0}\right)', 'norm': r'\left\lVert {0} \right\rVert', 'transpose': r'{0}^{{T}}',
+    'floor': r'\left\lfloor {0} \right\rfloor', 'ceil': r'\left\lceil {0} \right\rceil',
+    'sign': r'\operatorname{{sgn}}\left({0}\right)', 'diff': r'\Delta {0}', 'gradient': r'\nabla {0}',
+    'cumsum': r'\sum_{{k \le i}} {0}', 'var': r'\operatorname{{Var}}\left({0}\right)',
+    'std': r'\operatorname{{std}}\left({0}\right)', 'erf': r'\operatorname{{erf}}\left({0}\right)',
+}
+_CONSTANTS = {'pi': r'\pi', 'e': 'e', 'inf': r'\infty', 'tau': r'\tau', 'nan': r'\mathrm{NaN}'}
+# 这些 NumPy 函数只负责创建数组或随机采样，本身不构成公式
+_NON_FORMULA_FUNCTIONS = {
+    'array', 'asarray', 'zeros', 'ones', 'empty', 'full', 'zeros_like', 'ones_like', 'arange', 'linspace',
+    'logspace', 'meshgrid', 'reshape', 'concatenate', 'stack', 'vstack', 'hstack', 'load', 'loadtxt', 'genfromtxt',
+    'copy', 'where', 'argmax', 'argmin', 'argsort', 'sort', 'unique', 'shape', 'size',
+}
+_BUILTIN_MATH = {'abs', 'sum', 'max', 'min', 'pow', 'round'}
+_FORMULA_COMMENT = re.compile(r'[=≈]|\b(exp|sin|cos|tan|log|sqrt|sum|frac)\b|\^|∑|∫')
+_FORMULA_OPERATOR = re.compile(r'[-+*/^]|\b(exp|sin|cos|tan|log|sqrt)\s*\(')
+
+_ATOM, _POWER, _UNARY, _PRODUCT, _SUM, _COMPARE = 100, 80, 70, 60, 50, 30
+
+# 本地提取出的一条公式：作用域、行号、源码、LaTeX 草稿、上方及行尾的注释
+Formula = namedtuple('Formula', ['scope', 'line', 'code', 'latex', 'comments'])
+# 公式中出现的变量：名字、符号草稿、类型（'variable' / 'parameter' / 'constant'）、定义所在的代码行
+MathVariable = namedtuple('MathVariable', ['name', 'symbol', 'kind', 'definition'])
+
+
+def _escape_text(text):
+    return re.sub(r'([_%#&{}$])', r'\\\1', text)
+
+
+def symbol_for(name):
+    """
+    变量名的 LaTeX 符号草稿：SYMBOL_HINTS 中的常见名字直接映射，希腊字母名转为对应符号，
+    x0 / x_0 / sigma_x 这类写法转为带下标的形式，其余多字母名字用 \\mathrm 原样保留。
+    """
+    if name in SYMBOL_HINTS:
+        return SYMBOL_HINTS[name]
+    if name in _GREEK:
+        return '\\' + name
+    if len(name) == 1:
+        return name
+    match = re.fullmatch(r'([A-Za-z]+?)_?(\d+)', name) or re.fullmatch(r'([A-Za-z]+)_([A-Za-z0-9]+)', name)
+    if match:
+        base, subscript = match.groups()
+        if base in _GREEK or base in SYMBOL_HINTS or len(base) == 1:
+            base_symbol = symbol_for(base)
+            subscript = subscript if len(subscript) == 1 or subscript.isdigit() else f"\\mathrm{{{subscript}}}"
+            return f"{base_symbol}_{{{subscript}}}"
+    return f"\\mathrm{{{_escape_text(name)}}}"
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _module_aliases(tree):
+    """模块中数值计算库的别名：import numpy as np -> {'np': 'numpy'}，from numpy import exp -> {'exp': 'numpy.exp'}。"""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.startswith(NUMERIC_MODULES):
+                    aliases[alias.asname or alias.name.split('.')[0]] = alias.name if alias.asname else alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.startswith(NUMERIC_MODULES):
+            for alias in node.names:
+                if alias.name != '*':
+                    aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+class _LatexConverter:
+    """把 Python 表达式转换为 LaTeX 草稿，按运算符优先级补充括号。"""
+
+    def __init__(self, aliases, local_names):
+        self.aliases = aliases
+        self.local_names = local_names   # 在本模块中有绑定的名字，用于区分内置函数和同名变量
+
+    def numeric_function(self, node):
+        """调用数值计算库（或内置 abs / sum 等）函数时返回函数名，否则返回 None。"""
+        dotted = _dotted_name(node)
+        if dotted is None:
+            return None
+        head, _, rest = dotted.partition('.')
+        if head in self.aliases:
+            full = f"{self.aliases[head]}.{rest}" if rest else self.aliases[head]
+            return full.rsplit('.', 1)[-1] if full.startswith(NUMERIC_MODULES) else None
+        if not rest and dotted in _BUILTIN_MATH and dotted not in self.local_names:
+            return dotted
+        return None
+
+    def convert(self, node):
+        return self._convert(node)[0]
+
+    def _wrap(self, node, minimum, strict=False):
+        latex, precedence = self._convert(node)
+        if precedence < minimum or (strict and precedence == minimum):
+            return f"\\left({latex}\\right)"
+        return latex
+
+    def _convert(self, node):
+        if isinstance(node, ast.Constant):
+            return self._constant(node.value), _ATOM
+        if isinstance(node, ast.Name):
+            return symbol_for(node.id), _ATOM
+        if isinstance(node, ast.Attribute):
+            return self._attribute(node)
+        if isinstance(node, ast.BinOp):
+            return self._binop(node)
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.USub):
+                return f"-{self._wrap(node.operand, _PRODUCT)}", _UNARY
+            if isinstance(node.op, ast.UAdd):
+                return self._convert(node.operand)
+            if isinstance(node.op, ast.Not):
+                return f"\\neg {self._wrap(node.operand, _ATOM)}", _UNARY
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        if isinstance(node, ast.Subscript):
+            return f"{self._wrap(node.value, _ATOM)}_{{{self._slice(node.slice)}}}", _ATOM
+        if isinstance(node, (ast.Tuple, ast.List)):
+            return f"\\left({', '.join(self.convert(e) for e in node.elts)}\\right)", _ATOM
+        if isinstance(node, ast.Compare):
+            symbols = {ast.Lt: '<', ast.LtE: r'\le', ast.Gt: '>', ast.GtE: r'\ge', ast.Eq: '=', ast.NotEq: r'\ne'}
+            parts = [self._wrap(node.left, _SUM)]
+            for op, comparator in zip(node.ops, node.comparators):
+                parts.append(symbols.get(type(op), r'\sim'))
+                parts.append(self._wrap(comparator, _SUM))
+            return ' '.join(parts), _COMPARE
+        if isinstance(node, ast.IfExp):
+            return (f"\\begin{{cases}} {self.convert(node.body)} & {self.convert(node.test)} \\\\ "
+                    f"{self.convert(node.orelse)} & \\text{{otherwise}} \\end{{cases}}"), _ATOM
+        return f"\\text{{{_escape_text(ast.unparse(node))}}}", _ATOM
+
+    @staticmethod
+    def _constant(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, complex)):
+            return f"\\text{{{_escape_text(str(value))}}}"
+        text = repr(value)
+        if 'e' in text and isinstance(value, float):
+            mantissa, exponent = text.split('e')
+            exponent = str(int(exponent))
+            return f"10^{{{exponent}}}" if float(mantissa) == 1 else f"{mantissa} \\times 10^{{{exponent}}}"
+        return text
+
+    def _attribute(self, node):
+        dotted = _dotted_name(node)
+        head = dotted.split('.')[0] if dotted else None
+        if head in self.aliases:
+            if node.attr in _CONSTANTS:
+                return _CONSTANTS[node.attr], _ATOM
+            return f"\\mathrm{{{_escape_text(node.attr)}}}", _ATOM
+        if node.attr == 'T':
+            return f"{self._wrap(node.value, _ATOM)}^{{T}}", _POWER
+        if isinstance(node.value, ast.Name) and node.value.id in ('self', 'cls'):
+            return symbol_for(node.attr), _ATOM
+        return f"{self._wrap(node.value, _ATOM)}.{symbol_for(node.attr)}", _ATOM
+
+    def _binop(self, node):
+        op = node.op
+        if isinstance(op, ast.Div):
+            return f"\\frac{{{self.convert(node.left)}}}{{{self.convert(node.right)}}}", _ATOM
+        if isinstance(op, ast.Pow):
+            base, precedence = self._convert(node.left)
+            if precedence < _ATOM or base.startswith('\\frac'):
+                base = f"\\left({base}\\right)"
+            return f"{base}^{{{self.convert(node.right)}}}", _POWER
+        if isinstance(op, (ast.Add, ast.Sub)):
+            sign = '+' if isinstance(op, ast.Add) else '-'
+            return f"{self._wrap(node.left, _SUM)} {sign} {self._wrap(node.right, _SUM, strict=isinstance(op, ast.Sub))}", _SUM
+        if isinstance(op, (ast.Mult, ast.MatMult)):
+            left = self._wrap(node.left, _PRODUCT)
+            right, precedence = self._convert(node.right)
+            if precedence < _PRODUCT or precedence == _UNARY:
+                right = f"\\left({right}\\right)"
+            # 右侧以数字开头时用 \cdot 分隔，避免 2 \cdot 3 被读成 23，其余情况直接并列
+            joiner = ' \\cdot ' if right[:1].isdigit() else ' '
+            return f"{left}{joiner}{right}", _PRODUCT
+        if isinstance(op, ast.FloorDiv):
+            return f"\\left\\lfloor \\frac{{{self.convert(node.left)}}}{{{self.convert(node.right)}}} \\right\\rfloor", _ATOM
+        if isinstance(op, ast.Mod):
+            return f"{self._wrap(node.left, _PRODUCT)} \\bmod {self._wrap(node.right, _PRODUCT, strict=True)}", _PRODUCT
+        return f"\\text{{{_escape_text(ast.unparse(node))}}}", _ATOM
+
+    def _call(self, node):
+        function = self.numeric_function(node.func)
+        args = [self.convert(arg) for arg in node.args]
+        if function in _FUNCTION_TEMPLATES and args:
+            template = _FUNCTION_TEMPLATES[function]
+            needed = 2 if '{1}' in template else 1
+            if len(args) >= needed:
+                return template.format(*args), (_PRODUCT if template.startswith(('\\sum', '\\prod', '\\Delta', '\\nabla')) else _ATOM)
+        if function is not None:
+            name = f"\\operatorname{{{_escape_text(function)}}}"
+        else:
+            dotted = _dotted_name(node.func)
+            name = symbol_for(dotted.rsplit('.', 1)[-1]) if dotted else self._wrap(node.func, _ATOM)
+        return f"{name}\\left({', '.join(args)}\\right)", _ATOM
+
+    def _slice(self, node):
+        if isinstance(node, ast.Slice):
+            parts = [self.convert(part) if part is not None else '' for part in (node.lower, node.upper)]
+            return ':'.join(parts)
+        if isinstance(node, ast.Tuple):
+            return ','.join(self._slice(element) for element in node.elts)
+        return self.convert(node)
+
+
+def _formula_weight(node, converter):
+    """
+    表达式中的数学运算数量：算术运算符和数值库函数调用各计 1，
+    字符串拼接、数组创建、随机采样等不是公式的表达式返回 0。
+    """
+    weight = 0
+    functions = {id(child.func) for child in ast.walk(node) if isinstance(child, ast.Call)}
+    names = 0
+    for child in ast.walk(node):
+        if isinstance(child, (ast.JoinedStr, ast.Dict, ast.Lambda)) or (
+                isinstance(child, ast.Constant) and isinstance(child.value, (str, bytes))):
+            return 0
+        if isinstance(child, ast.BinOp):
+            weight += 1
+        elif isinstance(child, ast.Call):
+            function = converter.numeric_function(child.func)
+            if function in _NON_FORMULA_FUNCTIONS or (function is None and _dotted_name(child.func) is None):
+                return 0
+            dotted = _dotted_name(child.func) or ''
+            if '.random.' in f".{dotted}." or dotted.startswith('random.'):
+                return 0
+            if function is not None:
+                weight += 1
+        elif isinstance(child, ast.Name) and id(child) not in functions:
+            names += 1
+    # 形如 i + 1、x * 2 的单个运算过于平凡，至少需要两个变量参与
+    if weight == 1 and names < 2 and not any(isinstance(c, ast.Call) for c in ast.walk(node)):
+        return 0
+    return weight
+
+
+def _comments_above(lines, line, comments):
+    """紧贴在第 line 行上方的注释行（最多 CONTEXT_COMMENT_LINES 行）以及该行的行尾注释。"""
+    result = []
+    current = line - 1
+    while current >= 1 and len(result) < CONTEXT_COMMENT_LINES and lines[current - 1].strip().startswith('#'):
+        result.insert(0, lines[current - 1].strip().lstrip('#').strip())
+        current -= 1
+    if line in comments and not lines[line - 1].strip().startswith('#'):
+        result.append(comments[line])
+    return [comment for comment in result if comment]
+
+
+def _comment_tokens(code):
+    """{行号: 注释文本}，代码无法完整 tokenize 时返回已读到的部分。"""
+    comments = {}
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type == tokenize.COMMENT:
+                comments[token.start[0]] = token.string.lstrip('#').strip()
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return comments
+
+
+def _statement_scope(index, line):
+    scope = index.scope_at(line)
+    while scope.kind == 'comprehension' or scope.name == '<lambda>':
+        scope = scope.parent
+    return scope
+
+
+def extract_formulas(code, index=None):
+    """
+    在本地用 AST 找出赋值、增量赋值和 return 中的数值计算表达式（NumPy 运算、np.exp、np.dot 等），
+    转换为 LaTeX 草稿。返回 (公式列表, 变量表, 注释中的公式)：
+    公式列表为 Formula，变量表为公式中出现的 MathVariable，注释中的公式为 [(行号, 注释文本)]。
+    代码无法解析时抛出 SyntaxError。
+    """
+    if index is None:
+        index = get_symbol_index(code)
+    tree = index.tree
+    lines = [line.rstrip('\r\n') for line in index.lines]
+    comments = _comment_tokens(code)
+    aliases = _module_aliases(tree)
+    converter = _LatexConverter(aliases, {name for scope in index.scopes for name in scope.bindings})
+    occurrences = {occurrence.start: occurrence for occurrence in index.occurrences}
+
+    formulas, seen, variables = [], set(), {}
+    statements = sorted((node for node in ast.walk(tree)
+                         if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.Return))
+                         and node.value is not None), key=lambda node: node.lineno)
+    for node in statements:
+        if _formula_weight(node.value, converter) == 0:
+            continue
+        value = converter.convert(node.value)
+        if isinstance(node, ast.Assign):
+            latex = ' = '.join([converter.convert(target) for target in node.targets] + [value])
+        elif isinstance(node, ast.AnnAssign):
+            latex = f"{converter.convert(node.target)} = {value}"
+        elif isinstance(node, ast.AugAssign):
+            target = converter.convert(node.target)
+            expression = converter.convert(ast.BinOp(left=node.target, op=node.op, right=node.value))
+            latex = f"{target} \\leftarrow {expression}"
+        else:
+            latex = value
+        if latex in seen:
+            continue
+        seen.add(latex)
+        scope = _statement_scope(index, node.lineno)
+        statement_code = '\n'.join(lines[node.lineno - 1:node.end_lineno]).strip()
+        formulas.append(Formula(scope.qualified, node.lineno, statement_code, latex,
+                                _comments_above(lines, node.lineno, comments)))
+
+        for child in ast.walk(node):
+            if not isinstance(child, ast.Name) or child.id in aliases or child.id in variables:
+                continue
+            if converter.numeric_function(child) is not None:
+                continue
+            occurrence = occurrences.get(node_offsets(child, index.lines, index.offsets)[0])
+            target = occurrence.target if occurrence is not None else None
+            if target is None:
+                continue
+            symbol = index.symbol(target.qualified, child.id)
+            kinds = symbol.kinds if symbol else frozenset()
+            if kinds & {'def', 'class', 'import'}:
+                continue
+            definition = ''
+            if symbol and symbol.bindings:
+                binding_line = symbol.bindings[0].line
+                definition = lines[binding_line - 1].strip()
+            kind = 'parameter' if 'parameter' in kinds else 'variable'
+            if kind == 'variable' and re.fullmatch(r'[A-Za-z_]\w*\s*=\s*-?[\d.eE+-]+\s*(#.*)?', definition):
+                kind = 'constant'
+            variables[child.id] = MathVariable(child.id, symbol_for(child.id), kind, definition)
+        if len(formulas) >= MAX_FORMULAS:
+            break
+
+    formula_comments = [(line, text) for line, text in sorted(comments.items())
+                        if _FORMULA_COMMENT.search(text) and _FORMULA_OPERATOR.search(text)]
+    return formulas, list(variables.values()), formula_comments
+
+
+def build_math_context(code, index=None):
+    """
+    生成交给模型润色的数学素材（Markdown）：注释中提到的公式、本地提取的公式及其 LaTeX 草稿、变量表。
+    只包含这些片段及其上下文，不包含完整源码；没有提取到任何公式时返回 None。
+    """
+    formulas, variables, formula_comments = extract_formulas(code, index)
+    if not formulas and not formula_comments:
+        return None
+    parts = []
+    if formula_comments:
+        parts.append("**注释中提到的公式**:\n" + "\n".join(f"- 第 {line} 行: {text}" for line, text in formula_comments))
+    if formulas:
+        entries = []
+        for number, formula in enumerate(formulas, 1):
+            where = '模块顶层' if formula.scope == '<module>' else f"`{formula.scope}` 中"
+            entry = f"({number}) 第 {formula.line} 行，{where}:\n```python\n{formula.code}\n```\nLaTeX 草稿: $${formula.latex}$$"
+            if formula.comments:
+                entry += f"\n相关注释: {' / '.join(formula.comments)}"
+            entries.append(entry)
+        parts.append("**本地提取的公式**（按源码顺序，LaTeX 为程序自动生成的草稿）:\n\n" + "\n\n".join(entries))
+    if variables:
+        labels = {'parameter': '函数参数', 'constant': '常量', 'variable': '变量'}
+        rows = []
+        for variable in variables:
+            definition = variable.definition.replace('|', '\\|')
+            rows.append(f"| `{variable.name}` | ${variable.symbol}$ | {labels[variable.kind]} | `{definition}` |")
+        parts.append("**变量表**（符号为草稿）:\n| 变量 | 符号 | 类型 | 定义 |\n|---|---|---|---|\n" + "\n".join(rows))
+    return "\n\n".join(parts)
+
+
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python math_extractor.py test_refine_code/003.py   # 打印本地提取的公式素材
+    parser = argparse.ArgumentParser(description="在本地提取 Python 脚本中的数学公式并生成 LaTeX 草稿")
+    parser.add_argument('script')
+    args = parser.parse_args()
+    try:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            source = f.read()
+        context = build_math_context(source)
+    except (OSError, UnicodeDecodeError, SyntaxError) as e:
+        print(f"无法分析 '{args.script}': {e}")
+        sys.exit(1)
+    print(context or "未找到数学公式。")
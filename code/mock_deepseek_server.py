@@ -0,0 +1,275 @@
+# 本地 DeepSeek 兼容模拟服务器，用于离线基准测试和压测。
+#
+# 用法:
+#     python mock_deepseek_server.py --port 8900 --latency 0.5 --error-rate 0.05 --rpm 120
+#     export DEEPSEEK_API_URL=http://127.0.0.1:8900/chat/completions
+#     export DEEPSEEK_API_KEY=mock-key
+#
+# 之后各 Agent 的请求都会发往本地服务器，输出是确定性的：
+# - JSON 模式 (response_format=json_object)：把提示词中的 JSON 对象原样回显，value 前加上 "【译】"，
+#   因此 translate_texts 会得到可预测的翻译映射；变量重命名请求则把清单中每个变量映射为 <name>_std；
+# - 使用编辑块协议的提示词（code_patch）：返回一个锚定在代码首行、不改变代码的编辑块；
+# - 要求输出完整代码的提示词：回显提示词中最后一个代码块；
+# - 其余请求：返回固定结构的 Markdown 分析报告。
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 识别“只输出代码”类任务的关键词（重构、美化、变量重命名等提示词中的输出规则）
+CODE_OUTPUT_MARKERS = ('完整 Python 代码', '重构后的Python代码', '重构和优化后的完整 Python 代码')
+EDIT_PROTOCOL_MARKER = '<<<<<<< SEARCH'
+RENAME_MAPPING_MARKER = '变量重命名映射'
+PYTHON_BLOCK_PATTERN = re.compile(r'(?:```|111)python\n(.*?)(?:```|111)', re.S)
+CODE_BLOCK_PATTERN = re.compile(r'(?:```|111)(?:python)?\n(.*?)(?:```|111)', re.S)
+
+
+class MockConfig:
+    """模拟服务器的行为参数。"""
+
+    def __init__(self, latency=0.2, jitter=0.0, tokens_per_sec=200.0, error_rate=0.0,
+                 rpm=0, retry_after=1, seed=0):
+        self.latency = latency            # 首字节前的固定延迟（秒）
+        self.jitter = jitter              # 延迟的随机抖动上限（秒）
+        self.tokens_per_sec = tokens_per_sec  # 生成速度，决定整体耗时和流式分块节奏
+        self.error_rate = error_rate      # 返回 500 的概率
+        self.rpm = rpm                    # 每分钟允许的请求数，超出返回 429；0 表示不限制
+        self.retry_after = retry_after    # 429 响应中的 Retry-After 秒数
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.seen_prefixes = set()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'streamed': 0}
+
+
+def estimate_tokens(text):
+    return len(text) // 3 + 1
+
+
+def build_completion(payload):
+    """根据请求内容生成确定性的回复文本。"""
+    messages = payload.get('messages', [])
+    prompt = messages[-1].get('content', '') if messages else ''
+
+    full_prompt = '\n'.join(m.get('content', '') for m in messages)
+    if (payload.get('response_format') or {}).get('type') == 'json_object':
+        start, end = prompt.find('{'), prompt.rfind('}')
+        try:
+            source = json.loads(prompt[start:end + 1]) if start != -1 else {}
+        except json.JSONDecodeError:
+            source = {}
+        if RENAME_MAPPING_MARKER in full_prompt:
+            return json.dumps({scope: {name: f"{name}_std" for name in names}
+                               for scope, names in source.items() if isinstance(names, dict)}, ensure_ascii=False)
+        return json.dumps({k: f"【译】{v}" if isinstance(v, str) else v for k, v in source.items()},
+                          ensure_ascii=False)
+
+    if EDIT_PROTOCOL_MARKER in full_prompt:
+        blocks = PYTHON_BLOCK_PATTERN.findall(prompt)
+        anchor = next((line for line in (blocks[-1] if blocks else '').split('\n') if line.strip()), None)
+        if anchor is None:
+            return "NO_CHANGES"
+        return f"<<<<<<< SEARCH\n{anchor}\n=======\n{anchor}\n>>>>>>> REPLACE"
+    if any(marker in full_prompt for marker in CODE_OUTPUT_MARKERS):
+        blocks = CODE_BLOCK_PATTERN.findall(prompt)
+        if blocks:
+            return blocks[-1]
+
+    digest = hashlib.sha256(full_prompt.encode('utf-8')).hexdigest()[:12]
+    return (
+        f"### 1. 功能总结 (Function Summary)\n\n* 模拟分析结果 (mock-{digest})。\n\n"
+        "### 2. 实现思路 (Implementation Logic)\n\n* 步骤一：读取输入。\n* 步骤二：计算并输出结果。\n\n"
+        "### 3. 核心数学公式与变量 (Core Mathematical Formulas and Variables)\n\n"
+        "$$ y = f(x) \\tag{1} $$\n\n| 变量 | 符号 | 含义 |\n|---|---|---|\n| x | $x$ | 输入 |\n"
+    )
+
+
+def build_usage(config, payload, completion):
+    """生成 usage 字段；首条消息（通常是固定的 system 提示）重复出现时按前缀缓存命中计算。"""
+    messages = payload.get('messages', [])
+    prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in messages)
+    hit_tokens = 0
+    if messages:
+        first = messages[0].get('content', '')
+        key = hashlib.sha256(first.encode('utf-8')).hexdigest()
+        with config.lock:
+            if key in config.seen_prefixes:
+                hit_tokens = estimate_tokens(first)
+            config.seen_prefixes.add(key)
+    completion_tokens = estimate_tokens(completion)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'prompt_cache_hit_tokens': hit_tokens,
+        'prompt_cache_miss_tokens': prompt_tokens - hit_tokens,
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, extra_headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _rate_limited(self):
+        config = self.config
+        if not config.rpm:
+            return False
+        now = time.monotonic()
+        with config.lock:
+            while config.recent and now - config.recent[0] > 60:
+                config.recent.popleft()
+            if len(config.recent) >= config.rpm:
+                return True
+            config.recent.append(now)
+        return False
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.config.lock:
+                self._send_json(200, dict(self.config.stats))
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        config = self.config
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'message': 'invalid json'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        with config.lock:
+            config.stats['requests'] += 1
+            fail = config.random.random() < config.error_rate
+            delay = config.latency + config.random.uniform(0, config.jitter)
+        if self._rate_limited():
+            with config.lock:
+                config.stats['rate_limited'] += 1
+            self._send_json(429, {'error': {'message': 'rate limit exceeded'}},
+                            {'Retry-After': str(config.retry_after)})
+            return
+        time.sleep(delay)
+        if fail:
+            with config.lock:
+                config.stats['errors'] += 1
+            self._send_json(500, {'error': {'message': 'injected failure'}})
+            return
+
+        completion = build_completion(payload)
+        usage = build_usage(config, payload, completion)
+        model = payload.get('model', 'deepseek-chat')
+        generation_time = usage['completion_tokens'] / config.tokens_per_sec if config.tokens_per_sec else 0
+
+        if payload.get('stream'):
+            self._stream(model, completion, usage, generation_time)
+        else:
+            time.sleep(generation_time)
+            self._send_json(200, {
+                'id': 'mock-' + hashlib.sha256(completion.encode('utf-8')).hexdigest()[:16],
+                'object': 'chat.completion',
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': completion},
+                             'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+        with config.lock:
+            config.stats['ok'] += 1
+
+    def _stream(self, model, completion, usage, generation_time):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        pieces = [completion[i:i + 16] for i in range(0, len(completion), 16)] or ['']
+        pause = generation_time / len(pieces)
+        for piece in pieces:
+            event = {'object': 'chat.completion.chunk', 'model': model,
+                     'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+            time.sleep(pause)
+        final = {'object': 'chat.completion.chunk', 'model': model, 'choices': [], 'usage': usage}
+        self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        with self.config.lock:
+            self.config.stats['streamed'] += 1
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭 keep-alive 连接属于正常现象，不打印堆栈
+        error = sys.exc_info()[1]
+        if isinstance(error, (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def create_server(host='127.0.0.1', port=8900, config=None):
+    """创建模拟服务器（未启动）。port=0 时由系统分配空闲端口。"""
+    handler = type('ConfiguredMockHandler', (MockHandler,), {'config': config or MockConfig()})
+    return MockServer((host, port), handler)
+
+
+def serve_in_background(host='127.0.0.1', port=0, config=None):
+    """
+    在后台线程中启动模拟服务器，返回 (server, url)，便于在同一进程内做端到端基准测试。
+    用完后调用 server.shutdown()。
+    """
+    server = create_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://{server.server_address[0]}:{server.server_address[1]}/chat/completions"
+    return server, url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地 DeepSeek 兼容模拟服务器")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.2, help="首字节前的固定延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="延迟的随机抖动上限（秒）")
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0, help="模拟的生成速度")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回 500 的概率 (0~1)")
+    parser.add_argument('--rpm', type=int, default=0, help="每分钟允许的请求数，超出返回 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="429 响应的 Retry-After 秒数")
+    parser.add_argument('--seed', type=int, default=0, help="随机数种子，保证错误注入可复现")
+    args = parser.parse_args()
+
+    mock_config = MockConfig(args.latency, args.jitter, args.tokens_per_sec, args.error_rate,
+                             args.rpm, args.retry_after, args.seed)
+    server = create_server(args.host, args.port, mock_config)
+    print(f"模拟 DeepSeek 服务已启动: http://{args.host}:{args.port}/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n模拟服务已停止。")
+        server.shutdown()
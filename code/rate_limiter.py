@@ -0,0 +1,211 @@
+import os
+import time
+import random
+import threading
+import functools
+import contextlib
+import contextvars
+from email.utils import parsedate_to_datetime
+
+# --- 配置区 ---
+# 账户配额：每分钟请求数与每分钟 token 数，0 表示不限制
+REQUESTS_PER_MINUTE = float(os.getenv("DEEPSEEK_RPM", "0"))
+TOKENS_PER_MINUTE = float(os.getenv("DEEPSEEK_TPM", "0"))
+# 单次请求最多重试次数，以及每个任务（一次 analyze_codebase / process_python_file 等）可用的重试总数
+MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "5"))
+JOB_RETRY_BUDGET = int(os.getenv("DEEPSEEK_JOB_RETRY_BUDGET", "20"))
+# 指数退避参数（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# 值得重试的 HTTP 状态码：限流与服务端临时故障
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    经典令牌桶：以 rate_per_min / 60 的速度补充令牌，容量为一分钟的配额。
+    reserve 返回需要等待的时间；允许余额为负（事后按实际用量扣减），负债会推迟后续请求。
+    """
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """预留 amount 个令牌，返回需要等待的秒数（0 表示可以立即发送）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 单次需求超过桶容量时按容量计算，避免永远等不到
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def consume(self, amount):
+        """直接扣减令牌（可为负），用于按实际 usage 校正预估值。"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    同时约束请求数 (RPM) 和 token 数 (TPM) 的限流器。
+    收到 429 + Retry-After 时调用 pause()，让同一进程内所有线程一起退避。
+    """
+
+    def __init__(self, requests_per_min=REQUESTS_PER_MINUTE, tokens_per_min=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_min) if requests_per_min > 0 else None
+        self.tokens = TokenBucket(tokens_per_min) if tokens_per_min > 0 else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, estimated_tokens=0):
+        """阻塞直到请求数和 token 数配额都允许发送。"""
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.reserve(1))
+        if self.tokens is not None and estimated_tokens:
+            waits.append(self.tokens.reserve(estimated_tokens))
+        with self._lock:
+            waits.append(self._paused_until - time.monotonic())
+        delay = max(waits)
+        if delay > 0:
+            time.sleep(delay)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """按响应中的实际 token 用量校正令牌桶。"""
+        if self.tokens is not None and actual_tokens:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds):
+        """在接下来的 seconds 秒内暂停所有请求（例如服务端返回了 Retry-After）。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class RetryBudget:
+    """单个任务可用的重试次数，任务内的所有请求（包括并发请求）共享。"""
+
+    def __init__(self, limit=JOB_RETRY_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self):
+        """占用一次重试机会，预算耗尽时返回 False。"""
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class AdaptiveChunkSizer:
+    """
+    按 AIMD（加性增、乘性减）动态调整批量请求的分块大小：
+    请求成功且耗时低于 target_latency 时分块加大 step，失败或过慢时减半。
+    多个线程共享同一个实例，后续批次会沿用此前观察到的合适大小。
+    """
+
+    def __init__(self, initial, minimum, maximum, target_latency, step=None):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.step = step if step is not None else max(1, initial // 4)
+        self._lock = threading.Lock()
+
+    def record(self, ok, elapsed=0.0):
+        """记录一个分块的结果，返回调整后的分块大小。"""
+        with self._lock:
+            if ok and elapsed <= self.target_latency:
+                self.size = min(self.maximum, self.size + self.step)
+            else:
+                self.size = max(self.minimum, self.size // 2)
+            return self.size
+
+
+_current_budget = contextvars.ContextVar("retry_budget", default=None)
+
+
+def current_budget():
+    """返回当前任务的重试预算；不在任何任务内时返回一个只受 MAX_RETRIES 约束的临时预算。"""
+    budget = _current_budget.get()
+    return budget if budget is not None else RetryBudget(limit=MAX_RETRIES)
+
+
+@contextlib.contextmanager
+def job_retry_budget(limit=JOB_RETRY_BUDGET):
+    """
+    为 with 块内的所有请求分配一个共享的重试预算。
+    预算通过 contextvars 传递，asyncio 任务和 asyncio.to_thread 启动的线程同样可以看到。
+    已处于某个任务预算内时直接沿用外层预算。
+    """
+    if _current_budget.get() is not None:
+        yield _current_budget.get()
+        return
+    budget = RetryBudget(limit)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def per_job_retry_budget(func):
+    """装饰器：每次调用 func 都视为一个独立任务，分配一份重试预算。"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with job_retry_budget():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """指数退避 + 全抖动 (full jitter)：在 [0, min(cap, base * 2^attempt)] 内随机取值。"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式，无法解析时返回 None。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_request_tokens(messages):
+    """粗略估计请求的 prompt token 数，仅用于 TPM 限流的预扣。"""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 3 + 1
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_default_limiter():
+    """返回进程内共享的限流器。"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter()
+    return _default_limiter
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 配置区 ---
+# 单个脚本的最长运行时间（秒），超时的进程组会被整体结束
+RENDER_TIMEOUT = float(os.getenv("SCIAGENT_RENDER_TIMEOUT", "120"))
+# 同时运行的子进程数，默认与 CPU 核数相同（渲染是 CPU 密集型任务，与 API 并发数无关）
+RENDER_WORKERS = int(os.getenv("SCIAGENT_RENDER_WORKERS", str(os.cpu_count() or 2)))
+# 每个子进程的地址空间上限（MB），0 表示不限制；仅在支持 resource 模块的平台上生效
+RENDER_MEMORY_LIMIT_MB = int(os.getenv("SCIAGENT_RENDER_MEMORY_MB", "4096"))
+# 渲染出的图像保存在被验证目录下的隐藏目录中，不会被各 Agent 当作源文件处理
+RENDER_DIR_NAME = ".sciagent_render"
+REPORT_NAME = "render_report.md"
+REVISION_SUFFIX = "_zh_revision.py"
+# 子进程把保存矢量图的大小与耗时写入渲染目录下的该文件
+VECTOR_LOG_NAME = "vector_outputs.json"
+
+# 一次脚本运行的结果：returncode 为 None 表示超时；figures 为渲染出的 PNG 路径列表；
+# vector_outputs 为脚本保存的矢量图记录 [{path, bytes, seconds, baseline_bytes?, baseline_seconds?}]
+RenderResult = namedtuple('RenderResult', ['script', 'returncode', 'elapsed', 'figures', 'timed_out', 'stderr_tail',
+                                           'vector_outputs'])
+
+# 子进程中执行的引导代码：强制使用 Agg 后端，把 plt.show() 换成“保存当前所有图像并关闭”，
+# 脚本结束（包括异常退出）时再保存一次尚未显示的图像，然后以 __main__ 身份运行目标脚本。
+# 脚本保存矢量图时记录文件大小与耗时；若启用了紧凑矢量输出（路径简化 / 字体子集化 / 图元栅格化），
+# 先按 Matplotlib 默认设置另存一份到临时目录作为对照，用于报告中的前后对比
+_BOOTSTRAP = r"""
+import os, sys, runpy
+script, out_dir, memory_mb, vector_log = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]
+if memory_mb:
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 2 ** 20, memory_mb * 2 ** 20))
+    except (ImportError, ValueError, OSError):
+        pass
+os.environ['MPLBACKEND'] = 'Agg'
+try:
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+saved = []
+
+def _save_open_figures(*args, **kwargs):
+    for num in plt.get_fignums():
+        path = os.path.join(out_dir, 'figure_%d.png' % (len(saved) + 1))
+        plt.figure(num).savefig(path)
+        saved.append(path)
+    plt.close('all')
+
+vector_outputs = []
+COMPACT_KEYS = ['path.simplify', 'path.simplify_threshold', 'svg.fonttype', 'pdf.fonttype', 'ps.fonttype']
+VECTOR_FORMATS = ('svg', 'pdf', 'eps', 'ps')
+
+def _measure_savefig(original_savefig):
+    import time, tempfile
+
+    def savefig(self, fname, *args, **kwargs):
+        fmt = kwargs.get('format')
+        if not fmt and isinstance(fname, (str, os.PathLike)):
+            fmt = os.path.splitext(os.fspath(fname))[1][1:]
+        if (fmt or '').lower() not in VECTOR_FORMATS or not isinstance(fname, (str, os.PathLike)):
+            return original_savefig(self, fname, *args, **kwargs)
+        record = {'path': os.path.abspath(fname)}
+        rasterized = [artist for ax in self.get_axes() for artist in list(ax.lines) + list(ax.collections)
+                      if artist.get_rasterized()]
+        defaults = {key: matplotlib.rcParamsDefault[key] for key in COMPACT_KEYS}
+        if rasterized or any(matplotlib.rcParams[key] != value for key, value in defaults.items()):
+            try:
+                for artist in rasterized:
+                    artist.set_rasterized(False)
+                with tempfile.TemporaryDirectory() as tmp:
+                    baseline = os.path.join(tmp, 'baseline.' + fmt.lower())
+                    start = time.perf_counter()
+                    with matplotlib.rc_context(defaults):
+                        original_savefig(self, baseline, *args, **kwargs)
+                    record['baseline_seconds'] = time.perf_counter() - start
+                    record['baseline_bytes'] = os.path.getsize(baseline)
+            except Exception:
+                pass
+            finally:
+                for artist in rasterized:
+                    artist.set_rasterized(True)
+        start = time.perf_counter()
+        result = original_savefig(self, fname, *args, **kwargs)
+        record['seconds'] = time.perf_counter() - start
+        record['bytes'] = os.path.getsize(fname) if os.path.exists(fname) else 0
+        vector_outputs.append(record)
+        return result
+    return savefig
+
+if plt is not None:
+    import matplotlib.figure
+    plt.show = _save_open_figures
+    plt.pause = lambda *args, **kwargs: None
+    matplotlib.figure.Figure.savefig = _measure_savefig(matplotlib.figure.Figure.savefig)
+sys.argv = [script]
+sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+try:
+    runpy.run_path(script, run_name='__main__')
+finally:
+    if plt is not None:
+        _save_open_figures()
+    if vector_outputs:
+        import json
+        with open(os.path.join(out_dir, vector_log), 'w') as f:
+            json.dump(vector_outputs, f)
+"""
+
+
+def _kill_process_group(proc):
+    """结束脚本及其派生的所有子进程。"""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
+
+
+def render_script(script, output_dir, timeout=RENDER_TIMEOUT):
+    """
+    在独立的子进程中以无界面方式运行脚本，返回 RenderResult。
+    子进程使用 Agg 后端、标准输入为空（input() 立即得到 EOF），工作目录为脚本所在目录，
+    图像保存到 output_dir/figure_<n>.png。
+    """
+    script = os.path.abspath(script)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONDONTWRITEBYTECODE='1', PYTHONIOENCODING='utf-8')
+    command = [sys.executable, '-c', _BOOTSTRAP, script, os.path.abspath(output_dir), str(RENDER_MEMORY_LIMIT_MB),
+               VECTOR_LOG_NAME]
+
+    start = time.perf_counter()
+    timed_out = False
+    try:
+        proc = subprocess.Popen(
+            command, cwd=os.path.dirname(script), env=env,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            start_new_session=hasattr(os, 'killpg'),
+        )
+    except OSError as e:
+        return RenderResult(script, -1, 0.0, [], False, str(e), [])
+    try:
+        _, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_process_group(proc)
+        _, stderr = proc.communicate()
+    elapsed = time.perf_counter() - start
+
+    figures = sorted(
+        (os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.endswith('.png')),
+        key=lambda path: int(os.path.basename(path)[len('figure_'):-len('.png')]),
+    )
+    stderr_tail = '\n'.join(stderr.decode('utf-8', errors='replace').strip().splitlines()[-8:])
+    try:
+        with open(os.path.join(output_dir, VECTOR_LOG_NAME), 'r', encoding='utf-8') as f:
+            vector_outputs = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        vector_outputs = []
+    return RenderResult(script, None if timed_out else proc.returncode, elapsed, figures, timed_out, stderr_tail,
+                        vector_outputs)
+
+
+def find_revision_pairs(directory):
+    """查找目录下所有 (原始脚本, _zh_revision.py) 对，跳过隐藏目录和 __pycache__。"""
+    pairs = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+        for name in sorted(files):
+            if name.endswith(REVISION_SUFFIX):
+                original = os.path.join(root, name[:-len(REVISION_SUFFIX)] + '.py')
+                if os.path.exists(original):
+                    pairs.append((original, os.path.join(root, name)))
+    return pairs
+
+
+def _render_dir(directory, script, variant):
+    relative = os.path.splitext(os.path.relpath(script, directory))[0]
+    return os.path.join(directory, RENDER_DIR_NAME, relative, variant)
+
+
+def verify_pairs(directory, pairs, timeout=RENDER_TIMEOUT, max_workers=RENDER_WORKERS):
+    """
+    并行运行每一对原始脚本与译后脚本，返回 [(原始结果, 译后结果)]，顺序与 pairs 一致。
+    所有脚本一起放入进程池，总耗时约为 脚本数 × 平均耗时 / max_workers。
+    """
+    jobs = []
+    for original, revision in pairs:
+        jobs.append((original, _render_dir(directory, original, 'original')))
+        jobs.append((revision, _render_dir(directory, original, 'revision')))
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(lambda job: render_script(job[0], job[1], timeout), jobs))
+    return list(zip(results[0::2], results[1::2]))
+
+
+def _status(result):
+    if result.timed_out:
+        return "超时"
+    return "成功" if result.returncode == 0 else f"失败 ({result.returncode})"
+
+
+def classify(original, revision):
+    """给出一对脚本的验证结论。"""
+    if original.returncode != 0:
+        return "原始脚本无法运行"
+    if revision.returncode != 0:
+        return "✗ 译后脚本运行失败"
+    if len(original.figures) != len(revision.figures):
+        return "✗ 图像数量不一致"
+    return "✓ 通过"
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _vector_rows(directory, verified):
+    """译后脚本保存的每个矢量图一行：文件大小与保存耗时，有对照结果时给出前后对比和压缩比例。"""
+    rows = []
+    for _, revision in verified:
+        for record in revision.vector_outputs:
+            name = os.path.relpath(record['path'], directory)
+            size = _format_size(record['bytes'])
+            seconds = f"{record['seconds']:.2f}s"
+            if 'baseline_bytes' in record:
+                ratio = record['bytes'] / record['baseline_bytes'] if record['baseline_bytes'] else 1.0
+                size = f"{_format_size(record['baseline_bytes'])} → {size} ({ratio:.0%})"
+                seconds = f"{record['baseline_seconds']:.2f}s → {seconds}"
+            rows.append(f"| {name} | {size} | {seconds} |")
+    return rows
+
+
+def write_report(directory, verified, report_path=None):
+    """把验证结果写成 Markdown 表格，失败的脚本附上 stderr 末尾几行。返回报告路径。"""
+    report_path = report_path or os.path.join(directory, REPORT_NAME)
+    lines = [
+        "# 渲染验证报告",
+        "",
+        f"共验证 {len(verified)} 对脚本，渲染图像保存在 `{RENDER_DIR_NAME}/` 目录下。",
+        "",
+        "| 脚本 | 原始脚本 | 译后脚本 | 图像数 (原始/译后) | 耗时 (原始/译后) | 结论 |",
+        "| --- | --- | --- | --- | --- | --- |",
+    ]
+    details = []
+    for original, revision in verified:
+        name = os.path.relpath(original.script, directory)
+        verdict = classify(original, revision)
+        lines.append(
+            f"| {name} | {_status(original)} | {_status(revision)} "
+            f"| {len(original.figures)}/{len(revision.figures)} "
+            f"| {original.elapsed:.1f}s/{revision.elapsed:.1f}s | {verdict} |"
+        )
+        for result in (original, revision):
+            if result.returncode != 0 and result.stderr_tail:
+                details.append(f"### {os.path.relpath(result.script, directory)}\n\n```\n{result.stderr_tail}\n```\n")
+    vector_rows = _vector_rows(directory, verified)
+    if vector_rows:
+        lines += [
+            "",
+            "## 矢量图输出",
+            "",
+            "默认设置一栏为关闭路径简化 / 字体子集化 / 图元栅格化后另存的对照结果，"
+            "只在脚本启用了紧凑矢量输出时才有。",
+            "",
+            "| 文件 | 大小 (默认 → 实际) | 保存耗时 (默认 → 实际) |",
+            "| --- | --- | --- |",
+        ] + vector_rows
+    if details:
+        lines += ["", "## 错误输出", ""] + details
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return report_path
+
+
+def verify_directory(directory, timeout=RENDER_TIMEOUT, max_workers=RENDER_WORKERS):
+    """验证目录下所有译后脚本能否与原始脚本一样正常出图，生成报告并返回 [(原始结果, 译后结果)]。"""
+    pairs = find_revision_pairs(directory)
+    if not pairs:
+        print(f"'{directory}' 中没有找到 *{REVISION_SUFFIX} 文件，无需验证。")
+        return []
+    print(f"--- 开始渲染验证: {len(pairs)} 对脚本，{max_workers} 个进程并行，单个脚本超时 {timeout:.0f}s ---")
+    start = time.perf_counter()
+    verified = verify_pairs(directory, pairs, timeout, max_workers)
+    report_path = write_report(directory, verified)
+    passed = sum(classify(original, revision) == "✓ 通过" for original, revision in verified)
+    print(f"--- 渲染验证完成（{time.perf_counter() - start:.1f}s）: {passed}/{len(verified)} 对通过，"
+          f"报告已保存至: {report_path} ---")
+    return verified
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python render_verifier.py test_graphics/ --timeout 60 --workers 8
+    parser = argparse.ArgumentParser(description="并行无界面运行原始脚本与译后脚本，生成渲染验证报告")
+    parser.add_argument('directory')
+    parser.add_argument('--timeout', type=float, default=RENDER_TIMEOUT, help="单个脚本的超时时间（秒）")
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS, help="并行的子进程数")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"错误：目录 '{args.directory}' 不存在。")
+        sys.exit(1)
+    verify_directory(args.directory, timeout=args.timeout, max_workers=args.workers)
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- 配置区 ---
+# 缓存数据库位置、容量上限和过期时间均可通过环境变量调整
+CACHE_DIR = os.getenv("DEEPSEEK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sciagent"))
+CACHE_MAX_BYTES = int(os.getenv("DEEPSEEK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_MAX_AGE = float(os.getenv("DEEPSEEK_CACHE_MAX_AGE", str(30 * 24 * 3600)))  # 秒
+# 设置 DEEPSEEK_CACHE_BYPASS=1 可全局跳过缓存（既不读也不写）
+CACHE_BYPASS = os.getenv("DEEPSEEK_CACHE_BYPASS", "") not in ("", "0")
+
+
+def make_cache_key(model, endpoint, messages, temperature=None, response_format=None):
+    """
+    由 (model, endpoint, prompt, temperature, response_format) 计算内容寻址的缓存键。
+    使用规范化的 JSON 序列化后取 SHA-256，保证同样的请求得到同样的键。
+    """
+    material = json.dumps(
+        [model, endpoint, messages, temperature, response_format],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    基于 SQLite 的 LLM 响应磁盘缓存。
+    - 按 last_access 做 LRU 淘汰，总大小不超过 max_bytes；
+    - 超过 max_age 秒的条目视为过期；
+    - hits / misses / writes / evictions 计数可通过 stats() 查看。
+    """
+
+    def __init__(self, path=None, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "llm_responses.sqlite3")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """命中则返回缓存内容并刷新访问时间，否则返回 None。"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        """写入一条缓存，并在超出容量时按 LRU 淘汰旧条目。"""
+        now = time.time()
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now),
+            )
+            self.writes += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.max_age:
+            cur = self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+            self.evictions += cur.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """清空所有缓存条目。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """返回命中统计与当前占用。"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """返回进程内共享的默认缓存实例。"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
@@ -0,0 +1,252 @@
+import re
+import ast
+import inspect
+import tokenize
+from collections import namedtuple
+
+# 源码中一段可翻译的文本及其位置
+# kind: 'string'（绘图函数的字符串参数）/ 'docstring'（文档字符串）/ 'comment'（整行或行尾注释）
+# text: 需要翻译的原文；start、end: 被替换区域在源码中的字符偏移（左闭右开）
+# 对 'string' 和 'docstring' 而言被替换的是整个字符串字面量（含引号），对 'comment' 而言只是 '#' 之后的注释正文
+TextSpan = namedtuple('TextSpan', ['kind', 'text', 'start', 'end'])
+
+_NEWLINE = re.compile(r'\r\n|\r|\n')
+_STRING_PREFIX = re.compile(r"([rRuU]*)('''|\"\"\"|'|\")")
+_CODING_COOKIE = re.compile(r'^#.*coding[:=]')
+# 不能翻译的工具指令注释：type: ignore、noqa、pragma、fmt: off、pylint: disable 等
+_DIRECTIVE_COMMENT = re.compile(r'^(type:|noqa\b|pragma\b|fmt:|pylint:|mypy:|isort:|nosec\b)', re.I)
+
+
+def line_offsets(code):
+    """
+    返回每一行（1 起始）首字符在源码中的偏移，下标 0 占位，末尾额外附加 len(code)。
+    只把 \\r\\n、\\r、\\n 视为换行，与 ast / tokenize 的行号保持一致。
+    """
+    offsets = [0, 0]
+    offsets.extend(m.end() for m in _NEWLINE.finditer(code))
+    offsets.append(len(code))
+    return offsets
+
+
+def split_lines(code, offsets):
+    """按 line_offsets 的结果切分源码行（保留换行符），供 tokenize 逐行读取。"""
+    return [code[offsets[i]:offsets[i + 1]] for i in range(1, len(offsets) - 1)]
+
+
+def _char_col(line, byte_col):
+    """ast 给出的 col_offset 是 UTF-8 字节偏移，转换为字符偏移（纯 ASCII 行直接返回）。"""
+    if line.isascii():
+        return byte_col
+    return len(line.encode('utf-8')[:byte_col].decode('utf-8', errors='ignore'))
+
+
+def node_offsets(node, lines, offsets):
+    """AST 节点在源码中的字符区间 (start, end)；lines、offsets 分别来自 split_lines 和 line_offsets。"""
+    start = offsets[node.lineno] + _char_col(lines[node.lineno - 1], node.col_offset)
+    end = offsets[node.end_lineno] + _char_col(lines[node.end_lineno - 1], node.end_col_offset)
+    return start, end
+
+
+def apply_edits(code, edits):
+    """
+    单次线性扫描应用一组编辑 (start, end, replacement)：start == end 表示在该位置插入。
+    编辑按位置排序（同一位置的插入保持给出的先后顺序），与前一个编辑重叠的会被丢弃。
+    """
+    pieces = []
+    position = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < position:
+            continue
+        pieces.append(code[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(code[position:])
+    return ''.join(pieces)
+
+
+def _string_value(tokens):
+    """相邻 STRING 记号（隐式拼接）的取值；f-string、bytes 等非普通字符串返回 None。"""
+    parts = []
+    for token in tokens:
+        prefix = _STRING_PREFIX.match(token.string)
+        if prefix is None:
+            return None
+        try:
+            value = ast.literal_eval(token.string)
+        except (SyntaxError, ValueError):
+            return None
+        if not isinstance(value, str):
+            return None
+        parts.append(value)
+    return ''.join(parts)
+
+
+def _is_translatable_comment(token):
+    """含英文字母、且不是编码声明 / shebang / 工具指令的注释。"""
+    text = token.string[1:].strip()
+    if not text or not re.search('[a-zA-Z]', text):
+        return False
+    if token.start[0] <= 2 and (token.string.startswith('#!') or _CODING_COOKIE.match(token.string)):
+        return False
+    return not _DIRECTIVE_COMMENT.match(text)
+
+
+def iter_text_spans(code, plot_functions, text_keywords=()):
+    """
+    基于 tokenize 的单遍扫描，按出现顺序逐个产出可翻译文本的 TextSpan：
+    - 'comment': 含英文字母的注释，包括整行注释和行尾注释（跳过编码声明、type: ignore 等指令）；
+    - 'docstring': 模块、类、函数的文档字符串，text 为 inspect.cleandoc 规整后的正文；
+    - 'string': plot_functions 中绘图方法（如 ax.set_title）直接传入的字符串位置参数，
+      以及 text_keywords 中的关键字参数（如 label=、title=）；loc='best' 之类的取值参数不会被提取。
+    tokenize 给出的列号就是字符偏移，无需再做字节换算。
+    """
+    offsets = line_offsets(code)
+    line_iter = iter(split_lines(code, offsets))
+    brackets = []             # 括号栈：每层记录是否为目标绘图方法的调用括号
+    prev = prev2 = None       # 最近两个有效记号（跳过注释和空行）
+    pending = []              # 正在累积的相邻 STRING 记号
+    pending_kind = None       # 'string' / 'docstring' / None（不需要翻译的字符串）
+    line_start = True         # 当前记号是否为逻辑行的第一个记号
+    in_header = False         # 当前逻辑行是否为 def / class 头部
+    expect_docstring = True   # 下一个语句若为字符串则是文档字符串（模块开头、def/class 冒号之后）
+
+    for token in tokenize.generate_tokens(lambda: next(line_iter, '')):
+        kind = token.type
+        if kind == tokenize.COMMENT:
+            if _is_translatable_comment(token):
+                body = token.string[1:]
+                start = offsets[token.start[0]] + token.start[1] + 1 + (len(body) - len(body.lstrip()))
+                yield TextSpan('comment', body.strip(), start, start + len(body.strip()))
+            continue
+        if kind in (tokenize.NL, tokenize.ENCODING):
+            continue
+
+        if pending and kind != tokenize.STRING:
+            # 字符串必须独立成为一个参数 / 一条语句，后面紧跟 ',' ')' 或语句结束才算数
+            if pending_kind == 'string':
+                complete = kind == tokenize.OP and token.string in (',', ')')
+            else:
+                complete = kind in (tokenize.NEWLINE, tokenize.ENDMARKER) or token.string == ';'
+            value = _string_value(pending) if pending_kind and complete else None
+            if value is not None and value.strip():
+                start = offsets[pending[0].start[0]] + pending[0].start[1]
+                end = offsets[pending[-1].end[0]] + pending[-1].end[1]
+                if pending_kind == 'string':
+                    yield TextSpan('string', value, start, end)
+                else:
+                    text = inspect.cleandoc(value)
+                    if re.search('[a-zA-Z]', text):
+                        yield TextSpan('docstring', text, start, end)
+            pending, pending_kind = [], None
+
+        if kind in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+            line_start = kind == tokenize.NEWLINE or line_start
+            in_header = in_header and kind != tokenize.NEWLINE
+            continue
+
+        if kind == tokenize.STRING:
+            if not pending:
+                if expect_docstring:
+                    pending_kind = 'docstring'
+                elif brackets and brackets[-1] and prev is not None and prev.type == tokenize.OP and (
+                        prev.string in ('(', ',') or (prev.string == '=' and prev2.string in text_keywords)):
+                    pending_kind = 'string'
+            pending.append(token)
+        elif kind == tokenize.OP:
+            if token.string in ('(', '[', '{'):
+                brackets.append(
+                    token.string == '(' and prev is not None and prev.type == tokenize.NAME
+                    and prev.string in plot_functions and prev2 is not None and prev2.string == '.'
+                )
+            elif token.string in (')', ']', '}'):
+                if brackets:
+                    brackets.pop()
+        elif kind == tokenize.NAME and line_start and token.string in ('def', 'class', 'async'):
+            in_header = True
+
+        expect_docstring = (in_header and not brackets and kind == tokenize.OP and token.string == ':')
+        if expect_docstring:
+            in_header = False
+        line_start = False
+        prev2, prev = prev, token
+
+
+def extract_text_spans(code, plot_functions, text_keywords=()):
+    """收集 iter_text_spans 产出的全部文本，按源码位置排序后返回列表，供翻译和 apply_spans 共用。"""
+    spans = list(iter_text_spans(code, plot_functions, text_keywords))
+    spans.sort(key=lambda span: span.start)
+    return spans
+
+
+def format_string_literal(original_literal, value):
+    """
+    生成值为 value 的字符串字面量，尽量沿用原字面量的前缀和引号风格；
+    无法沿用时（例如隐式拼接、raw 字符串中出现引号）退回 repr(value)。
+    """
+    match = _STRING_PREFIX.match(original_literal)
+    if match:
+        prefix, quote = match.groups()
+        body = value
+        if 'r' not in prefix.lower():
+            body = body.replace('\\', '\\\\')
+            if len(quote) == 1:
+                body = body.replace('\n', '\\n').replace('\r', '\\r')
+            body = body.replace(quote[0], '\\' + quote[0])
+        candidate = f"{prefix}{quote}{body}{quote}"
+        try:
+            if ast.literal_eval(candidate) == value:
+                return candidate
+        except (SyntaxError, ValueError):
+            pass
+    return repr(value)
+
+
+def format_docstring_literal(original_literal, text, indent=''):
+    """
+    用译文 text 重建文档字符串：保留原有的前缀、引号以及正文首尾的空白，
+    多行译文的后续行按 indent 缩进，与原文档字符串的排版保持一致。
+    """
+    match = _STRING_PREFIX.match(original_literal)
+    if match:
+        prefix, quote = match.groups()
+        body = original_literal[len(prefix) + len(quote):len(original_literal) - len(quote)]
+        lead = body[:len(body) - len(body.lstrip())]
+        trail = body[len(body.rstrip()):]
+        lines = text.strip().splitlines()
+        content = ('\n' + indent).join(line.rstrip() for line in lines) if len(quote) == 3 else ' '.join(lines)
+        if 'r' not in prefix.lower():
+            content = content.replace('\\', '\\\\').replace(quote[0], '\\' + quote[0])
+        candidate = f"{prefix}{quote}{lead}{content}{trail}{quote}"
+        try:
+            if isinstance(ast.literal_eval(candidate), str):
+                return candidate
+        except (SyntaxError, ValueError):
+            pass
+    return repr(text)
+
+
+def apply_spans(code, spans, translation_map):
+    """
+    单次线性扫描：按位置把每个 span 替换为 translation_map 中的译文，其余源码原样拼接。
+    没有译文或译文与原文相同的 span 保持不变；位置重叠的 span 只处理前一个。
+    """
+    pieces = []
+    position = 0
+    for span in spans:
+        translated = translation_map.get(span.text)
+        if not isinstance(translated, str) or translated == span.text or span.start < position:
+            continue
+        if span.kind == 'string':
+            replacement = format_string_literal(code[span.start:span.end], translated)
+        elif span.kind == 'docstring':
+            line_start = max(code.rfind('\n', 0, span.start), code.rfind('\r', 0, span.start)) + 1
+            indent = code[line_start:span.start]
+            replacement = format_docstring_literal(code[span.start:span.end], translated,
+                                                   indent if not indent.strip() else '')
+        else:
+            replacement = ' '.join(translated.splitlines())
+        pieces.append(code[position:span.start])
+        pieces.append(replacement)
+        position = span.end
+    pieces.append(code[position:])
+    return ''.join(pieces)
@@ -0,0 +1,450 @@
+import os
+import re
+import ast
+import sys
+import bisect
+import argparse
+import threading
+from collections import namedtuple, OrderedDict
+import job_manifest
+from source_rewriter import line_offsets, split_lines, node_offsets
+
+# --- 配置区 ---
+# 进程内缓存的符号索引数量（按源码内容哈希）；监视模式下同一文件被翻译、分析、解释多个 Agent 共用一份索引
+SYMBOL_CACHE_SIZE = int(os.getenv("SCIAGENT_SYMBOL_CACHE_SIZE", "64"))
+
+MODULE_SCOPE = "<module>"
+
+# 源码中一处名字的出现：
+# scope 为出现位置所在的作用域，target 为按作用域规则解析到的绑定作用域（内置或未定义的名字为 None）；
+# role: 'bind'（赋值、参数、def/class、import 等）/ 'use'（读取、del）/ 'declare'（global、nonlocal 声明）；
+# start、end 为字符偏移，line 为 1 起始的行号
+Occurrence = namedtuple('Occurrence', ['scope', 'name', 'role', 'start', 'end', 'line', 'target'])
+# 一个符号：限定作用域名、名字、绑定方式集合、绑定处与引用处的 Occurrence 列表
+Symbol = namedtuple('Symbol', ['scope', 'name', 'kinds', 'bindings', 'references'])
+
+
+class Scope:
+    """一个词法作用域：模块、函数（含 lambda）、类或推导式。"""
+
+    def __init__(self, kind, name, parent, node=None):
+        self.kind = kind
+        self.name = name
+        self.parent = parent
+        self.node = node
+        self.qualified = name
+        self.bindings = {}       # 名字 -> 绑定方式集合：variable / parameter / import / def / class / pattern
+        self.globals = set()
+        self.nonlocals = set()
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def start_line(self):
+        return self.node.lineno if self.node is not None else 1
+
+    @property
+    def end_line(self):
+        return self.node.end_lineno if self.node is not None else sys.maxsize
+
+    def view(self):
+        return set(self.bindings), self.globals, self.nonlocals
+
+
+def resolve(scope, name, view=Scope.view, module=None):
+    """
+    按 Python 的 LEGB 规则查找名字绑定所在的作用域（内层函数跳过类作用域），找不到（内置或未定义）时返回 None。
+    view(scope) 返回 (绑定的名字, global 声明, nonlocal 声明)，可以替换为模拟改名后的视图。
+    """
+    if module is None:
+        module = scope
+        while module.parent is not None:
+            module = module.parent
+    bound, globals_, nonlocals = view(scope)
+    if name in globals_:
+        return module if name in view(module)[0] else None
+    if name in bound and name not in nonlocals:
+        return scope
+    current = scope.parent
+    while current is not None:
+        if current.kind != 'class':
+            bound, globals_, nonlocals = view(current)
+            if name in globals_:
+                return module if name in view(module)[0] else None
+            if name in bound and name not in nonlocals:
+                return current
+        current = current.parent
+    return None
+
+
+class _ScopeBuilder(ast.NodeVisitor):
+    """
+    单遍遍历 AST，建立作用域树并记录每个名字的绑定与出现位置。
+    按 Python 的作用域规则处理 global / nonlocal、类作用域不对内层函数可见、
+    推导式的第一个可迭代对象在外层求值、海象运算符绑定到外层函数等细节。
+    """
+
+    def __init__(self, code):
+        self.code = code
+        self.offsets = line_offsets(code)
+        self.lines = split_lines(code, self.offsets)
+        self.module = Scope('module', MODULE_SCOPE, None)
+        self.scope = self.module
+        self.occurrences = []    # (作用域, 名字, 角色, 起始偏移)
+        self.calls = []          # (作用域, ast.Call)，用于同步调用处的关键字参数
+
+    # --- 绑定与出现 ---
+    def _bind(self, scope, name, kind):
+        if name in scope.globals:
+            scope = self.module
+        elif name in scope.nonlocals:
+            return
+        scope.bindings.setdefault(name, set()).add(kind)
+
+    def _occur(self, scope, name, role, start):
+        self.occurrences.append((scope, name, role, start))
+
+    def _find(self, node, pattern, name, last=False):
+        """名字没有独立的 AST 节点（def 名、import 别名等）时，在节点源码中按正则定位，返回偏移或 None。"""
+        start, end = node_offsets(node, self.lines, self.offsets)
+        match = None
+        for match in re.finditer(pattern.format(re.escape(name)), self.code[start:end]):
+            if not last:
+                break
+        return start + match.start(1) if match is not None else None
+
+    def _push(self, kind, name, node):
+        self.scope = Scope(kind, name, self.scope, node)
+        return self.scope
+
+    def _pop(self):
+        self.scope = self.scope.parent
+
+    # --- 语句 ---
+    def visit_Name(self, node):
+        role = 'bind' if isinstance(node.ctx, ast.Store) else 'use'
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._bind(self.scope, node.id, 'variable')
+        self._occur(self.scope, node.id, role, node_offsets(node, self.lines, self.offsets)[0])
+
+    def visit_NamedExpr(self, node):
+        target_scope = self.scope
+        while target_scope.kind == 'comprehension':
+            target_scope = target_scope.parent
+        self._bind(target_scope, node.target.id, 'variable')
+        self._occur(self.scope, node.target.id, 'bind', node_offsets(node.target, self.lines, self.offsets)[0])
+        self.visit(node.value)
+
+    def _visit_function(self, node, name):
+        for decorator in getattr(node, 'decorator_list', []):
+            self.visit(decorator)
+        args = node.args
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        all_args = args.posonlyargs + args.args + args.kwonlyargs + [a for a in (args.vararg, args.kwarg) if a]
+        if not isinstance(node, ast.Lambda):
+            for arg in all_args:
+                if arg.annotation is not None:
+                    self.visit(arg.annotation)
+            if node.returns is not None:
+                self.visit(node.returns)
+            self._bind(self.scope, name, 'def')
+            position = self._find(node, r'\bdef\s+({})\b', name)
+            if position is not None:
+                self._occur(self.scope, name, 'bind', position)
+        scope = self._push('function', name, node)
+        for arg in all_args:
+            self._bind(scope, arg.arg, 'parameter')
+            self._occur(scope, arg.arg, 'bind', node_offsets(arg, self.lines, self.offsets)[0])
+        # 先收集 global / nonlocal 声明，保证声明之前的绑定也能归到正确的作用域
+        body = node.body if isinstance(node.body, list) else [node.body]
+        for statement in body:
+            self._predeclare(scope, statement)
+        for statement in body:
+            self.visit(statement)
+        self._pop()
+
+    def _predeclare(self, scope, node):
+        """收集属于本作用域的 global / nonlocal 声明，不进入内层的函数和类。"""
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            return
+        if isinstance(node, ast.Global):
+            scope.globals.update(node.names)
+        elif isinstance(node, ast.Nonlocal):
+            scope.nonlocals.update(node.names)
+        for child in ast.iter_child_nodes(node):
+            self._predeclare(scope, child)
+
+    def visit_FunctionDef(self, node):
+        self._visit_function(node, node.name)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._visit_function(node, '<lambda>')
+
+    def visit_ClassDef(self, node):
+        for expression in node.decorator_list + node.bases + [k.value for k in node.keywords]:
+            self.visit(expression)
+        self._bind(self.scope, node.name, 'class')
+        position = self._find(node, r'\bclass\s+({})\b', node.name)
+        if position is not None:
+            self._occur(self.scope, node.name, 'bind', position)
+        self._push('class', node.name, node)
+        for statement in node.body:
+            self.visit(statement)
+        self._pop()
+
+    def _visit_comprehension(self, node, elements):
+        self.visit(node.generators[0].iter)
+        self._push('comprehension', '<comprehension>', node)
+        for index, generator in enumerate(node.generators):
+            self.visit(generator.target)
+            if index:
+                self.visit(generator.iter)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self._pop()
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, [node.key, node.value])
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            name = (alias.asname or alias.name).split('.')[0]
+            self._bind(self.scope, name, 'import')
+            # Python 3.10 起 alias 节点才带有位置信息
+            if getattr(alias, 'lineno', None) is not None:
+                pattern = r'\bas\s+({})\b' if alias.asname else r'^({})\b'
+                position = self._find(alias, pattern, name)
+                if position is not None:
+                    self._occur(self.scope, name, 'bind', position)
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Global(self, node):
+        for name in node.names:
+            start, end = node_offsets(node, self.lines, self.offsets)
+            for match in re.finditer(r'[\s,]({})(?![\w])'.format(re.escape(name)), self.code[start:end]):
+                self._occur(self.scope, name, 'declare', start + match.start(1))
+
+    visit_Nonlocal = visit_Global
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self._bind(self.scope, node.name, 'variable')
+            start = node_offsets(node, self.lines, self.offsets)[0]
+            header_end = node_offsets(node.body[0], self.lines, self.offsets)[0]
+            match = None
+            for match in re.finditer(r'\bas\s+({})(?![\w])'.format(re.escape(node.name)), self.code[start:header_end]):
+                pass
+            if match is not None:
+                self._occur(self.scope, node.name, 'bind', start + match.start(1))
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_Call(self, node):
+        self.calls.append((self.scope, node))
+        self.generic_visit(node)
+
+    def _bind_pattern(self, node):
+        for name in (getattr(node, 'name', None), getattr(node, 'rest', None)):
+            if name:
+                self._bind(self.scope, name, 'pattern')
+                position = self._find(node, r'\b({})\b', name, last=True)
+                if position is not None:
+                    self._occur(self.scope, name, 'bind', position)
+        self.generic_visit(node)
+
+    visit_MatchAs = visit_MatchStar = visit_MatchMapping = _bind_pattern
+
+
+def _assign_qualified_names(module):
+    """
+    为每个作用域生成限定名（如 generate_data、Model.fit.loss、main.<lambda>）。同一作用域中重名的子作用域附加行号区分
+    （同一行有多个时再附加列号），内层作用域沿用外层区分后的名字，例如 make@17.inc。
+    """
+    scopes = [module]
+
+    def walk(scope, prefix):
+        names = [child.name for child in scope.children]
+        lines = [(child.name, child.node.lineno) for child in scope.children]
+        for child in scope.children:
+            qualified = f"{prefix}.{child.name}" if prefix else child.name
+            if names.count(child.name) > 1:
+                qualified += f"@{child.node.lineno}"
+                if lines.count((child.name, child.node.lineno)) > 1:
+                    qualified += f":{child.node.col_offset}"
+            child.qualified = qualified
+            scopes.append(child)
+            walk(child, qualified)
+
+    walk(module, '')
+    return scopes
+
+
+class SymbolIndex:
+    """
+    一个模块的作用域与符号表：每个作用域、每处绑定和引用（带源码位置）以及解析结果、使用次数。
+    变量重命名、大文件分块分析、学术风格注入等都基于同一份索引，不必各自重新解析、遍历语法树。
+    通过 get_symbol_index 获取的索引在多个 Agent 间共享，使用方不能修改其中的内容（包括 tree）。
+    """
+
+    def __init__(self, code, tree=None):
+        self.code = code
+        self.tree = tree if tree is not None else ast.parse(code)
+        builder = _ScopeBuilder(code)
+        builder.visit(self.tree)
+        self.offsets = builder.offsets
+        self.lines = builder.lines
+        self.module = builder.module
+        self.calls = builder.calls
+        self.scopes = _assign_qualified_names(self.module)
+        self.scope_by_name = {scope.qualified: scope for scope in self.scopes}
+
+        self.occurrences = []
+        self._symbols = {}
+        for scope, name, role, start in sorted(builder.occurrences, key=lambda item: item[3]):
+            line = bisect.bisect_right(self.offsets, start, 1, len(self.offsets) - 1) - 1
+            if role == 'declare':
+                target = resolve(scope.parent, name, module=self.module) if scope.parent else None
+                if name in scope.globals:
+                    target = self.module if name in self.module.bindings else None
+            else:
+                target = resolve(scope, name, module=self.module)
+            occurrence = Occurrence(scope, name, role, start, start + len(name), line, target)
+            self.occurrences.append(occurrence)
+            if target is not None:
+                bindings, references = self._symbols.setdefault((target, name), ([], []))
+                if role == 'bind':
+                    bindings.append(occurrence)
+                elif role == 'use':
+                    references.append(occurrence)
+
+    def symbols(self, scope=None):
+        """按作用域、首次出现位置排序的 Symbol 列表；scope 为限定名时只返回该作用域中的符号。"""
+        result = []
+        for order, owner in enumerate(self.scopes):
+            if scope is not None and owner.qualified != scope:
+                continue
+            for name, kinds in owner.bindings.items():
+                bindings, references = self._symbols.get((owner, name), ([], []))
+                first = min([o.start for o in bindings + references] or [len(self.code)])
+                result.append((order, first, Symbol(owner.qualified, name, frozenset(kinds), bindings, references)))
+        return [symbol for _, _, symbol in sorted(result, key=lambda item: item[:2])]
+
+    def symbol(self, scope, name):
+        """查找限定作用域名 scope 中名为 name 的符号，不存在时返回 None。"""
+        owner = self.scope_by_name.get(scope)
+        if owner is None or name not in owner.bindings:
+            return None
+        bindings, references = self._symbols.get((owner, name), ([], []))
+        return Symbol(scope, name, frozenset(owner.bindings[name]), bindings, references)
+
+    def usage_count(self, scope, name):
+        """符号被读取的次数（不含赋值和 global / nonlocal 声明）。"""
+        symbol = self.symbol(scope, name)
+        return len(symbol.references) if symbol else 0
+
+    def scope_at(self, line):
+        """包含第 line 行的最内层作用域。"""
+        scope = self.module
+        while True:
+            inner = [child for child in scope.children if child.start_line <= line <= child.end_line]
+            if not inner:
+                return scope
+            scope = inner[0]
+
+    def external_references(self, start_line, end_line):
+        """
+        第 start_line-end_line 行读取、但在这段代码之外定义的模块级名字（导入的名字除外），
+        返回 [(名字, 定义所在行)]，按在片段中首次使用的顺序排列。大文件分块分析时用来告诉模型片段依赖了哪些外部定义。
+        """
+        inside = lambda occurrence: start_line <= occurrence.line <= end_line
+        result = {}
+        for occurrence in self.occurrences:
+            if occurrence.role != 'use' or occurrence.target is not self.module or not inside(occurrence):
+                continue
+            name = occurrence.name
+            if name in result or self.module.bindings.get(name) == {'import'}:
+                continue
+            bindings = self._symbols[(self.module, name)][0]
+            if bindings and not any(inside(binding) for binding in bindings):
+                result[name] = bindings[0].line
+        return list(result.items())
+
+    def unresolved_names(self):
+        """读取了但在本模块中找不到绑定的名字（内置函数或未定义的变量）及其使用次数。"""
+        counts = {}
+        for occurrence in self.occurrences:
+            if occurrence.role == 'use' and occurrence.target is None:
+                counts[occurrence.name] = counts.get(occurrence.name, 0) + 1
+        return counts
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_symbol_index(code, tree=None):
+    """
+    返回代码的 SymbolIndex，按内容哈希在进程内缓存（LRU，最多 SYMBOL_CACHE_SIZE 份）。
+    代码无法解析时抛出 SyntaxError。
+    """
+    key = job_manifest.content_hash(code)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+    index = SymbolIndex(code, tree)
+    with _cache_lock:
+        _cache[key] = index
+        while len(_cache) > SYMBOL_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python symbol_index.py 001.py                   # 列出所有作用域中的符号及使用次数
+    #     python symbol_index.py 001.py --scope main      # 只看某个作用域
+    parser = argparse.ArgumentParser(description="列出 Python 脚本的作用域、符号及其使用次数")
+    parser.add_argument('script')
+    parser.add_argument('--scope', help="只显示该限定作用域名中的符号，例如 main 或 Model.fit")
+    args = parser.parse_args()
+
+    try:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            source = f.read()
+        symbol_index = get_symbol_index(source)
+    except (OSError, UnicodeDecodeError, SyntaxError) as e:
+        print(f"无法分析 '{args.script}': {e}")
+        sys.exit(1)
+    if args.scope and args.scope not in symbol_index.scope_by_name:
+        print(f"作用域 '{args.scope}' 不存在，可选: {', '.join(symbol_index.scope_by_name)}")
+        sys.exit(1)
+
+    current = None
+    for item in symbol_index.symbols(args.scope):
+        if item.scope != current:
+            current = item.scope
+            print(f"\n[{current}]")
+        lines = sorted({o.line for o in item.bindings})
+        print(f"  {item.name:<24} {'/'.join(sorted(item.kinds)):<18} 绑定于第 {', '.join(map(str, lines)) or '?'} 行，"
+              f"使用 {len(item.references)} 次")
+    unresolved = symbol_index.unresolved_names()
+    if unresolved:
+        print(f"\n[内置或未定义] {', '.join(f'{name}×{count}' for name, count in sorted(unresolved.items()))}")
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# --- 配置区 ---
+# SCIAGENT_TELEMETRY=0 可关闭遥测；日志与 Prometheus textfile 的位置可通过环境变量修改
+TELEMETRY_ENABLED = os.getenv("SCIAGENT_TELEMETRY", "1") not in ("", "0")
+TELEMETRY_DIR = os.getenv("SCIAGENT_TELEMETRY_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sciagent"))
+TELEMETRY_LOG = os.getenv("SCIAGENT_TELEMETRY_LOG", os.path.join(TELEMETRY_DIR, "llm_calls.jsonl"))
+PROMETHEUS_FILE = os.getenv("SCIAGENT_PROM_FILE", os.path.join(TELEMETRY_DIR, "sciagent_llm.prom"))
+
+# 价格表（美元 / 百万 tokens），按 DeepSeek 官方价目填写，调价时更新此处即可
+PRICING = {
+    'deepseek-chat': {'cache_hit': 0.028, 'cache_miss': 0.28, 'output': 0.42},
+    'deepseek-reasoner': {'cache_hit': 0.028, 'cache_miss': 0.28, 'output': 0.42},
+}
+
+# 推断调用方函数名时需要跳过的封装层
+_WRAPPER_FUNCTIONS = {'call_deepseek_api', 'stream_deepseek_api', 'acall_deepseek_api', '_call_llm', '_stream_llm'}
+_WRAPPER_FILES = {'llm_client.py', 'telemetry.py'}
+# lambda、推导式以及线程池的调度函数不是业务函数，推断时同样跳过
+_ANONYMOUS_FUNCTIONS = {'<lambda>', '<listcomp>', '<dictcomp>', '<setcomp>', '<genexpr>'}
+_EXECUTOR_FILES = {'thread.py', 'threading.py'}
+
+_lock = threading.Lock()
+_aggregates = {}
+
+
+def infer_task(depth=2):
+    """
+    沿调用栈向上找到第一个业务函数名（如 generate_math_markdown），跳过各层 API 封装、lambda 与推导式。
+    在线程池中执行的调用看不到提交任务的函数，找不到时返回 'unknown'；这类调用方应显式传入 task。
+    """
+    frame = sys._getframe(depth)
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        if filename in _EXECUTOR_FILES:
+            break
+        if (code.co_name not in _WRAPPER_FUNCTIONS and code.co_name not in _ANONYMOUS_FUNCTIONS
+                and filename not in _WRAPPER_FILES):
+            return code.co_name
+        frame = frame.f_back
+    return 'unknown'
+
+
+def estimate_cost(model, usage):
+    """根据 usage 估算本次调用费用（美元）。缓存命中的 prompt tokens 按命中价计费。"""
+    if not usage:
+        return 0.0
+    price = PRICING.get(model, PRICING['deepseek-chat'])
+    hit = usage.get('prompt_cache_hit_tokens', 0) or 0
+    miss = usage.get('prompt_cache_miss_tokens')
+    if miss is None:
+        miss = max(0, (usage.get('prompt_tokens', 0) or 0) - hit)
+    output = usage.get('completion_tokens', 0) or 0
+    return (hit * price['cache_hit'] + miss * price['cache_miss'] + output * price['output']) / 1_000_000
+
+
+def record_call(agent, task, model, elapsed, usage=None, status='ok', cached=False, ttft=None):
+    """
+    记录一次 LLM 调用：追加一行 JSONL 日志，并刷新 Prometheus textfile。
+    status 取值 'ok' / 'error'；cached 表示命中了本地响应缓存（没有真正发出请求）。
+    """
+    if not TELEMETRY_ENABLED:
+        return None
+    usage = usage or {}
+    record = {
+        'ts': time.time(),
+        'agent': agent or 'unknown',
+        'function': task or 'unknown',
+        'model': model,
+        'status': status,
+        'local_cache_hit': cached,
+        'wall_time': round(elapsed, 4),
+        'ttft': round(ttft, 4) if ttft is not None else None,
+        'prompt_tokens': usage.get('prompt_tokens', 0) or 0,
+        'completion_tokens': usage.get('completion_tokens', 0) or 0,
+        'cache_hit_tokens': usage.get('prompt_cache_hit_tokens', 0) or 0,
+        'cost_usd': round(estimate_cost(model, usage), 8),
+    }
+    with _lock:
+        _update_aggregates(record)
+        try:
+            os.makedirs(os.path.dirname(TELEMETRY_LOG) or '.', exist_ok=True)
+            with open(TELEMETRY_LOG, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            _write_prometheus()
+        except OSError as e:
+            print(f"写入遥测数据失败: {e}")
+    return record
+
+
+def _update_aggregates(record):
+    key = (record['agent'], record['function'])
+    stats = _aggregates.setdefault(key, {
+        'requests': {}, 'seconds': 0.0, 'count': 0, 'prompt': 0, 'completion': 0, 'cache_hit': 0, 'cost': 0.0,
+    })
+    status = 'cached' if record['local_cache_hit'] else record['status']
+    stats['requests'][status] = stats['requests'].get(status, 0) + 1
+    stats['seconds'] += record['wall_time']
+    stats['count'] += 1
+    stats['prompt'] += record['prompt_tokens']
+    stats['completion'] += record['completion_tokens']
+    stats['cache_hit'] += record['cache_hit_tokens']
+    stats['cost'] += record['cost_usd']
+
+
+def _labels(agent, function, **extra):
+    items = [('agent', agent), ('function', function)] + sorted(extra.items())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+def _write_prometheus():
+    """以 Prometheus textfile 格式写出当前进程的累计指标（先写临时文件再原子替换）。"""
+    lines = [
+        '# HELP sciagent_llm_requests_total LLM calls by agent, function and status.',
+        '# TYPE sciagent_llm_requests_total counter',
+    ]
+    for (agent, function), stats in sorted(_aggregates.items()):
+        for status, count in sorted(stats['requests'].items()):
+            lines.append(f"sciagent_llm_requests_total{_labels(agent, function, status=status)} {count}")
+    lines += [
+        '# HELP sciagent_llm_request_seconds Wall time of LLM calls.',
+        '# TYPE sciagent_llm_request_seconds summary',
+    ]
+    for (agent, function), stats in sorted(_aggregates.items()):
+        lines.append(f"sciagent_llm_request_seconds_sum{_labels(agent, function)} {stats['seconds']:.6f}")
+        lines.append(f"sciagent_llm_request_seconds_count{_labels(agent, function)} {stats['count']}")
+    lines += [
+        '# HELP sciagent_llm_tokens_total Tokens consumed by LLM calls.',
+        '# TYPE sciagent_llm_tokens_total counter',
+    ]
+    for (agent, function), stats in sorted(_aggregates.items()):
+        for token_type in ('prompt', 'completion', 'cache_hit'):
+            lines.append(f"sciagent_llm_tokens_total{_labels(agent, function, type=token_type)} {stats[token_type]}")
+    lines += [
+        '# HELP sciagent_llm_cost_usd_total Estimated cost of LLM calls in USD.',
+        '# TYPE sciagent_llm_cost_usd_total counter',
+    ]
+    for (agent, function), stats in sorted(_aggregates.items()):
+        lines.append(f"sciagent_llm_cost_usd_total{_labels(agent, function)} {stats['cost']:.8f}")
+
+    os.makedirs(os.path.dirname(PROMETHEUS_FILE) or '.', exist_ok=True)
+    tmp_path = f"{PROMETHEUS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, PROMETHEUS_FILE)
+
+
+def summary():
+    """返回当前进程内按 (agent, function) 汇总的统计，便于在任务结束时打印。"""
+    with _lock:
+        return {f"{agent}.{function}": dict(stats) for (agent, function), stats in _aggregates.items()}
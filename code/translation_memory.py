@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import llm_client
+
+# --- 配置区 ---
+# 翻译记忆库位置与术语表版本均可通过环境变量调整；术语表更新后提高版本号，旧译文不再命中
+MEMORY_PATH = os.getenv(
+    "SCIAGENT_TM_PATH",
+    os.path.join(os.getenv("DEEPSEEK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sciagent")),
+                 "translation_memory.sqlite3"),
+)
+GLOSSARY_VERSION = os.getenv("SCIAGENT_GLOSSARY_VERSION", "1")
+# 设置 SCIAGENT_TM_BYPASS=1 可跳过翻译记忆（既不读也不写）
+MEMORY_BYPASS = os.getenv("SCIAGENT_TM_BYPASS", "") not in ("", "0")
+
+# 单条 SQL 中 IN (...) 的参数个数上限，低于 SQLite 默认的 999
+_LOOKUP_BATCH = 500
+
+
+class TranslationMemory:
+    """
+    基于 SQLite 的翻译记忆库：英文原文 → 中文译文，按 (原文, 模型, 术语表版本) 区分。
+    - 表使用 WITHOUT ROWID 并以原文为主键的前缀，数万条记录下查找只需一次 B 树检索；
+    - lookup 一次批量查询多条原文，store 在一个事务里写入多条译文；
+    - export_jsonl / import_jsonl 以 JSON Lines 交换，便于团队共享同一份记忆库。
+    """
+
+    def __init__(self, path=None, model=None, glossary_version=GLOSSARY_VERSION):
+        path = path or MEMORY_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._model = model
+        self.glossary_version = glossary_version
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " source TEXT NOT NULL, model TEXT NOT NULL, glossary_version TEXT NOT NULL,"
+            " target TEXT NOT NULL, updated REAL NOT NULL,"
+            " PRIMARY KEY (source, model, glossary_version)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    @property
+    def model(self):
+        """条目所属的模型；未指定时在每次使用时读取 llm_client.DEEPSEEK_MODEL，与实际产生译文的模型保持一致。"""
+        return self._model or llm_client.DEEPSEEK_MODEL
+
+    def lookup(self, sources):
+        """批量查询，返回 {原文: 译文}，只包含命中的条目。"""
+        sources = list(dict.fromkeys(sources))
+        found = {}
+        with self._lock:
+            for i in range(0, len(sources), _LOOKUP_BATCH):
+                batch = sources[i:i + _LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT source, target FROM translations WHERE model = ? AND glossary_version = ?"
+                    f" AND source IN ({placeholders})",
+                    [self.model, self.glossary_version, *batch],
+                ).fetchall()
+                found.update(rows)
+            self.hits += len(found)
+            self.misses += len(sources) - len(found)
+        return found
+
+    def store(self, translations):
+        """写回一批新译文（{原文: 译文}），空译文和非字符串的值会被忽略。"""
+        now = time.time()
+        rows = [(source, self.model, self.glossary_version, target, now)
+                for source, target in translations.items()
+                if isinstance(target, str) and target.strip()]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (source, model, glossary_version, target, updated)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self.writes += len(rows)
+        return len(rows)
+
+    def export_jsonl(self, path, all_versions=False):
+        """
+        导出为 JSON Lines，每行一条 {source, target, model, glossary_version, updated}。
+        默认只导出当前模型与术语表版本的条目，all_versions=True 时导出全部。返回导出条数。
+        """
+        query = "SELECT source, target, model, glossary_version, updated FROM translations"
+        params = []
+        if not all_versions:
+            query += " WHERE model = ? AND glossary_version = ?"
+            params = [self.model, self.glossary_version]
+        count = 0
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY source", params).fetchall()
+        with open(path, 'w', encoding='utf-8') as f:
+            for source, target, model, glossary_version, updated in rows:
+                f.write(json.dumps({
+                    'source': source, 'target': target, 'model': model,
+                    'glossary_version': glossary_version, 'updated': updated,
+                }, ensure_ascii=False) + '\n')
+                count += 1
+        return count
+
+    def import_jsonl(self, path):
+        """
+        从 JSON Lines 导入条目，缺少 model / glossary_version 的行按当前设置处理。
+        同一条目以 updated 较新的一方为准。返回实际写入条数。
+        """
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    rows.append((entry['source'], entry.get('model', self.model),
+                                 str(entry.get('glossary_version', self.glossary_version)),
+                                 entry['target'], float(entry.get('updated', time.time()))))
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                    print(f"跳过第 {line_no} 行无效的记录: {e}")
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT INTO translations (source, model, glossary_version, target, updated)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (source, model, glossary_version) DO UPDATE"
+                " SET target = excluded.target, updated = excluded.updated"
+                " WHERE excluded.updated > translations.updated",
+                rows,
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def stats(self):
+        """返回命中统计与记忆库规模。"""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            current = self._conn.execute(
+                "SELECT COUNT(*) FROM translations WHERE model = ? AND glossary_version = ?",
+                (self.model, self.glossary_version),
+            ).fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'entries': current,
+            'entries_all_versions': total,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+_default_memory = None
+_default_lock = threading.Lock()
+
+
+def get_default_memory():
+    """返回进程内共享的翻译记忆库；SCIAGENT_TM_BYPASS=1 时返回 None。"""
+    global _default_memory
+    if MEMORY_BYPASS:
+        return None
+    if _default_memory is None:
+        with _default_lock:
+            if _default_memory is None:
+                _default_memory = TranslationMemory()
+    return _default_memory
+
+
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python translation_memory.py export team_tm.jsonl [--all]
+    #     python translation_memory.py import team_tm.jsonl
+    #     python translation_memory.py stats
+    parser = argparse.ArgumentParser(description="管理翻译记忆库（导入 / 导出 / 统计）")
+    parser.add_argument('action', choices=['export', 'import', 'stats'])
+    parser.add_argument('file', nargs='?', help="导入或导出的 JSON Lines 文件")
+    parser.add_argument('--db', default=None, help="记忆库路径，默认为 SCIAGENT_TM_PATH")
+    parser.add_argument('--all', action='store_true', help="导出所有模型与术语表版本的条目")
+    args = parser.parse_args()
+
+    memory = TranslationMemory(args.db)
+    if args.action == 'stats':
+        print(json.dumps(memory.stats(), ensure_ascii=False, indent=2))
+    elif not args.file:
+        parser.error("export / import 需要指定文件路径")
+    elif args.action == 'export':
+        print(f"已导出 {memory.export_jsonl(args.file, all_versions=args.all)} 条翻译到 {args.file}")
+    else:
+        if not os.path.exists(args.file):
+            print(f"错误：文件 '{args.file}' 不存在。")
+            sys.exit(1)
+        print(f"已从 {args.file} 导入 {memory.import_jsonl(args.file)} 条翻译")
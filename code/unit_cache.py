@@ -0,0 +1,224 @@
+import io
+import os
+import ast
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import textwrap
+import threading
+import tokenize
+from collections import namedtuple
+from llm_client import run_concurrently
+from code_chunker import split_units, describe_dependencies
+from symbol_index import get_symbol_index
+
+# --- 配置区 ---
+# 逐单元分析结果的缓存位置与保留时间均可通过环境变量调整；超过保留时间未被使用的条目在打开时清理
+UNIT_CACHE_PATH = os.getenv(
+    "SCIAGENT_UNIT_CACHE",
+    os.path.join(os.getenv("DEEPSEEK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sciagent")),
+                 "unit_analysis.sqlite3"),
+)
+UNIT_CACHE_MAX_AGE = float(os.getenv("SCIAGENT_UNIT_CACHE_MAX_AGE", str(90 * 24 * 3600)))  # 秒
+# 设置 SCIAGENT_UNIT_CACHE_BYPASS=1 可跳过逐单元缓存（既不读也不写）
+UNIT_CACHE_BYPASS = os.getenv("SCIAGENT_UNIT_CACHE_BYPASS", "") not in ("", "0")
+
+# 单条 SQL 中 IN (...) 的参数个数上限，低于 SQLite 默认的 999
+_LOOKUP_BATCH = 500
+_KIND_LABELS = {'function': '函数', 'class': '类', 'module': '模块级代码'}
+
+# 一个单元的分析结果：CodeUnit、分析内容、是否来自缓存
+UnitNote = namedtuple('UnitNote', ['unit', 'note', 'cached'])
+
+
+def unit_fingerprint(source):
+    """
+    单元源码的规范化 AST 哈希：空白、换行、注释以及括号内的排版都不影响结果，
+    只有代码结构或字面量（包括文档字符串）变化才会改变哈希。
+    超大单元按行切开的片段无法单独解析，退回到去掉注释和空白后的 token 序列。
+    """
+    try:
+        material = ast.dump(ast.parse(textwrap.dedent(source)), annotate_fields=False, include_attributes=False)
+    except SyntaxError:
+        try:
+            tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+            material = ' '.join(token.string for token in tokens if token.type not in (
+                tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT))
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            material = '\n'.join(line.strip() for line in source.splitlines()
+                                 if line.strip() and not line.strip().startswith('#'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def unit_key(agent, context, fingerprint):
+    """缓存键：Agent、影响输出的上下文（模型、版本、提示词、分析要求等）与单元指纹（可为列表）共同决定。"""
+    material = json.dumps([agent, context, fingerprint], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class UnitCache:
+    """
+    基于 SQLite 的逐单元分析缓存：缓存键 → 分析内容。
+    lookup 命中时刷新使用时间，打开数据库时清理超过 max_age 未使用的条目。
+    """
+
+    def __init__(self, path=None, max_age=UNIT_CACHE_MAX_AGE):
+        path = path or UNIT_CACHE_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS unit_notes ("
+            " key TEXT PRIMARY KEY, agent TEXT NOT NULL, note TEXT NOT NULL, last_used REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("DELETE FROM unit_notes WHERE last_used < ?", (time.time() - max_age,))
+        self._conn.commit()
+
+    def lookup(self, keys):
+        """批量查询，返回 {缓存键: 分析内容}，只包含命中的条目。"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, note FROM unit_notes WHERE key IN ({placeholders})", batch).fetchall())
+            if found:
+                self._conn.executemany("UPDATE unit_notes SET last_used = ? WHERE key = ?",
+                                       [(time.time(), key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, agent, notes):
+        """写回一批分析结果（{缓存键: 分析内容}），空内容会被忽略。"""
+        now = time.time()
+        rows = [(key, agent, note, now) for key, note in notes.items() if isinstance(note, str) and note.strip()]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO unit_notes (key, agent, note, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self.writes += len(rows)
+        return len(rows)
+
+    def stats(self):
+        """返回命中统计与各 Agent 的条目数。"""
+        with self._lock:
+            per_agent = dict(self._conn.execute("SELECT agent, COUNT(*) FROM unit_notes GROUP BY agent").fetchall())
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'entries': per_agent,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_unit_cache():
+    """返回进程内共享的逐单元缓存；SCIAGENT_UNIT_CACHE_BYPASS=1 时返回 None。"""
+    global _default_cache
+    if UNIT_CACHE_BYPASS:
+        return None
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = UnitCache()
+    return _default_cache
+
+
+def analyze_units(code_content, agent, context, analyze_unit):
+    """
+    把模块拆成顶层函数、类和模块级代码单元，逐个分析并按规范化 AST 哈希缓存结果：
+    未改动的单元直接复用缓存，只有新增或改动的单元调用 analyze_unit(unit, dependencies) 并发请求模型，
+    dependencies 为该单元用到的、定义在别处的模块级名字。
+    context 为影响分析结果的其它因素（模型、Agent 版本、提示词、分析要求等），任何一项变化都不会命中旧结果。
+    缓存键还包含这些外部定义所在单元的指纹：单元本身没改、但它依赖的常量或函数改了时同样会重新分析。
+    返回按源码顺序排列的 UnitNote 列表；有单元分析失败时返回 None（成功的单元仍会写入缓存）。
+    """
+    index = get_symbol_index(code_content)
+    units = split_units(code_content, tree=index.tree)
+    fingerprints = [unit_fingerprint(unit.source) for unit in units]
+
+    def defining_fingerprint(line):
+        for unit, fingerprint in zip(units, fingerprints):
+            if unit.start_line <= line <= unit.end_line:
+                return fingerprint
+        return None
+
+    keys = []
+    for unit, fingerprint in zip(units, fingerprints):
+        # 只用名字和定义所在单元的指纹，不用行号：上方插入空行或注释不会让缓存失效
+        dependencies = sorted((name, defining_fingerprint(line))
+                              for name, line in index.external_references(unit.start_line, unit.end_line))
+        keys.append(unit_key(agent, context, [fingerprint, dependencies]))
+    cache = get_default_unit_cache()
+    notes = cache.lookup(keys) if cache is not None else {}
+
+    pending = {}
+    for unit, key in zip(units, keys):
+        if key not in notes:
+            pending.setdefault(key, unit)
+    print(f"代码共 {len(units)} 个函数/类单元，{len(units) - len(pending)} 个未改动、直接复用已有分析，"
+          f"{len(pending)} 个需要请求模型...")
+    if pending:
+        items = list(pending.items())
+        results = run_concurrently(
+            lambda item: analyze_unit(item[1], describe_dependencies(item[1], index)), items)
+        fresh = {key: note for (key, _), note in zip(items, results) if note}
+        if cache is not None:
+            cache.store(agent, fresh)
+        failed = [unit.name for key, unit in items if key not in fresh]
+        if failed:
+            print(f"单元 {', '.join(failed)} 分析失败。")
+            return None
+        notes.update(fresh)
+    cached = set(notes) - set(pending)
+    return [UnitNote(unit, notes[key], key in cached) for unit, key in zip(units, keys)]
+
+
+def cached_note(agent, context, material, produce):
+    """
+    不按单元拆分的单条分析（例如公式部分）的缓存：键由 Agent、context 与素材 material（如本地提取的公式）的哈希决定，
+    命中时直接返回缓存内容，否则调用 produce() 请求模型并写回缓存。
+    """
+    key = unit_key(agent, context, hashlib.sha256(material.encode('utf-8')).hexdigest())
+    cache = get_default_unit_cache()
+    if cache is not None:
+        found = cache.lookup([key])
+        if key in found:
+            print("素材未变化，直接复用已有分析。")
+            return found[key]
+    note = produce()
+    if cache is not None and note:
+        cache.store(agent, {key: note})
+    return note
+
+
+def unit_heading(unit):
+    """拼接报告时每个单元的小标题，例如 “`solve`（函数，第 40-85 行）”。"""
+    return f"`{unit.name}`（{_KIND_LABELS.get(unit.kind, unit.kind)}，第 {unit.start_line}-{unit.end_line} 行）"
+
+
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python unit_cache.py stats
+    parser = argparse.ArgumentParser(description="查看逐单元分析缓存")
+    parser.add_argument('action', choices=['stats'])
+    parser.add_argument('--db', default=None, help="缓存路径，默认为 SCIAGENT_UNIT_CACHE")
+    args = parser.parse_args()
+    print(json.dumps(UnitCache(args.db).stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,189 @@
+import re
+import ast
+import keyword
+from collections import namedtuple
+from source_rewriter import node_offsets, apply_edits
+from symbol_index import MODULE_SCOPE, resolve, get_symbol_index
+
+# 命名规范文档中的一条具体规则，例如 “- 高斯函数中的标准差: sigma” -> NamingRule('特定数学变量', '高斯函数中的标准差', 'sigma')
+NamingRule = namedtuple('NamingRule', ['section', 'meaning', 'name'])
+# 可以交给模型重命名的变量：作用域名、变量名、类型（'variable' / 'parameter'）、首次绑定所在的源码行
+RenameCandidate = namedtuple('RenameCandidate', ['scope', 'name', 'kind', 'line'])
+
+_RULE_PATTERN = re.compile(r'^\s*[-*+]\s*(.+?)\s*[:：]\s*`?([A-Za-z_][A-Za-z0-9_]*)`?\s*$')
+_HEADING_PATTERN = re.compile(r'^\s*#+\s*(.+?)\s*$')
+
+
+def parse_naming_rules(standards_content):
+    """
+    解析命名规范文档：形如 “- 含义: 名字” 的列表项解析为 NamingRule，
+    其余列表项（如 “所有变量使用 snake_case”）作为通用规则原样返回。返回 (rules, general_rules)。
+    """
+    rules, general_rules = [], []
+    section = ''
+    for line in standards_content.splitlines():
+        heading = _HEADING_PATTERN.match(line)
+        if heading:
+            section = heading.group(1)
+            continue
+        match = _RULE_PATTERN.match(line)
+        if match:
+            rules.append(NamingRule(section, match.group(1), match.group(2)))
+        elif line.strip().startswith(('-', '*', '+')):
+            general_rules.append(line.strip().lstrip('-*+ ').strip())
+    return rules, general_rules
+
+
+def _is_candidate(scope, name, kinds):
+    """
+    只提供普通变量和函数参数：导入名、函数名、类名、类属性、方法参数（可能被子类或外部按关键字调用）、
+    推导式与 lambda 内的临时变量以及双下划线名字都不参与重命名。
+    """
+    if name.startswith('__') or not kinds <= {'variable', 'parameter'}:
+        return False
+    if scope.kind == 'module':
+        return 'parameter' not in kinds
+    if scope.kind != 'function' or scope.name == '<lambda>':
+        return False
+    return not ('parameter' in kinds and scope.parent.kind == 'class')
+
+
+def collect_rename_candidates(code, index=None):
+    """列出代码中可以重命名的变量，按作用域分组：{作用域名: [RenameCandidate, ...]}。index 为该代码的 SymbolIndex。"""
+    if index is None:
+        index = get_symbol_index(code)
+    first_positions = {}
+    for occurrence in index.occurrences:
+        if occurrence.role == 'bind' and occurrence.target is not None:
+            first_positions.setdefault((occurrence.target, occurrence.name), occurrence.start)
+
+    candidates = {}
+    for scope in index.scopes:
+        for name, kinds in scope.bindings.items():
+            if not _is_candidate(scope, name, kinds):
+                continue
+            position = first_positions.get((scope, name), 0)
+            line_start = code.rfind('\n', 0, position) + 1
+            line_end = code.find('\n', position)
+            line = code[line_start:line_end if line_end != -1 else len(code)].strip()
+            kind = 'parameter' if 'parameter' in kinds else 'variable'
+            candidates.setdefault(scope.qualified, []).append(RenameCandidate(scope.qualified, name, kind, line))
+    for scope_name in candidates:
+        candidates[scope_name].sort(key=lambda candidate: (candidate.kind != 'parameter', candidate.name))
+    return candidates
+
+
+def _normalize_mapping(mapping, index, candidates):
+    """
+    把模型返回的映射整理为 {(作用域, 旧名): 新名}。支持两种写法：
+    {"作用域": {"旧名": "新名"}}，以及省略作用域的 {"旧名": "新名"}（应用到所有绑定了该名字的作用域）。
+    """
+    renames, rejected = {}, []
+    for key, value in mapping.items():
+        if isinstance(value, dict):
+            scope = index.scope_by_name.get(key)
+            if scope is None:
+                rejected.extend((key, old, new, "作用域不存在") for old, new in value.items())
+                continue
+            entries = [(scope, old, new) for old, new in value.items()]
+        else:
+            entries = [(scope, key, value) for scope, name in candidates if name == key]
+            if not entries:
+                rejected.append((MODULE_SCOPE, key, value, "代码中没有可重命名的同名变量"))
+        for scope, old, new in entries:
+            if not isinstance(new, str) or new == old:
+                continue
+            if (scope, old) not in candidates:
+                rejected.append((scope.qualified, old, new, "不是该作用域中可重命名的变量"))
+            elif not new.isidentifier() or keyword.iskeyword(new) or new.startswith('__'):
+                rejected.append((scope.qualified, old, new, "不是合法的变量名"))
+            else:
+                renames[(scope, old)] = new
+    return renames, rejected
+
+
+def _find_conflicts(index, renames):
+    """
+    模拟重命名后的作用域，找出会改变名字解析结果的重命名：同一作用域内重名、
+    遮蔽内置或外层名字、被内层作用域的同名变量截获等。返回冲突的 (作用域, 旧名) 及原因。
+    """
+    module = index.module
+
+    def after_view(scope):
+        bound = {renames.get((scope, name), name) for name in scope.bindings}
+        globals_ = {renames.get((module, name), name) for name in scope.globals}
+        nonlocals = set()
+        for name in scope.nonlocals:
+            target = resolve(scope.parent, name, module=module) if scope.parent else None
+            nonlocals.add(renames.get((target, name), name))
+        return bound, globals_, nonlocals
+
+    conflicts = {}
+    # 同一作用域内两个变量改成同一个名字，或改成已有的名字
+    seen = {}
+    for scope_key, new in renames.items():
+        scope, old = scope_key
+        clash = seen.get((scope, new))
+        if clash is not None or (new in scope.bindings and (scope, new) not in renames):
+            conflicts[scope_key] = f"新名字 {new} 与该作用域中的其他名字重复"
+        seen[(scope, new)] = scope_key
+
+    for occurrence in index.occurrences:
+        before = occurrence.target
+        new_name = renames.get((before, occurrence.name), occurrence.name) if before is not None else occurrence.name
+        after = resolve(occurrence.scope, new_name, after_view, module)
+        if after is before:
+            continue
+        if before is not None and (before, occurrence.name) in renames:
+            conflicts.setdefault((before, occurrence.name), f"第 {occurrence.line} 行的 {new_name} 会解析到别的变量")
+        for key, value in renames.items():
+            if key[0] is after and value == new_name:
+                conflicts.setdefault(key, f"会遮蔽其他位置引用的 {new_name}")
+    return conflicts
+
+
+def rename_variables(code, mapping, index=None):
+    """
+    按映射在本地完成作用域感知的重命名，返回 (新代码, 已应用列表, 被拒绝列表)。
+    已应用列表的每项为 (作用域, 旧名, 新名)，被拒绝列表的每项为 (作用域, 旧名, 新名, 原因)。
+    只替换解析到目标绑定的名字：字符串、注释、属性访问（obj.x）、导入语句以及其它作用域中的同名变量都不受影响；
+    函数参数改名时同步修改本文件中对该函数按关键字传参的调用。
+    任何一处会导致名字解析结果变化的重命名都会被拒绝，而不是冒险修改。
+    """
+    if index is None:
+        index = get_symbol_index(code)
+    candidates = {(scope, name) for scope in index.scopes
+                  for name, kinds in scope.bindings.items() if _is_candidate(scope, name, kinds)}
+    renames, rejected = _normalize_mapping(mapping, index, candidates)
+
+    while True:
+        conflicts = _find_conflicts(index, renames)
+        if not conflicts:
+            break
+        for key, reason in conflicts.items():
+            new = renames.pop(key, None)
+            if new is not None:
+                rejected.append((key[0].qualified, key[1], new, reason))
+
+    edits = []
+    for occurrence in index.occurrences:
+        new = renames.get((occurrence.target, occurrence.name)) if occurrence.target is not None else None
+        if new is not None:
+            edits.append((occurrence.start, occurrence.end, new, occurrence.name))
+    for scope, call in index.calls:
+        if not isinstance(call.func, ast.Name):
+            continue
+        owner = resolve(scope, call.func.id, module=index.module)
+        functions = [f for f in index.scopes if f.kind == 'function' and f.parent is owner and f.name == call.func.id]
+        if len(functions) != 1:
+            continue
+        for keyword_arg in call.keywords:
+            new = renames.get((functions[0], keyword_arg.arg)) if keyword_arg.arg else None
+            if new is not None:
+                start = node_offsets(keyword_arg, index.lines, index.offsets)[0]
+                edits.append((start, start + len(keyword_arg.arg), new, keyword_arg.arg))
+
+    # 位置与原名字不符的编辑（理论上不会出现）直接丢弃，保证不会改坏代码
+    edits = [(start, end, new) for start, end, new, old in edits if code[start:end] == old]
+    applied = sorted((scope.qualified, old, new) for (scope, old), new in renames.items())
+    return apply_edits(code, edits), applied, rejected
@@ -0,0 +1,290 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import argparse
+import llm_client
+import zh_translator_agent_v2
+import code_analyst_agent
+import code_explainer_agent
+from llm_client import run_concurrently
+
+# --- 配置区 ---
+# 保存后等待多久没有新的改动才开始处理（秒），编辑器连续写入、格式化工具二次保存会合并为一次
+WATCH_DEBOUNCE = float(os.getenv("SCIAGENT_WATCH_DEBOUNCE", "0.8"))
+# 无法使用 inotify（非 Linux、inotify 句柄耗尽等）时退回轮询，轮询间隔（秒）
+WATCH_POLL_INTERVAL = float(os.getenv("SCIAGENT_WATCH_POLL_INTERVAL", "1.0"))
+# 设置 SCIAGENT_WATCH_POLL=1 强制使用轮询，例如监视网络文件系统上的目录
+FORCE_POLLING = os.getenv("SCIAGENT_WATCH_POLL", "") not in ("", "0")
+
+# inotify 事件掩码，见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# 只关心“写完”和“换名到位”：编辑器原地保存触发 CLOSE_WRITE，先写临时文件再改名的保存方式触发 MOVED_TO
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _skip_dir(name):
+    return name.startswith('.') or name == '__pycache__'
+
+
+def is_watched_source(path):
+    """
+    需要响应的源文件：.py 脚本，且不是本工具生成的输出（_zh_revision.py、_redefined.py）、
+    不是隐藏文件。生成的 .md 报告和处理清单不是 .py 文件，自然被排除；
+    隐藏目录和 __pycache__ 在加入监视时就已跳过。
+    """
+    name = os.path.basename(path)
+    if not name.endswith('.py') or name.endswith(zh_translator_agent_v2.GENERATED_SUFFIXES):
+        return False
+    return not name.startswith('.')
+
+
+class PollingWatcher:
+    """轮询实现：定期比较各源文件的 (mtime_ns, size)，适用于任何平台。"""
+
+    def __init__(self, directory, interval=WATCH_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in zh_translator_agent_v2.find_python_files(self.directory):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒，返回这段时间内新增或内容有变化的源文件集合。"""
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {path for path, state in current.items() if self._snapshot.get(path) != state}
+        self._snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    基于 Linux inotify 的实现（通过 ctypes 调用 libc，无需第三方依赖）：
+    递归监视目录树，新建的子目录自动加入监视；内核事件队列溢出时退回一次全量扫描。
+    """
+
+    def __init__(self, directory):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError(errno.ENOSYS, "当前平台不支持 inotify")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.directory = directory
+        self._dirs = {}  # watch descriptor -> 目录路径
+        self._overflowed = False
+        try:
+            self._add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return  # 目录在加入监视前已被删除
+            raise OSError(error, f"无法监视目录 '{path}'（可调大 fs.inotify.max_user_watches）")
+        self._dirs[wd] = path
+
+    def _add_tree(self, directory):
+        for root, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if not _skip_dir(d)]
+            self._add_watch(root)
+
+    def _read_events(self):
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self._overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and not _skip_dir(name):
+                        # 新目录里可能已经有文件（例如整个目录被拷贝或移动进来）
+                        self._add_tree(path)
+                        changed.update(zh_translator_agent_v2.find_python_files(path))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    changed.add(path)
+
+    def poll(self, timeout):
+        """最多等待 timeout 秒，返回这段时间内写入完成或改名到位的源文件集合。"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = {path for path in self._read_events() if is_watched_source(path) and os.path.isfile(path)}
+        if self._overflowed:
+            self._overflowed = False
+            print("inotify 事件队列溢出，重新扫描整个目录。")
+            changed.update(zh_translator_agent_v2.find_python_files(self.directory))
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(directory):
+    """优先使用 inotify，不可用时退回轮询。"""
+    if not FORCE_POLLING:
+        try:
+            return InotifyWatcher(directory)
+        except OSError as e:
+            print(f"inotify 不可用（{e}），改用轮询方式监视。")
+    return PollingWatcher(directory)
+
+
+def build_jobs(agents, beautify=False, academic_options=None, analyst_options=None, naming_standards_path=""):
+    """
+    按启用的 Agent 生成处理函数列表 [(名称, func(filepath))]。
+    每个函数内部都会查询处理清单，内容未变化的文件（例如只是被 touch）不会重新请求 API。
+    """
+    jobs = []
+    if 'translator' in agents:
+        jobs.append(('translator', lambda path: zh_translator_agent_v2.process_python_file(
+            path, beautify=beautify, academic_options=dict(academic_options) if academic_options else None)))
+    if 'analyst' in agents and analyst_options:
+        jobs.append(('analyst', lambda path: code_analyst_agent.analyze_codebase(
+            path, naming_standards_path, analyst_options)))
+    if 'explainer' in agents:
+        jobs.append(('explainer', code_explainer_agent.process_code_file))
+    return jobs
+
+
+def process_changes(paths, jobs):
+    """对一批变化的文件执行所有任务；不同文件、不同 Agent 的任务并发执行，共用同一个连接池。"""
+    work = [(name, func, path) for path in sorted(paths) for name, func in jobs]
+
+    def run(item):
+        name, func, path = item
+        try:
+            func(path)
+        except Exception as e:
+            # 单个文件处理出错不能中断监视
+            print(f"[{name}] 处理 '{path}' 时出错: {e}")
+
+    run_concurrently(run, work)
+
+
+def watch_directory(directory, jobs, debounce=WATCH_DEBOUNCE, initial_scan=True):
+    """
+    长时间运行的监视模式：文件保存后等待 debounce 秒内没有新的改动，再对变化的文件重新生成输出。
+    进程常驻，Agent 模块与 HTTP 连接池只初始化一次；initial_scan=True 时启动后先处理一遍过期的文件。
+    按 Ctrl+C 退出。
+    """
+    directory = os.path.abspath(directory)
+    watcher = create_watcher(directory)
+    llm_client.get_session()
+    print(f"=== 监视模式: 正在监视 '{directory}'（{type(watcher).__name__}），按 Ctrl+C 退出 ===")
+    try:
+        if initial_scan:
+            process_changes(zh_translator_agent_v2.find_python_files(directory), jobs)
+            print("=== 初始处理完毕，等待文件变化... ===")
+        pending = set()
+        last_change = 0.0
+        while True:
+            timeout = max(0.0, last_change + debounce - time.monotonic()) if pending else 3600
+            changed = watcher.poll(timeout)
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+                continue
+            if pending and time.monotonic() - last_change >= debounce:
+                batch = {path for path in pending if os.path.isfile(path)}
+                pending = set()
+                if batch:
+                    print(f"\n=== 检测到 {len(batch)} 个文件变化: {', '.join(os.path.relpath(p, directory) for p in sorted(batch))} ===")
+                    process_changes(batch, jobs)
+                    print("=== 处理完毕，等待文件变化... ===")
+    except KeyboardInterrupt:
+        print("\n已退出监视模式。")
+    finally:
+        watcher.close()
+        llm_client.close_session()
+
+
+# --- 主程序入口 ---
+if __name__ == '__main__':
+    # 命令行用法:
+    #     python watch_mode.py figures/ --agents translator,explainer
+    #     python watch_mode.py figures/ --agents analyst --sections 1,2
+    parser = argparse.ArgumentParser(description="监视目录，脚本保存后自动重新生成翻译与分析结果")
+    parser.add_argument('directory')
+    parser.add_argument('--agents', default='translator,analyst,explainer',
+                        help="启用的 Agent，逗号分隔: translator / analyst / explainer")
+    parser.add_argument('--beautify', action='store_true', help="翻译时启用 AI 布局美化")
+    parser.add_argument('--academic', choices=['single', 'double'], help="启用学术风格并指定单栏或双栏尺寸")
+    parser.add_argument('--vector-format', choices=['pdf', 'svg', 'eps'], help="学术风格下保存的矢量图格式")
+    parser.add_argument('--compact-vector', action='store_true',
+                        help="紧凑矢量输出：路径简化、密集图元栅格化、字体子集化")
+    parser.add_argument('--sections', default='1,2', help="代码分析 Agent 的功能选项，与交互模式相同，例如 1,2,3")
+    parser.add_argument('--naming-standards', default='', help="功能 3 使用的变量命名规范文件")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE, help="防抖时间（秒）")
+    parser.add_argument('--no-initial-scan', action='store_true', help="启动时不处理已有的文件")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"错误：目录 '{args.directory}' 不存在。")
+        sys.exit(1)
+
+    academic_options = None
+    if args.academic:
+        academic_options = {'enabled': True, 'layout': args.academic, 'vector_format': args.vector_format,
+                            'compact_vector': args.compact_vector}
+    jobs = build_jobs(
+        {agent.strip() for agent in args.agents.split(',')},
+        beautify=args.beautify or bool(academic_options),
+        academic_options=academic_options,
+        analyst_options={c.strip() for c in args.sections.split(',') if c.strip()},
+        naming_standards_path=args.naming_standards,
+    )
+    if not jobs:
+        parser.error("没有启用任何 Agent")
+    watch_directory(args.directory, jobs, debounce=args.debounce, initial_scan=not args.no_initial_scan)
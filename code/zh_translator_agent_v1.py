@@ -1,13 +1,11 @@
 import os
 import re
-import requests
 import json
 import ast # Abstract Syntax Tree, a powerful tool for parsing Python code
+from llm_client import call_deepseek_api as _call_llm
 
 # --- 配置区 ---
-# 请在这里填入你的 DeepSeek API Key
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+# API Key、URL、连接池等配置统一由 llm_client 管理
 
 # 需要翻译的绘图函数和参数，可以根据你使用的库进行扩展
 # We target both plt.title() and ax.set_title() style functions
@@ -18,40 +16,8 @@ TARGET_PLOT_FUNCTIONS = {
 
 # --- DeepSeek API 调用封装 ---
 def call_deepseek_api(prompt, is_json_mode=False):
-    """调用 DeepSeek API 的通用函数"""
-    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
-        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
-
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [{"role": "user", "content": prompt}],
-    }
-    if is_json_mode:
-        payload["response_format"] = {"type": "json_object"}
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-
-    try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=180)
-        response.raise_for_status()  # 如果请求失败则抛出异常
-        
-        result_content = response.json()['choices'][0]['message']['content']
-        
-        # 打印 API 返回的原始数据，方便调试
-        # print("--- API Response ---")
-        # print(result_content)
-        # print("--------------------")
-        
-        return result_content
-    except requests.exceptions.RequestException as e:
-        print(f"调用 DeepSeek API 时发生网络错误: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"解析 DeepSeek API 响应时出错: {e}, 响应内容: {response.text}")
-        return None
+    """调用 DeepSeek API 的通用函数（复用共享连接池）"""
+    return _call_llm(prompt, agent='translator', is_json_mode=is_json_mode)
 
 # --- 核心功能函数 ---
 
@@ -1,136 +1,195 @@
 import os
 import re
-import requests
+import sys
 import json
-import ast
+import time
+import asyncio
+from collections import deque
+import llm_client
+import job_manifest
+import translation_memory
+import render_verifier
+import cjk_fonts
+from rate_limiter import per_job_retry_budget, AdaptiveChunkSizer
+from code_chunker import estimate_tokens
+from source_rewriter import extract_text_spans, apply_spans
+from academic_styler import apply_academic_style, needs_subplot_relayout
+from code_patch import EDIT_FORMAT_INSTRUCTIONS, is_edit_reply, request_code_edits
+from symbol_index import get_symbol_index
+from llm_client import call_deepseek_api as _call_llm, stream_deepseek_api as _stream_llm, run_blocking, run_concurrently
 
 # --- 配置区 ---
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_API_URL = "https://api.deepseek.com/chat/completions"
+# API Key、URL、连接池等配置统一由 llm_client 管理
+
+# 处理逻辑或提示词变化时提高版本号，处理清单中旧版本生成的结果会被重新生成
+AGENT_VERSION = "2.1"
 
 TARGET_PLOT_FUNCTIONS = {
     'title', 'xlabel', 'ylabel', 'suptitle',
     'set_title', 'set_xlabel', 'set_ylabel', 'text', 'legend'
 }
+# 绘图函数中承载显示文本的关键字参数；loc、fontsize 等取值参数不翻译
+PLOT_TEXT_KEYWORDS = {'label', 'title', 's', 't', 'text', 'xlabel', 'ylabel'}
+
+# 翻译分块：单个 JSON 请求的输入 token 预算（初始值 / 下限 / 上限），运行中按延迟和失败情况自适应调整
+TRANSLATION_CHUNK_TOKENS = int(os.getenv("SCIAGENT_TRANSLATE_CHUNK_TOKENS", "1500"))
+TRANSLATION_CHUNK_MIN_TOKENS = 200
+TRANSLATION_CHUNK_MAX_TOKENS = 3000
+# 单个分块耗时超过该值（秒）视为过慢，下一轮缩小分块
+TRANSLATION_TARGET_LATENCY = float(os.getenv("SCIAGENT_TRANSLATE_TARGET_LATENCY", "60"))
+# 同一条文本最多尝试翻译的次数（失败的分块会拆小后重试）
+TRANSLATION_MAX_ATTEMPTS = 3
+# 本工具生成的输出文件，项目模式扫描目录时跳过
+GENERATED_SUFFIXES = ('_zh_revision.py', '_redefined.py')
+
+# --- DeepSeek API 调用封装 ---
+def call_deepseek_api(prompt, is_json_mode=False, stream_to=None, system_prompt=None, task=None,
+                      validate=None, refresh=False):
+    """
+    调用 DeepSeek API 的通用函数（复用共享连接池）。
+    传入 stream_to（可写的文件对象）时使用流式模式，边生成边写入。
+    task 为遥测中记录的业务函数名，在线程池或 lambda 中调用时需要显式传入。
+    validate、refresh 控制响应缓存（见 llm_client.call_deepseek_api）：只缓存通过检查的回复，重试时跳过旧缓存。
+    """
+    if stream_to is not None:
+        return _stream_llm(prompt, agent='translator', is_json_mode=is_json_mode, sink=stream_to,
+                           system_prompt=system_prompt, task=task, validate=validate, refresh=refresh)
+    return _call_llm(prompt, agent='translator', is_json_mode=is_json_mode, system_prompt=system_prompt, task=task,
+                     validate=validate, refresh=refresh)
+
+# --- 固定提示词 ---
+# 角色、规则等不变的部分放在 system 消息中，作为稳定的请求前缀以命中 DeepSeek 的上下文硬盘缓存；
+# 待翻译文本、代码等可变内容放在 user 消息中。
+TRANSLATE_SYSTEM_PROMPT = """
+你是一个精准的翻译引擎。请将用户给出的JSON对象中的英文文本翻译成简洁、专业、地道的中文。
+请确保JSON的key保持不变，只翻译value中的字符串。
+请以JSON格式返回结果，不要添加任何额外的解释或说明。
+"""
 
-# --- DeepSeek API 调用封装 (无变动) ---
-def call_deepseek_api(prompt, is_json_mode=False):
-    """调用 DeepSeek API 的通用函数"""
-    if not DEEPSEEK_API_KEY or "xxxxxxxx" in DEEPSEEK_API_KEY:
-        raise ValueError("请在 DEEPSEEK_API_KEY 变量中设置你的有效 API Key")
-
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [{"role": "user", "content": prompt}],
-    }
-    if is_json_mode:
-        payload["response_format"] = {"type": "json_object"}
+REFACTOR_SYSTEM_PROMPT = """
+你是一位顶级的 Python 数据可视化专家，尤其擅长为学术期刊（如 Nature, Science）准备符合出版要求的高质量图表。
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
+你的任务是：接收一段 Python 绘图脚本，并根据用户给出的具体要求对其进行重构和优化。
 
-    try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, json=payload, timeout=180)
-        response.raise_for_status()
-        result_content = response.json()['choices'][0]['message']['content']
-        return result_content
-    except requests.exceptions.RequestException as e:
-        print(f"调用 DeepSeek API 时发生网络错误: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"解析 DeepSeek API 响应时出错: {e}, 响应内容: {response.text}")
-        return None
+**核心要求**:
+1. **保留原始意图**: 必须完整保留原始代码的数据处理逻辑、绘图类型（如折线图、柱状图）以及所有中文标签和注释。你的工作是美化和规范化，而不是改变图表的核心内容。
+- 确保修改后的代码可以直接运行。
+""" + EDIT_FORMAT_INSTRUCTIONS
 
 # --- 核心功能函数 ---
 
-def translate_texts(texts_to_translate):
-    """使用 DeepSeek API 批量翻译文本。"""
-    prompt = f"""
-    你是一个精准的翻译引擎。请将以下JSON对象中的英文文本翻译成简洁、专业、地道的中文。
-    请确保JSON的key保持不变，只翻译value中的字符串。
-    请以JSON格式返回结果，不要添加任何额外的解释或说明。
+_chunk_sizer = AdaptiveChunkSizer(
+    TRANSLATION_CHUNK_TOKENS, TRANSLATION_CHUNK_MIN_TOKENS, TRANSLATION_CHUNK_MAX_TOKENS,
+    TRANSLATION_TARGET_LATENCY,
+)
 
+def translate_chunk(texts_to_translate, refresh=False):
+    """
+    使用 DeepSeek API 翻译一个分块（单个 JSON 请求），失败时返回 None。
+    refresh 为 True 时跳过响应缓存直接请求，用于重试：单条文本的分块重试时提示词与上次完全相同，
+    否则会原样重放上次不完整的缓存回复。
+    """
+    prompt = f"""
     输入:
     {json.dumps(texts_to_translate, indent=2, ensure_ascii=False)}
 
     输出:
     """
     
-    translated_json_str = call_deepseek_api(prompt, is_json_mode=True)
+    # 分块在线程池中并发翻译，遥测统一记在 translate_texts 名下
+    translated_json_str = call_deepseek_api(prompt, is_json_mode=True, system_prompt=TRANSLATE_SYSTEM_PROMPT,
+                                            task='translate_texts', refresh=refresh)
     if translated_json_str:
         try:
             return json.loads(translated_json_str)
         except json.JSONDecodeError as e:
             print(f"无法解析翻译返回的JSON: {e}")
-            print(f"原始字符串: {translated_json_str}")
+            print(f"原始字符串: {translated_json_str[:200]}")
             return None
     return None
 
+def split_into_chunks(items, token_budget):
+    """按估算的 token 数把 (key, value) 列表装箱，每块至少一条。"""
+    chunks, current, current_tokens = [], {}, 0
+    for key, value in items:
+        item_tokens = estimate_tokens(json.dumps({key: value}, ensure_ascii=False))
+        if current and current_tokens + item_tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = {}, 0
+        current[key] = value
+        current_tokens += item_tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _translate_timed(item):
+    chunk, attempt = item
+    start = time.perf_counter()
+    result = translate_chunk(chunk, refresh=attempt > 1)
+    return result, time.perf_counter() - start
+
+def translate_texts(texts_to_translate):
+    """
+    使用 DeepSeek API 批量翻译文本。
+    文本按估算 token 数分块后并发请求，分块大小根据观察到的延迟和失败情况自适应调整；
+    返回结果中缺失或无法解析的条目会拆成更小的分块重试，其余结果直接合并。
+    全部失败时返回 None。
+    """
+    pending = deque((chunk, 1) for chunk in split_into_chunks(texts_to_translate.items(), _chunk_sizer.size))
+    if len(pending) > 1:
+        print(f"共 {len(texts_to_translate)} 条文本，拆分为 {len(pending)} 个分块并发翻译...")
+    translation_map = {}
+    failed = 0
+    while pending:
+        wave = [pending.popleft() for _ in range(min(len(pending), llm_client.MAX_CONCURRENT_REQUESTS))]
+        results = run_concurrently(_translate_timed, wave)
+        for (chunk, attempt), (result, elapsed) in zip(wave, results):
+            translated = {k: v for k, v in (result or {}).items() if k in chunk and isinstance(v, str)}
+            translation_map.update(translated)
+            missing = [(k, v) for k, v in chunk.items() if k not in translated]
+            size = _chunk_sizer.record(not missing, elapsed)
+            if not missing:
+                continue
+            if attempt >= TRANSLATION_MAX_ATTEMPTS:
+                failed += len(missing)
+                continue
+            retry_chunks = split_into_chunks(missing, min(size, max(1, estimate_tokens(json.dumps(chunk, ensure_ascii=False)) // 2)))
+            print(f"有 {len(missing)} 条文本翻译失败，拆分为 {len(retry_chunks)} 个分块重试...")
+            pending.extend((retry_chunk, attempt + 1) for retry_chunk in retry_chunks)
+    if failed:
+        print(f"{failed} 条文本多次翻译失败，将保留原文。")
+    return translation_map or None
+
 # --- MODIFIED ---
-def refactor_and_style_code(code_content, style_options):
+def refactor_and_style_code(code_content, style_options, stream_to=None):
     """
-    使用 DeepSeek API 对代码进行美化、重构和学术风格应用。
+    使用 DeepSeek API 对子图布局进行重构美化。
+    模型只返回编辑块（见 code_patch），在本地应用并检查语法，输出 token 与改动量成正比。
+    学术风格（字体、字号、尺寸、矢量图保存）已由 academic_styler 在本地确定性地完成，
+    这里只处理需要理解代码结构的子图重新排布。
     style_options 是一个包含用户选择的字典。
+    stream_to 不为空时以流式方式将模型返回的编辑块逐段写入该文件对象（例如 sys.stdout）。
+    返回修改后的代码；模型认为无需修改时原样返回 code_content，请求失败时返回 None。
     """
     
     # --- 根据用户选项动态构建 Prompt 的一部分 ---
     instructions = []
     
-    # 1. 布局美化指令
+    # 布局美化指令
     if style_options.get('beautify_layout'):
         instructions.append(
             "2. **优化子图布局**: 如果代码创建了多个子图（subplots）且它们是垂直或水平排列的（例如 4x1 或 1x4），请将它们重构为更均衡的网格布局（例如 2x2）。目的是让整体视觉更紧凑、专业。"
         )
-        
-    # 2. 学术风格指令
-    if style_options.get('enabled'):
-        layout = style_options.get('layout', 'single')
-        if layout == 'single':
-            figsize_str = "(3.35, 2.5) # 对应约 85mm 单栏宽度"
-        else:
-            figsize_str = "(7.08, 4.0) # 对应约 180mm 双栏宽度"
-
-        academic_instructions = f"""
-3. **应用学术出版风格**:
-   - **字体与字号**: 注入 `plt.rcParams.update()` 来全局设置字体。必须使用无衬线字体（sans-serif），如 'Arial' 或 'Helvetica'。具体字号 (pt) 要求如下:
-     - 图表标题 (Title): 12 pt
-     - 坐标轴标签 (Axis Labels): 10 pt
-     - 坐标轴刻度 (Tick Labels): 8 pt
-     - 图例 (Legend): 8 pt
-   - **图表尺寸**: 找到创建图表的代码行（如 `plt.figure()` 或 `plt.subplots()`），将其 `figsize` 参数修改或设置为 `{figsize_str}`。
-"""
-        instructions.append(academic_instructions)
-
-    # 3. 矢量图保存指令
-    vector_format = style_options.get('vector_format')
-    if vector_format:
-        filename_base = style_options.get('output_filename_base', 'figure')
-        output_filename = f"{filename_base}.{vector_format}"
-        save_instruction = f"""
-4. **保存为矢量图**: 在 `plt.show()` 命令之前，必须插入一行代码来将图表保存为矢量图。代码应为: `plt.savefig('{output_filename}', bbox_inches='tight')`。
-"""
-        instructions.append(save_instruction)
 
     # --- 组合成最终的 Prompt ---
-    # 如果没有任何指令，则直接返回
+    # 如果没有任何指令，则原样返回
     if not instructions:
-        return None
+        return code_content
         
+    requirements = "\n".join(instructions)
     prompt = f"""
-你是一位顶级的 Python 数据可视化专家，尤其擅长为学术期刊（如 Nature, Science）准备符合出版要求的高质量图表。
-
-你的任务是：接收一段 Python 绘图脚本，并根据下面的具体要求对其进行重构和优化。
-
-**核心要求**:
-1. **保留原始意图**: 必须完整保留原始代码的数据处理逻辑、绘图类型（如折线图、柱状图）以及所有中文标签和注释。你的工作是美化和规范化，而不是改变图表的核心内容。
-{"\n".join(instructions)}
-
-**输出规则**:
-- **纯代码输出**: 你的回复必须且只能是经过重构和优化后的完整 Python 代码。
-- **不要包含任何解释**、前言、结语或任何格式化标记，例如 ```python ... ```。
-- 确保代码可以直接运行。
+**本次的具体要求**:
+{requirements}
 
 **这是需要你处理的原始 Python 脚本**:
 
@@ -140,17 +199,20 @@ def refactor_and_style_code(code_content, style_options):
 """
     
     print("正在请求 AI 进行代码重构与风格美化...")
-    refactored_code = call_deepseek_api(prompt)
-    
-    # 基本的验证，防止 API 返回非代码内容
-    if refactored_code and ('import' in refactored_code or 'plt' in refactored_code):
-        return refactored_code
-    else:
-        print(f"AI 返回内容似乎不是有效的代码，已忽略。返回内容: {refactored_code[:200]}...")
-        return None
+    refactored_code = request_code_edits(
+        lambda request: call_deepseek_api(request, stream_to=stream_to, system_prompt=REFACTOR_SYSTEM_PROMPT,
+                                          task='refactor_and_style_code', validate=is_edit_reply),
+        prompt, code_content, requirements=requirements,
+    )
+    return refactored_code
 
 def inject_chinese_font_support(code_lines):
-    """在代码中注入 Matplotlib 中文支持的设置。 (无变动)"""
+    """
+    在代码中注入 Matplotlib 中文支持的设置。
+    字体列表取本机实际安装的中文字体（见 cjk_fonts，按字体目录 mtime 缓存索引），
+    并放在原有 font.sans-serif 之前，英文字符仍可回退到原来的字体。
+    本机没有中文字体时不注入字体名，只关闭 unicode_minus，并提示中文将无法显示。
+    """
     matplotlib_import_index = -1
     for i, line in enumerate(code_lines):
         if re.search(r'import\s+matplotlib\.pyplot\s+as\s+plt', line):
@@ -158,9 +220,15 @@ def inject_chinese_font_support(code_lines):
             break
             
     if matplotlib_import_index != -1:
+        families = cjk_fonts.best_cjk_fonts()
+        if families:
+            font_line = f"plt.rcParams['font.sans-serif'] = {families!r} + plt.rcParams['font.sans-serif']"
+        else:
+            print("警告：本机未检测到中文字体，生成的图中中文将显示为方框（可安装 fonts-noto-cjk 后重新处理）。")
+            font_line = "# 生成时未检测到中文字体，安装中文字体（如 Noto Sans CJK SC）后在此加入 font.sans-serif"
         font_config = [
             "\n# --- 解决中文显示问题 ---",
-            "plt.rcParams['font.sans-serif'] = ['SimHei']",
+            font_line,
             "plt.rcParams['axes.unicode_minus'] = False",
             "# --------------------------\n"
         ]
@@ -176,80 +244,75 @@ def inject_chinese_font_support(code_lines):
     # 实际上，因为 code_lines.insert() 是原地修改列表，我们只需要直接返回被修改后的 code_lines 即可。
     # 如果出现错误，请修改此行
 
-# --- NEW ---
-# 新增辅助函数，用于根据用户选项生成学术风格的 rcParams 设置代码
-def create_academic_style_code_block(options):
+def extract_texts_to_translate(original_code, spans=None):
     """
-    根据用户选项生成 Matplotlib rcParams 的 Python 代码块。
+    从绘图函数的字符串参数、注释（含行尾注释）和文档字符串中提取需要翻译的英文文本。
+    返回 key 与 value 相同的字典，可直接交给 translate_texts。
+    已有 extract_text_spans 的结果时通过 spans 传入，避免重复扫描。
     """
-    layout = options.get('layout', 'single')
-    
-    # 根据期刊常见尺寸（英寸）设置图像大小
-    # 单栏: ~85mm -> 3.35 inches
-    # 双栏: ~180mm -> 7.08 inches
-    if layout == 'single':
-        figsize_str = "(3.35, 2.5) # 单栏宽度"
-    else: # double
-        figsize_str = "(7.08, 4.0) # 双栏宽度"
-        
-    style_settings = f"""
-# --- 学术风格注入 ---
-# 设置字体和字号以符合出版标准
-plt.rcParams.update({{
-    'font.family': 'sans-serif',
-    'font.sans-serif': ['Arial', 'Helvetica'], # 优先使用 Arial 或 Helvetica
-    'font.size': 10,                   # 全局基础字号
-    'axes.titlesize': 12,              # 图表标题字号
-    'axes.labelsize': 10,              # 坐标轴标签字号
-    'xtick.labelsize': 8,              # X轴刻度字号
-    'ytick.labelsize': 8,              # Y轴刻度字号
-    'legend.fontsize': 8,              # 图例字号
-    'figure.dpi': 300,                 # 图像分辨率
-    'figure.figsize': {figsize_str}   # 根据单/双栏设置图像大小
-}})
-# --------------------
-"""
-    return style_settings
+    if spans is None:
+        spans = extract_text_spans(original_code, TARGET_PLOT_FUNCTIONS, PLOT_TEXT_KEYWORDS)
+    return {span.text: span.text for span in spans}
 
-# --- NEW ---
-# 新增辅助函数，用于在 plt.show() 之前插入 plt.savefig()
-def inject_savefig_before_show(code_lines, vector_format, original_filepath):
+def apply_translation_map(original_code, translation_map, spans=None):
     """
-    在代码中找到 plt.show() 并在其之前插入保存矢量图的命令。
+    根据翻译映射替换代码中的绘图标签、注释和文档字符串，返回翻译后的代码。
+    按提取时记录的位置一次性拼接，只改动这些位置本身，其它同名字符串保持不变。
     """
-    if not vector_format:
-        return code_lines
+    if spans is None:
+        spans = extract_text_spans(original_code, TARGET_PLOT_FUNCTIONS, PLOT_TEXT_KEYWORDS)
+    return apply_spans(original_code, spans, translation_map)
 
-    show_line_index = -1
-    for i, line in enumerate(code_lines):
-        # 匹配 plt.show()，允许前面有空格
-        if re.search(r'^\s*plt\.show\(\)', line):
-            show_line_index = i
-            break
-            
-    if show_line_index != -1:
-        base, _ = os.path.splitext(original_filepath)
-        # 生成保存文件的路径，例如 001_figure.pdf
-        output_filename = f"{base}_figure.{vector_format}"
-        
-        savefig_line = f"\n# 保存为矢量图格式\nplt.savefig('{output_filename}', bbox_inches='tight')\n"
-        
-        # 在 plt.show() 之前插入保存命令
-        code_lines.insert(show_line_index, savefig_line)
-        print(f"已注入保存矢量图的代码，将保存至: {output_filename}")
-    else:
-        print("警告：未找到 'plt.show()'，无法自动注入保存矢量图的代码。")
-        
-    return code_lines
+def translate_with_memory(texts_to_translate):
+    """
+    先查本地翻译记忆库，只把未命中的文本交给 translate_texts 翻译，
+    新译文写回记忆库。返回合并后的翻译映射。
+    """
+    memory = translation_memory.get_default_memory()
+    if memory is None:
+        return translate_texts(texts_to_translate) or {}
+
+    translation_map = memory.lookup(texts_to_translate)
+    missing = {k: v for k, v in texts_to_translate.items() if k not in translation_map}
+    print(f"翻译记忆命中 {len(translation_map)}/{len(texts_to_translate)} 条，需请求翻译 {len(missing)} 条。")
+    if missing:
+        new_translations = translate_texts(missing) or {}
+        memory.store(new_translations)
+        translation_map.update(new_translations)
+    return translation_map
+
+def job_options_hash(beautify, academic_options):
+    """影响输出结果的全部选项（含模型、提取规则与注入的中文字体）的哈希，用于处理清单。"""
+    options = {k: v for k, v in (academic_options or {'enabled': False}).items()
+               if k not in ('beautify_layout', 'output_filename_base')}
+    return job_manifest.options_hash({
+        'beautify': bool(beautify),
+        'academic_options': options,
+        'model': llm_client.DEEPSEEK_MODEL,
+        'plot_functions': TARGET_PLOT_FUNCTIONS,
+        'text_keywords': PLOT_TEXT_KEYWORDS,
+        'cjk_fonts': cjk_fonts.best_cjk_fonts(),
+    })
 
 # --- MODIFIED ---
 # 主处理函数增加了新的参数 academic_options
-def process_python_file(filepath, beautify=False, academic_options=None):
+@per_job_retry_budget
+def process_python_file(filepath, beautify=False, academic_options=None, stream=None,
+                        shared_translation_map=None):
     """
     处理单个Python文件：翻译、风格化，并应用备用注入方案。
+    stream=True 时重构结果边生成边写入输出文件（默认取 llm_client.STREAM_BY_DEFAULT）。
+    shared_translation_map 由 translate_project 传入，提供后不再为本文件单独请求翻译。
+    源码、选项和 Agent 版本都未变化且输出文件完好时直接跳过；源码有改动时，
+    上次已翻译过的文本沿用处理清单中记录的译文，只翻译新增的文本。
     """
     print(f"--- 开始处理文件: {filepath} ---")
 
+    if stream is None:
+        stream = llm_client.STREAM_BY_DEFAULT
+    base, ext = os.path.splitext(filepath)
+    new_filepath = f"{base}_zh_revision{ext}"
+
     if academic_options is None:
         academic_options = {'enabled': False}
 
@@ -260,54 +323,57 @@ def process_python_file(filepath, beautify=False, academic_options=None):
         print(f"读取文件失败: {e}")
         return
 
+    input_hash = job_manifest.content_hash(original_code)
+    opts_hash = job_options_hash(beautify, academic_options)
+    if job_manifest.is_up_to_date('translator', filepath, input_hash, opts_hash, AGENT_VERSION):
+        print(f"--- 源码与选项均未变化，跳过: {new_filepath} 已是最新 ---")
+        return
+
     try:
-        tree = ast.parse(original_code)
+        # 解析结果按内容哈希缓存，项目模式预扫描时已解析过的文件在这里直接复用
+        get_symbol_index(original_code)
     except SyntaxError as e:
         print(f"Python 代码语法错误，无法解析: {e}")
         return
 
-    texts_to_translate = {}
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Call) and hasattr(node.func, 'attr') and node.func.attr in TARGET_PLOT_FUNCTIONS:
-            for arg in node.args:
-                if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and arg.value.strip():
-                    texts_to_translate[arg.value] = arg.value
-            for kw in node.keywords:
-                if isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str) and kw.value.value.strip():
-                    texts_to_translate[kw.value.value] = kw.value.value
-    code_lines = original_code.split('\n')
-    for line in code_lines:
-        line_stripped = line.strip()
-        if line_stripped.startswith('#'):
-            comment_text = line_stripped[1:].strip()
-            if comment_text and re.search('[a-zA-Z]', comment_text):
-                texts_to_translate[comment_text] = comment_text
+    # 单遍 tokenize 扫描同时得到待翻译文本及其位置，翻译和重写共用同一份结果
+    text_spans = extract_text_spans(original_code, TARGET_PLOT_FUNCTIONS, PLOT_TEXT_KEYWORDS)
+    texts_to_translate = extract_texts_to_translate(original_code, text_spans)
     
     translated_code = original_code
-    if texts_to_translate:
-        print(f"找到 {len(texts_to_translate)} 条需要翻译的文本，正在请求翻译...")
-        translation_map = translate_texts(texts_to_translate)
+    # 上次处理时使用的译文：仍然存在的文本直接复用，只有新增文本需要翻译
+    previous_entry = job_manifest.get_entry('translator', filepath) or {}
+    previous_translations = previous_entry.get('translations') or {}
+    reused = {k: previous_translations[k] for k in texts_to_translate if k in previous_translations}
+    translation_map = {}
+    complete = True
+    if reused:
+        print(f"复用上次的译文 {len(reused)} 条，新增文本 {len(texts_to_translate) - len(reused)} 条。")
+        texts_to_translate = {k: v for k, v in texts_to_translate.items() if k not in reused}
+    if not texts_to_translate:
+        translation_map = reused
+        if reused:
+            translated_code = apply_translation_map(original_code, translation_map, text_spans)
+        else:
+            print("未找到需要翻译的英文文本。")
+    else:
+        if shared_translation_map is not None:
+            # 项目模式：优先使用全局去重翻译得到的共享映射，仅补翻其中缺失的文本
+            translation_map = {k: shared_translation_map[k] for k in texts_to_translate if k in shared_translation_map}
+            missing = {k: v for k, v in texts_to_translate.items() if k not in shared_translation_map}
+            if missing:
+                print(f"共享翻译映射中缺少 {len(missing)} 条文本，正在补充翻译...")
+                translation_map.update(translate_with_memory(missing))
+        else:
+            print(f"找到 {len(texts_to_translate)} 条需要翻译的文本。")
+            translation_map = translate_with_memory(texts_to_translate)
+        complete = all(k in translation_map for k in texts_to_translate)
+        translation_map.update(reused)
         if not translation_map:
             print("翻译失败，跳过翻译步骤。")
         else:
             print("翻译完成，开始重建代码...")
-            sorted_eng_texts = sorted(translation_map.keys(), key=len, reverse=True)
-            modified_code = original_code
-            for eng_text in sorted_eng_texts:
-                zh_text = translation_map.get(eng_text, eng_text)
-                modified_code = modified_code.replace(f'"{eng_text}"', f'"{zh_text}"')
-                modified_code = modified_code.replace(f"'{eng_text}'", f"'{zh_text}'")
-                temp_lines = []
-                for line in modified_code.split('\n'):
-                    stripped_line = line.strip()
-                    if stripped_line.startswith(f'# {eng_text}') or stripped_line.startswith(f'#{eng_text}'):
-                        temp_lines.append(line.replace(eng_text, zh_text))
-                    else:
-                        temp_lines.append(line)
-                modified_code = '\n'.join(temp_lines)
-            translated_code = modified_code
-    else:
-        print("未找到需要翻译的英文文本。")
+            translated_code = apply_translation_map(original_code, translation_map, text_spans)
 
     modified_code_lines = translated_code.split('\n')
     if not any("plt.rcParams['font.sans-serif']" in line for line in modified_code_lines):
@@ -316,61 +382,130 @@ def process_python_file(filepath, beautify=False, academic_options=None):
     final_code_with_font_support = '\n'.join(modified_code_lines)
     final_code = final_code_with_font_support
     
-    refactored_result = None
-    if beautify or (academic_options and academic_options.get('enabled')):
-        base, _ = os.path.splitext(filepath)
-        output_filename_base = f"{base}_figure" # 传递给 AI 用于生成保存文件名
-
-        style_options = academic_options if academic_options else {}
-        style_options['beautify_layout'] = beautify
-        style_options['output_filename_base'] = output_filename_base
-        
-        refactored_result = refactor_and_style_code(final_code_with_font_support, style_options)
-        
-        if refactored_result:
-            final_code = refactored_result
-            print("AI 代码重构与风格美化成功。")
-        else:
-            print("AI 代码重构失败或跳过。")
-
-    if not refactored_result and academic_options and academic_options.get('enabled'):
-        print("正在执行备用方案：直接注入学术风格代码...")
-        code_lines = final_code.split('\n')
-        
-        matplotlib_import_index = -1
-        for i, line in enumerate(code_lines):
-            if re.search(r'import\s+matplotlib\.pyplot\s+as\s+plt', line):
-                matplotlib_import_index = i
-                break
-        
-        if matplotlib_import_index != -1:
-            style_code_block = create_academic_style_code_block(academic_options)
-            code_lines.insert(matplotlib_import_index + 1, style_code_block)
-            print("已注入字体、字号和尺寸设置。")
+    # 子图重新排布需要理解代码结构，仅这一步调用 AI；确实存在单行/单列的多子图时才发请求
+    if beautify:
+        if needs_subplot_relayout(final_code, tree=get_symbol_index(final_code).tree):
+            style_options = {'beautify_layout': True}
+            # 流式模式：模型返回的编辑块实时打印到终端，应用后的完整代码最后统一写入
+            refactored_result = refactor_and_style_code(final_code, style_options,
+                                                        stream_to=sys.stdout if stream else None)
+
+            if refactored_result is None:
+                # 只有真正失败才不记录选项哈希，下次重新处理；布局无需修改属于正常完成
+                complete = False
+                print("AI 子图布局美化失败。")
+            elif refactored_result == final_code:
+                print("AI 认为当前布局无需修改。")
+            else:
+                final_code = refactored_result
+                print("AI 子图布局美化成功。")
         else:
-            print("警告：未找到 matplotlib 导入语句，无法注入样式代码。")
+            print("未发现需要重新排布的单行/单列子图，跳过 AI 布局美化。")
 
-        vector_format = academic_options.get('vector_format')
-        code_lines = inject_savefig_before_show(code_lines, vector_format, filepath)
-        
-        final_code = '\n'.join(code_lines)
+    # 学术风格的各项规则都是机械性修改，直接在本地按 AST 应用，无需调用 API
+    if academic_options and academic_options.get('enabled'):
+        print("正在本地应用学术出版风格...")
+        try:
+            # 未经 AI 改动时与上面的布局检查共用同一份语法树
+            final_code = apply_academic_style(final_code, academic_options, filepath,
+                                              tree=get_symbol_index(final_code).tree)
+        except SyntaxError as e:
+            print(f"代码无法解析，跳过学术风格设置: {e}")
 
-    base, ext = os.path.splitext(filepath)
-    new_filepath = f"{base}_zh_revision{ext}"
-    
     try:
         with open(new_filepath, 'w', encoding='utf-8') as f:
             f.write(final_code)
         print(f"--- 处理完成！修改后的文件已保存至: {new_filepath} ---")
     except Exception as e:
         print(f"保存文件失败: {e}")
+        return
+
+    # 只有全部步骤都成功时才记为最新，否则下次运行会重新处理（已有译文仍会被复用）
+    job_manifest.record_job(
+        'translator', filepath, input_hash, opts_hash if complete else None, AGENT_VERSION, [new_filepath],
+        translations={k: v for k, v in translation_map.items() if k in reused or k in texts_to_translate},
+    )
+
+
+async def process_python_file_async(filepath, beautify=False, academic_options=None, stream=None):
+    """
+    process_python_file 的异步版本。
+    单个文件内翻译与重构存在先后依赖，因此并发收益来自同时处理多个文件。
+    """
+    await run_blocking(process_python_file, filepath, beautify, academic_options, stream)
+
+
+async def process_many_async(filepaths, beautify=False, academic_options=None):
+    """并发处理多个文件，在途请求总数由 llm_client 的全局信号量限制。"""
+    await asyncio.gather(*(
+        process_python_file_async(path, beautify, dict(academic_options) if academic_options else None)
+        for path in filepaths
+    ))
+
+
+def find_python_files(directory):
+    """递归查找目录下的 Python 脚本，跳过隐藏目录、__pycache__ 以及本工具生成的输出文件。"""
+    python_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+        for name in sorted(files):
+            if name.endswith('.py') and not name.endswith(GENERATED_SUFFIXES):
+                python_files.append(os.path.join(root, name))
+    return python_files
+
+
+def translate_project(directory, beautify=False, academic_options=None, stream=None, verify=False):
+    """
+    项目模式：扫描目录下所有脚本，全局去重后统一翻译，再用共享的翻译映射逐个重写文件。
+    相同的标签（如 "Time (s)"、"Loss"）在整个项目中只翻译一次。
+    处理清单显示未变化的文件既不参与全局翻译也不重新处理；上次已有译文的文本同样不再翻译。
+    verify=True 时最后并行无界面运行原始脚本与译后脚本，生成渲染验证报告。
+    """
+    python_files = find_python_files(directory)
+    print(f"=== 项目模式: 在 '{directory}' 中找到 {len(python_files)} 个 Python 文件 ===")
+
+    all_texts = {}
+    total_count = 0
+    changed_files = []
+    opts_hash = job_options_hash(beautify, academic_options)
+    for path in python_files:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                code = f.read()
+            get_symbol_index(code)
+        except (OSError, UnicodeDecodeError, SyntaxError) as e:
+            print(f"跳过无法解析的文件 '{path}': {e}")
+            continue
+        if job_manifest.is_up_to_date('translator', path, job_manifest.content_hash(code), opts_hash, AGENT_VERSION):
+            continue
+        changed_files.append(path)
+        previous_translations = (job_manifest.get_entry('translator', path) or {}).get('translations') or {}
+        texts = {k: v for k, v in extract_texts_to_translate(code).items() if k not in previous_translations}
+        total_count += len(texts)
+        all_texts.update(texts)
+
+    print(f"其中 {len(changed_files)} 个文件需要处理，其余未变化，直接跳过。")
+    print(f"共提取 {total_count} 条新文本，全局去重后剩余 {len(all_texts)} 条。")
+    shared_translation_map = translate_with_memory(all_texts) if all_texts else {}
+
+    for path in changed_files:
+        process_python_file(
+            path,
+            beautify=beautify,
+            academic_options=dict(academic_options) if academic_options else None,
+            stream=stream,
+            shared_translation_map=shared_translation_map,
+        )
+    print("=== 项目模式处理完毕 ===")
+    if verify:
+        render_verifier.verify_directory(directory)
 
 
 # --- 主程序入口 ---
 # --- MODIFIED ---
 if __name__ == '__main__':
     # 获取用户输入
-    file_to_process = input("请输入要处理的 Python 文件路径 (例如: 001.py): ")
+    file_to_process = input("请输入要处理的 Python 文件路径或目录 (例如: 001.py，输入目录则启用项目模式): ")
 
     if not os.path.exists(file_to_process):
         print(f"错误：文件 '{file_to_process}' 不存在。")
@@ -398,6 +533,9 @@ if __name__ == '__main__':
             vector_format_choice = input("请输入选项 (直接回车则不保存): ")
             format_map = {'1': 'pdf', '2': 'svg', '3': 'eps'}
             academic_options['vector_format'] = format_map.get(vector_format_choice, None)
+            if academic_options['vector_format']:
+                compact_choice = input("是否启用紧凑矢量输出（路径简化、密集图元栅格化、字体子集化，显著减小文件体积）？[y/N]: ")
+                academic_options['compact_vector'] = compact_choice.lower() == 'y'
             
             # 在学术模式下，默认开启布局美化
             should_beautify = True
@@ -407,8 +545,17 @@ if __name__ == '__main__':
             beautify_choice = input("是否需要进行AI布局美化？(这是一个实验性功能) [y/N]: ").lower()
             should_beautify = beautify_choice == 'y'
         
-        process_python_file(
-            file_to_process, 
-            beautify=should_beautify, 
-            academic_options=academic_options
-        )
\ No newline at end of file
+        if os.path.isdir(file_to_process):
+            verify_choice = input("处理完成后是否并行验证原始脚本与译后脚本能否正常出图？[y/N]: ").lower()
+            translate_project(
+                file_to_process,
+                beautify=should_beautify,
+                academic_options=academic_options,
+                verify=verify_choice == 'y'
+            )
+        else:
+            process_python_file(
+                file_to_process, 
+                beautify=should_beautify, 
+                academic_options=academic_options
+            )
\ No newline at end of file
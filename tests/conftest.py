@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模块位于 code/ 下，以模块名直接导入（与命令行运行方式一致）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code'))
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from academic_styler import needs_subplot_relayout
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'test_graphics', 'result_v2', '001.py')
+
+
+@pytest.mark.parametrize('code, expected', [
+    ("import matplotlib.pyplot as plt\nfig, axes = plt.subplots(4, 1)\n", True),
+    ("import matplotlib.pyplot as plt\nplt.subplot(311)\n", True),
+    ("fig.add_subplot(4, 1, 2)\n", True),
+    ("fig.subplots(nrows=1, ncols=4)\n", True),
+    ("fig.add_subplot(gs[0, :])\n", True),
+    ("fig, axes = plt.subplots(n, 1)\n", True),
+    ("axes = fig.subplot_mosaic('AB')\n", True),
+    ("fig.add_subplot(2, 2, 1)\n", False),
+    ("fig, ax = plt.subplots()\ncax = fig.add_axes([0.9, 0.1, 0.03, 0.8])\n", False),
+    ("fig.add_subplot(111)\nfig.add_subplot()\n", False),
+    ("import matplotlib.pyplot as plt\nfig, ax = plt.subplots()\nplt.plot(x)\n", False),
+])
+def test_needs_subplot_relayout(code, expected):
+    assert needs_subplot_relayout(code) is expected
+
+
+def test_sample_with_stacked_add_subplot_needs_relayout():
+    with open(SAMPLE, encoding='utf-8') as f:
+        assert needs_subplot_relayout(f.read())
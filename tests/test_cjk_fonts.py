@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+import cjk_fonts
+
+
+@pytest.fixture
+def font_dir(tmp_path, monkeypatch):
+    fonts = tmp_path / 'fonts'
+    fonts.mkdir()
+    monkeypatch.setattr(cjk_fonts, 'FONT_DIRS', [str(fonts)])
+    monkeypatch.setattr(cjk_fonts, 'FONT_INDEX_PATH', str(tmp_path / 'cjk_fonts.json'))
+    monkeypatch.setattr(cjk_fonts, '_cached_fonts', None)
+    scans = []
+
+    def fake_scan():
+        scans.append(1)
+        return [{'family': 'Noto Sans CJK SC', 'path': str(fonts / 'noto.ttc'), 'chinese': True}]
+
+    monkeypatch.setattr(cjk_fonts, 'scan_cjk_fonts', fake_scan)
+    return fonts, scans
+
+
+def test_index_reused_when_nothing_changed(font_dir):
+    fonts, scans = font_dir
+    (fonts / 'noto.ttc').write_bytes(b'v1')
+    cjk_fonts.load_cjk_fonts()
+    cjk_fonts._cached_fonts = None
+    assert cjk_fonts.load_cjk_fonts()[0]['family'] == 'Noto Sans CJK SC'
+    assert len(scans) == 1
+
+
+def test_index_rebuilt_when_font_replaced_in_place(font_dir):
+    fonts, scans = font_dir
+    font = fonts / 'noto.ttc'
+    font.write_bytes(b'v1')
+    cjk_fonts.load_cjk_fonts()
+    dir_mtime = os.stat(fonts).st_mtime_ns
+    # 原地覆盖升级：目录 mtime 不变，只有文件本身的大小和 mtime 变化
+    font.write_bytes(b'version 2')
+    os.utime(fonts, ns=(dir_mtime, dir_mtime))
+    cjk_fonts._cached_fonts = None
+    cjk_fonts.load_cjk_fonts()
+    assert len(scans) == 2
+
+
+def test_fingerprint_ignores_non_font_files(font_dir):
+    fonts, _ = font_dir
+    (fonts / 'noto.ttc').write_bytes(b'v1')
+    (fonts / 'fonts.dir').write_text('1')
+    assert list(cjk_fonts.font_fingerprint()['files']) == [str(fonts / 'noto.ttc')]
@@ -0,0 +1,105 @@
+from code_patch import (NO_CHANGES, EditBlock, apply_edit_blocks, check_syntax, is_edit_reply, locate_block,
+                        parse_edit_blocks, request_code_edits)
+
+CODE = '''import numpy as np
+
+def step(x):
+    return x + 1
+
+def main():
+    y = step(1)
+    print(y)
+'''
+
+
+def block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def scripted(replies):
+    """按顺序返回预设回复的 call，同时记录收到的提示词。"""
+    prompts = []
+    replies = iter(replies)
+
+    def call(prompt):
+        prompts.append(prompt)
+        return next(replies)
+
+    return call, prompts
+
+
+def test_parse_edit_blocks():
+    reply = block("    return x + 1", "    return x + 2") + "\n\n" + block("    print(y)", "    print(y * 2)")
+    assert parse_edit_blocks(reply) == [
+        EditBlock("    return x + 1", "    return x + 2"),
+        EditBlock("    print(y)", "    print(y * 2)"),
+    ]
+    assert parse_edit_blocks("没有编辑块") == []
+
+
+def test_is_edit_reply():
+    assert is_edit_reply(block("x", "y"))
+    assert is_edit_reply(f" {NO_CHANGES}\n")
+    assert not is_edit_reply("好的，我已经修改了代码。")
+    assert not is_edit_reply("")
+
+
+def test_apply_exact_block():
+    code, failed = apply_edit_blocks(CODE, [EditBlock("    return x + 1", "    return x + 2")])
+    assert failed == []
+    assert "return x + 2" in code and "return x + 1" not in code
+
+
+def test_apply_block_with_wrong_indentation_is_reindented():
+    code, failed = apply_edit_blocks(CODE, [EditBlock("y = step(1)\nprint(y)", "y = step(2)\nprint(y)")])
+    assert failed == []
+    assert "    y = step(2)\n    print(y)\n" in code
+    assert check_syntax(code) is None
+
+
+def test_missing_and_ambiguous_blocks_fail_without_changes():
+    code, failed = apply_edit_blocks(CODE, [EditBlock("return x + 3", "return 0"), EditBlock("def ", "class ")])
+    assert code == CODE
+    assert [reason for _, reason in failed] == ["SEARCH 内容在代码中找不到", "SEARCH 内容在代码中出现了 2 次，无法确定位置"]
+    assert locate_block(CODE, EditBlock("  ", "x")) == (None, "SEARCH 内容为空")
+
+
+def test_check_syntax_reports_line():
+    assert check_syntax(CODE) is None
+    assert check_syntax("def f(:\n    pass\n").startswith("第 1 行")
+
+
+def test_request_code_edits_success_and_no_changes():
+    call, _ = scripted([block("    return x + 1", "    return x + 2")])
+    assert "return x + 2" in request_code_edits(call, "prompt", CODE)
+    call, _ = scripted([NO_CHANGES])
+    assert request_code_edits(call, "prompt", CODE) == CODE
+
+
+def test_request_code_edits_retries_failed_block_with_original_requirement():
+    call, prompts = scripted([
+        block("    return x + 1", "    return x + 2") + "\n" + block("print(z)", "print(z)"),
+        block("    print(y)", "    print(y * 2)"),
+    ])
+    result = request_code_edits(call, "原始提示", CODE, requirements="把输出翻倍")
+    assert "return x + 2" in result and "print(y * 2)" in result
+    assert len(prompts) == 2
+    assert "把输出翻倍" in prompts[1] and "print(z)" in prompts[1]
+
+
+def test_request_code_edits_rejects_partial_application():
+    good = block("    return x + 1", "    return x + 2")
+    bad = block("print(z)", "print(z)")
+    call, prompts = scripted([good + "\n" + bad] + [bad] * 3)
+    assert request_code_edits(call, "prompt", CODE, max_rounds=3) is None
+    assert len(prompts) == 4
+    call, _ = scripted([good + "\n" + bad, NO_CHANGES])
+    assert request_code_edits(call, "prompt", CODE) is None
+
+
+def test_request_code_edits_rejects_syntax_errors():
+    broken = block("    return x + 1", "    return (x + 1")
+    call, _ = scripted([broken, block("    return (x + 1", "    return (x + 1")])
+    assert request_code_edits(call, "prompt", CODE, max_rounds=1) is None
+    call, _ = scripted([broken, block("    return (x + 1", "    return (x + 1)")])
+    assert "return (x + 1)" in request_code_edits(call, "prompt", CODE, max_rounds=1)
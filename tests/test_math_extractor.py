@@ -0,0 +1,63 @@
+import pytest
+
+from math_extractor import build_math_context, extract_formulas, symbol_for
+
+CODE = '''import numpy as np
+import math as m
+def f(x, sigma, mu=0):
+    # Gaussian: g = exp(-(x-mu)^2 / (2 sigma^2))
+    g = np.exp(-(x - mu) ** 2 / (2 * sigma ** 2))
+    return g / np.sqrt(2 * np.pi * sigma ** 2)
+alpha = 0.5
+total = 0
+total += alpha * np.dot(a, b)
+y = m.sin(theta) + np.log(1 + x_val)
+name = "abc"
+count = len(items)
+'''
+
+
+def test_extract_formulas():
+    formulas, variables, comments = extract_formulas(CODE)
+    assert [(formula.line, formula.scope, formula.latex) for formula in formulas] == [
+        (5, 'f', r'g = \exp\left(\frac{-\left(x - \mu\right)^{2}}{2 \sigma^{2}}\right)'),
+        (6, 'f', r'\frac{g}{\sqrt{2 \pi \sigma^{2}}}'),
+        (9, '<module>', r'\mathrm{total} \leftarrow \mathrm{total} + \alpha a \cdot b'),
+        (10, '<module>', r'y = \sin\left(\theta\right) + \ln\left(1 + x_{\mathrm{val}}\right)'),
+    ]
+    assert formulas[0].comments == ['Gaussian: g = exp(-(x-mu)^2 / (2 sigma^2))']
+    kinds = {variable.name: (variable.symbol, variable.kind) for variable in variables}
+    assert kinds['sigma'] == (r'\sigma', 'parameter')
+    assert kinds['alpha'] == (r'\alpha', 'constant')
+    assert 'name' not in kinds and 'np' not in kinds
+    assert comments == [(4, 'Gaussian: g = exp(-(x-mu)^2 / (2 sigma^2))')]
+
+
+@pytest.mark.parametrize('expression, latex', [
+    ('a / b', r'\frac{a}{b}'),
+    ('a ** (b + c)', 'a^{b + c}'),
+    ('-(a + b)', r'-\left(a + b\right)'),
+    ('np.abs(x)', r'\left|x\right|'),
+    ('np.sum(x ** 2)', r'\sum x^{2}'),
+    ('a * (b + c)', r'a \left(b + c\right)'),
+    ('(a - b) - (c - d)', r'a - b - \left(c - d\right)'),
+])
+def test_latex_precedence(expression, latex):
+    formulas, _, _ = extract_formulas(f"import numpy as np\nr = {expression}\n")
+    assert formulas[0].latex == f"r = {latex}"
+
+
+def test_symbol_for():
+    assert symbol_for('sigma') == r'\sigma'
+    assert symbol_for('x_val') == r'x_{\mathrm{val}}'
+
+
+def test_build_math_context_without_formulas():
+    assert build_math_context('x = 1\nprint("hi")\n') is None
+    context = build_math_context(CODE)
+    assert '**变量表**' in context and 'import math' not in context
+
+
+def test_extract_formulas_raises_on_syntax_error():
+    with pytest.raises(SyntaxError):
+        extract_formulas('def f(:\n')
@@ -0,0 +1,80 @@
+import threading
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (AdaptiveChunkSizer, RetryBudget, TokenBucket, backoff_delay, current_budget,
+                          job_retry_budget, parse_retry_after, per_job_retry_budget)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动拨动的 time.monotonic。"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_token_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(60)  # 每秒补充 1 个令牌，容量 60
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    clock[0] += 10
+    assert bucket.reserve(1) == 0.0
+    # 超过容量的单次需求按容量计算
+    assert TokenBucket(60).reserve(1000) == 0.0
+
+
+def test_token_bucket_consume_corrects_estimate(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(70)
+    assert bucket.reserve(1) == pytest.approx(11.0)
+
+
+def test_retry_budget_is_shared_within_a_job():
+    with job_retry_budget(limit=2) as budget:
+        assert current_budget() is budget
+        with job_retry_budget(limit=100) as inner:
+            assert inner is budget
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(budget.consume())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [False, False, False, True, True]
+    assert current_budget() is not budget
+
+
+def test_per_job_retry_budget_gives_each_call_its_own_budget():
+    seen = []
+    per_job_retry_budget(lambda: seen.append(current_budget()))()
+    per_job_retry_budget(lambda: seen.append(current_budget()))()
+    assert isinstance(seen[0], RetryBudget) and seen[0] is not seen[1]
+
+
+def test_adaptive_chunk_sizer():
+    sizer = AdaptiveChunkSizer(100, 10, 120, target_latency=5.0, step=15)
+    assert sizer.record(True, 1.0) == 115
+    assert sizer.record(True, 1.0) == 120
+    assert sizer.record(True, 9.0) == 60
+    assert sizer.record(False) == 30
+    for _ in range(5):
+        sizer.record(False)
+    assert sizer.size == 10
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(12):
+        assert 0.0 <= backoff_delay(attempt, base=1.0, cap=8.0) <= min(8.0, 2 ** attempt)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= parse_retry_after(later) <= 31
@@ -0,0 +1,91 @@
+import ast
+import glob
+import os
+
+import pytest
+
+from source_rewriter import (apply_edits, apply_spans, extract_text_spans, line_offsets, node_offsets,
+                             split_lines)
+
+PLOT_FUNCTIONS = {'title', 'plot', 'set_xlabel'}
+TEXT_KEYWORDS = ('label',)
+SAMPLE_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'test_*', '**', '*.py'), recursive=True))
+
+CODE = '''import matplotlib.pyplot as plt
+# Plot the data
+plt.title("Hello \\"world\\"")  # trailing note
+ax.plot(x, label='Sine', loc='best')
+def f():
+    """Doc line.
+
+    More."""
+'''
+
+
+def test_spans_cover_expected_text():
+    spans = extract_text_spans(CODE, PLOT_FUNCTIONS, TEXT_KEYWORDS)
+    assert [(span.kind, span.text) for span in spans] == [
+        ('comment', 'Plot the data'),
+        ('string', 'Hello "world"'),
+        ('comment', 'trailing note'),
+        ('string', 'Sine'),
+        ('docstring', 'Doc line.\n\nMore.'),
+    ]
+    for span in spans:
+        if span.kind == 'comment':
+            assert CODE[span.start:span.end] == span.text
+        elif span.kind == 'string':
+            assert ast.literal_eval(CODE[span.start:span.end]) == span.text
+
+
+def test_identity_translation_round_trips():
+    spans = extract_text_spans(CODE, PLOT_FUNCTIONS, TEXT_KEYWORDS)
+    assert apply_spans(CODE, spans, {span.text: span.text for span in spans}) == CODE
+    assert apply_spans(CODE, spans, {}) == CODE
+
+
+def test_translation_keeps_code_valid_and_untouched_elsewhere():
+    spans = extract_text_spans(CODE, PLOT_FUNCTIONS, TEXT_KEYWORDS)
+    translations = {
+        'Plot the data': '绘制数据',
+        'Hello "world"': '你好 "世界"\n第二行',
+        'trailing note': '行尾\n注释',
+        'Sine': "正弦'",
+        'Doc line.\n\nMore.': '文档。\n\n更多。',
+    }
+    result = apply_spans(CODE, spans, translations)
+    tree = ast.parse(result)
+    assert "loc='best'" in result
+    assert '# 行尾 注释' in result
+    assert ast.get_docstring(tree.body[-1]) == '文档。\n\n更多。'
+    strings = [node.value for node in ast.walk(tree) if isinstance(node, ast.Constant) and isinstance(node.value, str)]
+    assert '你好 "世界"\n第二行' in strings
+    assert "正弦'" in strings
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n', '\r'])
+def test_node_offsets_with_newlines_and_non_ascii(newline):
+    code = newline.join(['title = "温度曲线"; value = 1', 'result = value + 2', ''])
+    offsets = line_offsets(code)
+    lines = split_lines(code, offsets)
+    assert ''.join(lines) == code
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Name):
+            start, end = node_offsets(node, lines, offsets)
+            assert code[start:end] == node.id
+
+
+def test_apply_edits_orders_and_drops_overlaps():
+    code = 'abcdef'
+    edits = [(4, 6, 'EF'), (0, 0, '<'), (0, 0, '>'), (1, 3, 'BC'), (2, 4, 'XX')]
+    assert apply_edits(code, edits) == '<>aBCdEF'
+
+
+@pytest.mark.parametrize('path', SAMPLE_FILES, ids=os.path.basename)
+def test_sample_scripts_round_trip(path):
+    with open(path, encoding='utf-8') as f:
+        code = f.read()
+    spans = extract_text_spans(code, PLOT_FUNCTIONS, TEXT_KEYWORDS)
+    assert apply_spans(code, spans, {span.text: span.text for span in spans}) == code
+    translated = apply_spans(code, spans, {span.text: f"译 {span.text}" for span in spans})
+    ast.parse(translated)
@@ -0,0 +1,105 @@
+import glob
+import os
+import symtable
+
+import pytest
+
+from symbol_index import SymbolIndex, get_symbol_index
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+SOURCE_FILES = sorted(glob.glob(os.path.join(ROOT, 'code', '*.py'))
+                      + glob.glob(os.path.join(ROOT, 'test_*', '**', '*.py'), recursive=True))
+
+CODE = '''import numpy as np
+DT = 0.1
+counter = 0
+
+def step(x):
+    return x + DT * np.sin(x)
+
+def bump():
+    global counter
+    counter += 1
+
+class Model:
+    rate = 2
+    def fit(self, data):
+        return [rate * v for v in data]
+
+def make():
+    n = 0
+    def inc():
+        nonlocal n
+        n += 1
+        return n
+    return inc
+
+def make():
+    pass
+'''
+
+
+def _symtable_bindings(table):
+    """symtable 视角下该作用域自己绑定的名字（不含 global / nonlocal 声明和推导式的隐式参数 .0）。"""
+    names = set()
+    for symbol in table.get_symbols():
+        if symbol.get_name().startswith('.'):
+            continue
+        if table.get_type() != 'module' and (symbol.is_declared_global() or symbol.is_nonlocal()):
+            continue
+        if symbol.is_assigned() or symbol.is_parameter() or symbol.is_imported() or symbol.is_namespace():
+            names.add(symbol.get_name())
+    return names
+
+
+def _compare_scopes(scope, table):
+    assert set(scope.bindings) - set(scope.globals) - set(scope.nonlocals) == _symtable_bindings(table), scope.qualified
+    children = table.get_children()
+    assert len(children) == len(scope.children), scope.qualified
+    for child, child_table in zip(scope.children, children):
+        _compare_scopes(child, child_table)
+
+
+@pytest.mark.parametrize('path', SOURCE_FILES, ids=lambda path: os.path.relpath(path, ROOT))
+def test_scopes_match_symtable(path):
+    with open(path, encoding='utf-8') as f:
+        code = f.read()
+    index = SymbolIndex(code)
+    _compare_scopes(index.module, symtable.symtable(code, path, 'exec'))
+    for occurrence in index.occurrences:
+        assert code[occurrence.start:occurrence.end] == occurrence.name
+
+
+def test_qualified_names_disambiguate_duplicates():
+    index = SymbolIndex(CODE + 'pair = (lambda: 1, lambda: 2)\n')
+    assert [scope.qualified for scope in index.scopes] == [
+        '<module>', 'step', 'bump', 'Model', 'Model.fit', 'Model.fit.<comprehension>',
+        'make@17', 'make@17.inc', 'make@25', '<lambda>@27:8', '<lambda>@27:19',
+    ]
+
+
+def test_resolution_of_global_nonlocal_and_class_scopes():
+    index = SymbolIndex(CODE)
+    module = index.module
+    targets = {(occurrence.scope.qualified, occurrence.name, occurrence.role): occurrence.target
+               for occurrence in index.occurrences}
+    assert targets[('bump', 'counter', 'bind')] is module
+    assert targets[('make@17.inc', 'n', 'bind')] is index.scope_by_name['make@17']
+    # 类体中的名字对方法不可见，rate 解析不到
+    assert targets[('Model.fit.<comprehension>', 'rate', 'use')] is None
+    assert index.unresolved_names() == {'rate': 1}
+    assert index.usage_count('<module>', 'DT') == 1
+    assert index.symbol('<module>', 'DT').bindings[0].line == 2
+    assert index.scope_at(21).qualified == 'make@17.inc'
+
+
+def test_external_references_skip_imports_and_local_definitions():
+    index = SymbolIndex(CODE)
+    assert index.external_references(5, 6) == [('DT', 2)]
+    assert index.external_references(1, 6) == []
+
+
+def test_get_symbol_index_is_cached_by_content():
+    index = get_symbol_index(CODE)
+    assert get_symbol_index(CODE) is index
+    assert get_symbol_index(CODE + '\n') is not index
@@ -0,0 +1,89 @@
+import pytest
+
+import unit_cache
+from unit_cache import UnitCache, analyze_units, unit_fingerprint
+
+SOURCE = '''import numpy as np
+DT = 0.1
+
+def step(x):
+    """一步欧拉积分"""
+    return x + DT * np.sin(x)
+
+def energy(x):
+    return 0.5 * x ** 2
+
+if __name__ == '__main__':
+    print(step(1.0), energy(2.0))
+'''
+
+
+def test_fingerprint_ignores_whitespace_and_comments():
+    base = unit_fingerprint("def f(a, b):\n    return a + b\n")
+    assert unit_fingerprint("def f(a,b):  # 求和\n\n    return (a +\n            b)\n") == base
+    assert unit_fingerprint("    def f(a, b):\n        return a + b\n") == base
+
+
+def test_fingerprint_changes_with_code_and_docstrings():
+    base = unit_fingerprint("def f(a, b):\n    return a + b\n")
+    assert unit_fingerprint("def f(a, b):\n    return a - b\n") != base
+    assert unit_fingerprint('def f(a, b):\n    """和"""\n    return a + b\n') != base
+
+
+def test_fingerprint_of_unparsable_fragment_ignores_comments():
+    fragment = "    x = compute(a,\n"
+    assert unit_fingerprint(fragment + "  # 注释\n") == unit_fingerprint(fragment)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = UnitCache(str(tmp_path / 'units.sqlite3'))
+    monkeypatch.setattr(unit_cache, 'get_default_unit_cache', lambda: cache)
+    return cache
+
+
+def _run(code, requested):
+    def analyze(unit, dependencies):
+        requested.append(unit.name)
+        return f"分析 {unit.name}"
+    return analyze_units(code, 'test', ['v1'], analyze)
+
+
+def test_analyze_units_reuses_unchanged_units(cache):
+    requested = []
+    notes = _run(SOURCE, requested)
+    assert [note.unit.name for note in notes] == requested and len(requested) == 4
+    assert not any(note.cached for note in notes)
+
+    requested.clear()
+    notes = _run(SOURCE.replace('    return 0.5 * x ** 2', '    # 动能\n\n    return 0.5*x**2'), requested)
+    assert requested == [] and all(note.cached for note in notes)
+
+    notes = _run(SOURCE.replace('0.5 * x ** 2', '0.25 * x ** 2'), requested)
+    # energy 改动，调用它的 __main__ 单元也要重新分析
+    assert requested == ['energy', '__main__']
+
+
+def test_analyze_units_reanalyzes_dependents_of_changed_definitions(cache):
+    _run(SOURCE, [])
+    requested = []
+    _run(SOURCE.replace('DT = 0.1', 'DT = 0.2'), requested)
+    assert requested == ['DT', 'step']
+
+
+def test_failed_unit_returns_none_but_keeps_successes(cache):
+    def analyze(unit, dependencies):
+        return None if unit.name == 'energy' else f"分析 {unit.name}"
+    assert analyze_units(SOURCE, 'test', ['v1'], analyze) is None
+    requested = []
+    _run(SOURCE, requested)
+    assert requested == ['energy']
+
+
+def test_cached_note(cache):
+    produced = []
+    produce = lambda: produced.append(1) or "公式分析"
+    assert unit_cache.cached_note('test', ['v1'], '素材', produce) == "公式分析"
+    assert unit_cache.cached_note('test', ['v1'], '素材', produce) == "公式分析"
+    unit_cache.cached_note('test', ['v1'], '新素材', produce)
+    assert len(produced) == 2
@@ -0,0 +1,83 @@
+import ast
+
+import pytest
+
+from variable_renamer import collect_rename_candidates, parse_naming_rules, rename_variables
+
+CODE = '''import numpy as np
+scale = 2.0
+
+def gauss(x, s):
+    """s is the width"""
+    y = np.exp(-x ** 2 / (2 * s ** 2))
+    return scale * y
+
+def outer(a):
+    b = a + 1
+    def inner():
+        return b + total
+    return inner()
+
+class Model:
+    def fit(self, data):
+        return data
+
+total = gauss(x=1.0, s=0.5)
+print(obj.s, "s")  # s stays
+'''
+
+
+def test_parse_naming_rules():
+    rules, general = parse_naming_rules("# 通用\n- 所有变量使用 snake_case\n# 特定数学变量\n- 高斯函数中的标准差: `sigma`\n")
+    assert general == ["所有变量使用 snake_case"]
+    assert [tuple(rule) for rule in rules] == [('特定数学变量', '高斯函数中的标准差', 'sigma')]
+
+
+def test_collect_candidates_excludes_imports_functions_and_method_parameters():
+    candidates = collect_rename_candidates(CODE)
+    names = {scope: [candidate.name for candidate in items] for scope, items in candidates.items()}
+    assert names == {'<module>': ['scale', 'total'], 'gauss': ['s', 'x', 'y'], 'outer': ['a', 'b']}
+    total = next(candidate for candidate in candidates['<module>'] if candidate.name == 'total')
+    assert total.line == 'total = gauss(x=1.0, s=0.5)'
+
+
+def test_rename_parameter_updates_uses_and_keyword_calls_only():
+    new_code, applied, rejected = rename_variables(CODE, {'gauss': {'s': 'sigma', 'y': 'value'}})
+    assert applied == [('gauss', 's', 'sigma'), ('gauss', 'y', 'value')]
+    assert rejected == []
+    assert 'def gauss(x, sigma):' in new_code
+    assert 'np.exp(-x ** 2 / (2 * sigma ** 2))' in new_code
+    assert 'gauss(x=1.0, sigma=0.5)' in new_code
+    # 字符串、注释、文档字符串与属性访问保持不变
+    assert '"""s is the width"""' in new_code
+    assert 'print(obj.s, "s")  # s stays' in new_code
+    ast.parse(new_code)
+
+
+def test_scopeless_mapping_applies_to_module_variable():
+    new_code, applied, _ = rename_variables(CODE, {'scale': 'amplitude'})
+    assert applied == [('<module>', 'scale', 'amplitude')]
+    assert 'amplitude = 2.0' in new_code and 'return amplitude * y' in new_code
+
+
+@pytest.mark.parametrize('mapping, reason', [
+    ({'gauss': {'s': 'scale'}}, '会遮蔽其他位置引用的 scale'),
+    ({'gauss': {'y': 'np'}}, '会遮蔽其他位置引用的 np'),
+    ({'outer': {'b': 'total'}}, '会遮蔽其他位置引用的 total'),
+    ({'gauss': {'s': 'x'}}, '新名字 x 与该作用域中的其他名字重复'),
+    ({'gauss': {'s': 'class'}}, '不是合法的变量名'),
+    ({'Model.fit': {'data': 'values'}}, '不是该作用域中可重命名的变量'),
+    ({'missing': {'a': 'b'}}, '作用域不存在'),
+])
+def test_conflicting_renames_are_rejected_and_code_is_unchanged(mapping, reason):
+    new_code, applied, rejected = rename_variables(CODE, mapping)
+    assert new_code == CODE
+    assert applied == []
+    assert [item[3] for item in rejected] == [reason]
+
+
+def test_conflict_rejects_only_the_offending_rename():
+    new_code, applied, rejected = rename_variables(CODE, {'gauss': {'s': 'scale', 'y': 'value'}})
+    assert applied == [('gauss', 'y', 'value')]
+    assert [item[:3] for item in rejected] == [('gauss', 's', 'scale')]
+    assert 'def gauss(x, s):' in new_code and 'return scale * value' in new_code